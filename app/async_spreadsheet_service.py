@@ -0,0 +1,234 @@
+import os
+import asyncio
+from threading import Lock
+from weakref import WeakKeyDictionary
+from urllib.parse import quote
+
+import httpx
+
+from app.models import MODEL_CLASSES, DEFAULT_PRODUCTS, generate_timestamp
+from app.instrumentation import timed
+from app.record_cache import RecordCache
+from app.id_allocator import IdAllocator
+from app.sheets_client import SHEETS_POOL_SIZE
+from app.rate_limiter import scheduler
+from app.spreadsheet_service import GOOGLE_CREDENTIALS_FILEPATH, GOOGLE_SHEETS_DOCUMENT_ID
+
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+# how long (in seconds) to wait for the Sheets API to respond:
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", default="30"))
+
+
+class AsyncSpreadsheetService:
+    """
+    An asynchronous version of the SpreadsheetService (for async views), which calls the Sheets API with httpx,
+    so while waiting on the API the event loop can handle other work,
+    and independent reads can be made concurrently (see get_many).
+
+    Shares the record cache and id counter behavior of the SpreadsheetService,
+    and reads and writes the same rows, so the two can be used on the same document.
+
+    Params:
+        transport : an optional httpx transport (for example to test without calling the API)
+        credentials : optional google credentials (by default, loaded from the credentials file on first use)
+    """
+
+    def __init__(self, credentials_filepath=GOOGLE_CREDENTIALS_FILEPATH, document_id=GOOGLE_SHEETS_DOCUMENT_ID, records_cache=None, id_allocator=None, transport=None, credentials=None):
+        print("INITIALIZING NEW ASYNC SPREADSHEET SERVICE...")
+        self.credentials_filepath = credentials_filepath
+        self.document_id = document_id
+        self.transport = transport
+
+        self._credentials = credentials
+        self.token_lock = Lock()
+        self.token_refreshes = 0
+
+        # an http client for each event loop (connections can't be shared between loops,
+        # ... and some servers run each request in its own loop):
+        self.http_clients = WeakKeyDictionary()
+
+        self.records_cache = records_cache or RecordCache()
+        self.id_allocator = id_allocator or IdAllocator(document_id)
+        self.headers = {} # sheet name -> list of column names
+
+    generate_timestamp = staticmethod(generate_timestamp)
+
+    # AUTH
+
+    @property
+    def credentials(self):
+        if self._credentials is None:
+            with self.token_lock:
+                if self._credentials is None:
+                    from google.oauth2.service_account import Credentials
+                    self._credentials = Credentials.from_service_account_file(self.credentials_filepath, scopes=SHEETS_SCOPES)
+        return self._credentials
+
+    def refresh_token(self, force=False):
+        """Refreshes the access token if it has expired (just once, even if several requests notice at the same time)."""
+        credentials = self.credentials
+        if force or not credentials.valid:
+            token = credentials.token
+            with self.token_lock:
+                if credentials.token == token and (force or not credentials.valid):
+                    print("REFRESHING ACCESS TOKEN...")
+                    from google.auth.transport.requests import Request
+                    credentials.refresh(Request())
+                    self.token_refreshes += 1
+
+    async def access_token(self, force=False):
+        if force or not self.credentials.valid:
+            # the google auth library is synchronous, so refresh in a thread (without blocking the event loop):
+            await asyncio.to_thread(self.refresh_token, force)
+        return self.credentials.token
+
+    # REQUESTS
+
+    def http(self) -> httpx.AsyncClient:
+        """The http client for the current event loop (keeps its connections open for re-use)."""
+        loop = asyncio.get_running_loop()
+        client = self.http_clients.get(loop)
+        if client is None:
+            limits = httpx.Limits(max_connections=SHEETS_POOL_SIZE, max_keepalive_connections=SHEETS_POOL_SIZE)
+            client = httpx.AsyncClient(base_url=SHEETS_API_URL, timeout=SHEETS_TIMEOUT, limits=limits, transport=self.transport)
+            self.http_clients[loop] = client
+        return client
+
+    async def request(self, method, path, **kwargs):
+        """Makes an API request (for the document), and returns the parsed response.
+            Waits for the quota (and retries rate limited or failed requests) like the SpreadsheetService, see RequestScheduler.
+        """
+        url = f"/{self.document_id}{path}"
+        attempt = 0
+        while True:
+            await asyncio.sleep(scheduler.reserve(method))
+            token = await self.access_token()
+            response = await self.http().request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+            if response.status_code == 401:
+                # the token may have expired in the meantime:
+                token = await self.access_token(force=True)
+                response = await self.http().request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+            if not scheduler.should_retry(response.status_code, attempt, method):
+                break
+            delay = scheduler.backoff(attempt)
+            print(f"API ERROR {response.status_code}, RETRYING IN {round(delay, 1)} SECONDS...")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        response.raise_for_status()
+        return response.json()
+
+    async def get_values(self, a1_range):
+        """Gets the cell values in the given range (like "orders" or "orders!A:A")."""
+        response = await self.request("GET", f"/values/{quote(a1_range)}")
+        return response.get("values", [])
+
+    async def close(self):
+        """Closes the http client for the current event loop."""
+        client = self.http_clients.pop(asyncio.get_running_loop(), None)
+        if client:
+            await client.aclose()
+
+    # READING DATA
+
+    @timed("get_records_async")
+    async def get_records(self, sheet_name):
+        """Gets all records from a sheet (from the cache if possible).
+
+        note: the records may be shared with other callers, so please don't modify them
+        """
+        records = self.records_cache.peek(sheet_name)
+        if records is None:
+            records = await self.fetch_records(sheet_name)
+            self.records_cache.set(sheet_name, records)
+        return sheet_name, records
+
+    async def get_many(self, sheet_names:list):
+        """Gets all records from each of the given sheets, fetching them concurrently.
+            Returns a dictionary of records by sheet name.
+        """
+        results = await asyncio.gather(*[self.get_records(sheet_name) for sheet_name in sheet_names])
+        return dict(results)
+
+    async def fetch_records(self, sheet_name):
+        """Gets all records from a sheet, bypassing the cache (always makes an API call)."""
+        values = await self.get_values(sheet_name)
+        if not any(values):
+            return []
+
+        header, rows = values[0], values[1:]
+        self.headers[sheet_name] = header
+        model_class = MODEL_CLASSES[sheet_name]
+        positions = model_class.positions(header)
+        return [model_class.from_row(row, positions) for row in rows]
+
+    async def get_header(self, sheet_name):
+        """Gets the column names from the first row of the sheet (these are cached)."""
+        if sheet_name not in self.headers:
+            values = await self.get_values(f"{sheet_name}!1:1")
+            self.headers[sheet_name] = values[0] if values else []
+        return self.headers[sheet_name]
+
+    async def find_max_id(self, sheet_name):
+        """Finds the largest identifier in the sheet, reading only the "id" column."""
+        values = [row[0] for row in await self.get_values(f"{sheet_name}!A:A") if row]
+        if values and values[0] != "id":
+            raise ValueError(f"EXPECTING THE FIRST COLUMN OF THE '{sheet_name}' SHEET TO BE 'id'")
+        ids = [int(val) for val in values[1:] if str(val).isdigit()]
+        return max(ids) if ids else 0
+
+    async def get_products(self):
+        _, products = await self.get_records("products")
+        return products
+
+    async def get_orders(self):
+        _, orders = await self.get_records("orders")
+        return orders
+
+    async def get_user_orders(self, user_email):
+        orders = await self.get_orders()
+        return [order for order in orders if order["user_email"] == user_email]
+
+    # WRITING DATA
+
+    async def seed_products(self):
+        products = await self.get_products()
+        if not any(products):
+            await self.create_records("products", [dict(product) for product in DEFAULT_PRODUCTS])
+
+    async def create_order(self, new_order:dict):
+        await self.create_records("orders", [new_order])
+
+    @timed("create_records_async")
+    async def create_records(self, sheet_name:str, new_records:list):
+        """Appends new records to the end of the sheet, assigning each an auto-incrementing "id" and a "created_at" timestamp."""
+        model_class = MODEL_CLASSES[sheet_name]
+        if not any(new_records):
+            return
+
+        # auto-increment integer identifier (waiting for the counter's file lock in a thread, instead of blocking the event loop):
+        loop = asyncio.get_running_loop()
+        find_max_id = lambda: asyncio.run_coroutine_threadsafe(self.find_max_id(sheet_name), loop).result()
+        next_id = await asyncio.to_thread(self.id_allocator.allocate, sheet_name, len(new_records), find_max_id)
+
+        # write the values in the same order as the sheet's columns:
+
+        header = await self.get_header(sheet_name)
+
+        new_rows = []
+        created_records = []
+        for new_record in new_records:
+            new_record["id"] = next_id
+            new_record["created_at"] = self.generate_timestamp()
+            model = model_class(new_record)
+            new_rows.append(model.to_row(header))
+            created_records.append(model)
+            next_id += 1
+
+        # the API finds the end of the table for us (after the last non-empty row):
+        await self.request("POST", f"/values/{quote(sheet_name)}!A1:append", params={"valueInputOption": "RAW"}, json={"values": new_rows})
+
+        # write-through, so the cache reflects what we just wrote:
+        self.records_cache.append(sheet_name, created_records)
@@ -0,0 +1,172 @@
+import os
+import csv
+import json
+import time
+import argparse
+from datetime import datetime
+from itertools import islice
+
+from app.locking import atomic_write
+from app.models import MODEL_CLASSES
+from app.storage import get_storage_service, STORAGE_BACKEND
+
+# how many records to write (or read) in each API call:
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", default="1000"))
+
+
+def file_format(filepath):
+    """The format of a file, by its extension: "csv" or "jsonl"."""
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    elif extension in [".jsonl", ".ndjson"]:
+        return "jsonl"
+    raise ValueError(f"UNKNOWN FILE FORMAT: '{filepath}' (expecting a .csv or .jsonl file)")
+
+
+def read_rows(filepath):
+    """Yields a dictionary for each row of a CSV or JSONL file (one at a time, without reading the whole file)."""
+    fmt = file_format(filepath)
+    with open(filepath, "r", newline="") as source_file:
+        if fmt == "csv":
+            yield from csv.DictReader(source_file)
+        else:
+            for line in source_file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def chunked(rows, chunk_size):
+    """Yields lists of (at most) the given number of rows."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_new_record(sheet_name, row):
+    """Converts a row from an import file into a new record (parsing the values like the ones read from a sheet),
+        without its "id", because new ids get assigned when the records are created.
+    """
+    model_class = MODEL_CLASSES[sheet_name]
+    record = model_class.from_row([row.get(field, "") for field in model_class.FIELDS]).to_dict()
+    record.pop("id")
+    return record
+
+
+def serialize(record):
+    return {key: (value.isoformat() if isinstance(value, datetime) else value) for key, value in dict(record).items()}
+
+
+class Checkpoint:
+    """
+    Remembers how many rows of an import file have been written, so an interrupted import can pick up where it left off.
+    Saved as soon as each chunk has been written (before anything else can fail), so no chunk gets written twice.
+
+    Params:
+        filepath (str) : where to save the checkpoint (defaults to next to the import file)
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def load(self, sheet_name):
+        """The number of rows already imported into the given sheet (or zero when starting from the beginning)."""
+        try:
+            with open(self.filepath, "r") as json_file:
+                checkpoint = json.load(json_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        return checkpoint["rows_imported"] if checkpoint.get("sheet_name") == sheet_name else 0
+
+    def save(self, sheet_name, rows_imported):
+        with atomic_write(self.filepath) as json_file:
+            json.dump({"sheet_name": sheet_name, "rows_imported": rows_imported}, json_file)
+
+    def clear(self):
+        if os.path.isfile(self.filepath):
+            os.remove(self.filepath)
+
+
+def print_progress(verb, count, started):
+    elapsed = time.perf_counter() - started
+    rate = round(count / elapsed) if elapsed else count
+    print(f"{verb} {count} ROWS ({rate} ROWS/S)")
+
+
+def import_records(service, sheet_name, filepath, chunk_size=BULK_CHUNK_SIZE, checkpoint_filepath=None):
+    """
+    Creates a record for each row of a CSV or JSONL file, a chunk at a time (each chunk is one write, and one id allocation).
+    Keeps the rows' "created_at" timestamps (if any), but assigns new ids.
+    Resumes after the last chunk written (see Checkpoint) if a previous import of the same file was interrupted.
+
+    Returns the number of rows imported.
+    """
+    checkpoint = Checkpoint(checkpoint_filepath or f"{filepath}.checkpoint")
+    skip = checkpoint.load(sheet_name)
+    if skip:
+        print("RESUMING AFTER", skip, "ROWS...")
+
+    count = skip
+    started = time.perf_counter()
+    for chunk in chunked(islice(read_rows(filepath), skip, None), chunk_size):
+        new_records = [to_new_record(sheet_name, row) for row in chunk]
+        imported = count + len(chunk)
+        service.create_records(sheet_name, new_records, keep_timestamps=True, on_written=lambda _, imported=imported: checkpoint.save(sheet_name, imported))
+        count = imported
+        print_progress("IMPORTED", count - skip, started)
+
+    checkpoint.clear()
+    return count
+
+
+def export_records(service, sheet_name, filepath, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Writes all the records from a sheet to a CSV or JSONL file, reading (and writing) a chunk at a time.
+    Returns the number of rows exported.
+    """
+    fmt = file_format(filepath)
+    fields = MODEL_CLASSES[sheet_name].FIELDS
+
+    count = 0
+    started = time.perf_counter()
+    # an interrupted export doesn't leave behind a file which looks finished:
+    with atomic_write(filepath, "w", newline="") as export_file:
+        writer = csv.DictWriter(export_file, fieldnames=fields) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        for records in service.iter_records(sheet_name, chunk_size):
+            for record in records:
+                if writer:
+                    writer.writerow(serialize(record))
+                else:
+                    export_file.write(json.dumps(serialize(record)) + "\n")
+            count += len(records)
+            print_progress("EXPORTED", count, started)
+    return count
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Imports records from (or exports them to) a CSV or JSONL file.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("filepath", help="the .csv or .jsonl file")
+    parser.add_argument("--sheet", default="orders", choices=list(MODEL_CLASSES.keys()), help="which sheet (or table)")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="records per API call")
+    parser.add_argument("--checkpoint", default=None, help="where to save import progress (defaults to FILEPATH.checkpoint)")
+    parser.add_argument("--backend", default=STORAGE_BACKEND, help="sheets or sqlite")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = parse_args()
+    service = get_storage_service(args.backend)
+
+    if args.command == "import":
+        count = import_records(service, args.sheet, args.filepath, chunk_size=args.chunk_size, checkpoint_filepath=args.checkpoint)
+        print("IMPORTED", count, "ROWS INTO", args.sheet.upper())
+    else:
+        count = export_records(service, args.sheet, args.filepath, chunk_size=args.chunk_size)
+        print("EXPORTED", count, "ROWS FROM", args.sheet.upper())
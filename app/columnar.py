@@ -0,0 +1,127 @@
+from array import array
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+
+# how to convert the values in each (known) column, instead of guessing value by value:
+COLUMN_TYPES = {
+    "id": "int",
+    "product_id": "int",
+    "price": "float",
+    "product_price": "float",
+    "created_at": "datetime",
+}
+
+TYPECODES = {"int": "q", "float": "d"}
+
+CONVERTERS = {"int": int, "float": float, "datetime": datetime.fromisoformat}
+
+
+def convert_column(values:list, column_type:str):
+    """Converts all the values in a column at once.
+
+    Numeric columns become compact typed arrays, unless some of the cells are blank or invalid,
+    in which case we convert what we can and leave the rest as strings (like get_all_records does).
+    """
+    convert = CONVERTERS[column_type]
+    try:
+        if column_type in TYPECODES:
+            return array(TYPECODES[column_type], map(convert, values))
+        return list(map(convert, values))
+    except ValueError:
+        pass
+
+    converted = []
+    for value in values:
+        try:
+            converted.append(convert(value))
+        except ValueError:
+            converted.append(value)
+    return converted
+
+
+class RowView(Mapping):
+    """A lazy, read-only, dictionary-like view of one row of columnar records
+        (so templates can still use row.name or row["name"]).
+    """
+
+    __slots__ = ("records", "index")
+
+    def __init__(self, records, index:int):
+        self.records = records
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.records.columns[key][self.index]
+
+    def __iter__(self):
+        return iter(self.records.header)
+
+    def __len__(self):
+        return len(self.records.header)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ColumnarRecords(Sequence):
+    """
+    Records stored column by column, parsed from the raw grid of cell values (see Worksheet.get_all_values).
+    Parsing a whole column at a time is much cheaper than building a dictionary and parsing a timestamp for each row.
+
+    Indexing or iterating yields lazy RowView objects, which behave like the usual record dictionaries.
+    The records are read-only, so they can be shared (by the cache, for example) without copying them.
+
+    Params:
+        values (list) : rows of cell values, where the first row contains the column names
+    """
+
+    def __init__(self, values:list):
+        self.header = list(values[0]) if values else []
+        rows = values[1:]
+        self.length = len(rows)
+        self.columns = {}
+        for i, name in enumerate(self.header):
+            column = [row[i] if i < len(row) else "" for row in rows]
+            column_type = COLUMN_TYPES.get(name)
+            self.columns[name] = convert_column(column, column_type) if column_type else column
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("record index out of range")
+        return RowView(self, index)
+
+    def __eq__(self, other):
+        """Compares equal to a list of the same records (so it can be used wherever a list of records was)"""
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(record == other_record for record, other_record in zip(self, other))
+
+    __hash__ = None
+
+    def __add__(self, records):
+        """Returns new columnar records, with the given records (dictionaries, or rows of other columnar records) added to the end
+            (for example the ones we just wrote, see RecordCache.append).
+        """
+        records = list(records)
+        combined = ColumnarRecords([])
+        combined.header = self.header or (list(records[0].keys()) if records else [])
+        combined.length = self.length + len(records)
+        for name in combined.header:
+            column = self.columns.get(name, [])
+            values = [record.get(name, "") for record in records]
+            try:
+                combined.columns[name] = column + array(column.typecode, values) if isinstance(column, array) else column + values
+            except TypeError:
+                combined.columns[name] = list(column) + values # some aren't numbers after all
+        return combined
+
+    def column(self, name:str):
+        """All the values in the given column (for example to sum prices, without looking at each row)"""
+        return self.columns[name]
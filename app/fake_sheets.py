@@ -0,0 +1,273 @@
+import re
+import json
+import time
+import random
+from threading import RLock
+
+from requests import Response
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import column_letter_to_index, rowcol_to_a1
+
+# the column names of each sheet, like in the real document:
+DEFAULT_HEADERS = {
+    "products": ["id", "name", "description", "price", "url", "created_at"],
+    "orders": ["id", "user_email", "product_id", "product_name", "product_price", "created_at"],
+}
+
+
+def format_value(value):
+    """Converts a value into the string the Sheets API would display (like 4.99 -> "4.99", 5.0 -> "5")."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def parse_range(a1_range):
+    """Parses a range like "'orders'!A2:F10" (or "'orders'", "orders!1:1", "orders!A:A").
+        Returns the sheet title, and the first and last row and column numbers (where None means no limit).
+    """
+    title, _, cells = a1_range.partition("!")
+    title = title.strip("'")
+    if not cells:
+        return title, 1, None, 1, None
+
+    def parse_cell(cell):
+        match = re.fullmatch(r"([A-Z]*)(\d*)", cell.upper())
+        if not match:
+            raise ValueError(f"Unable to parse range: {a1_range}")
+        letters, digits = match.groups()
+        return (int(digits) if digits else None), (column_letter_to_index(letters) if letters else None)
+
+    start, _, end = cells.partition(":")
+    start_row, start_col = parse_cell(start)
+    end_row, end_col = parse_cell(end) if end else (start_row, start_col)
+    return title, start_row or 1, end_row, start_col or 1, end_col
+
+
+def trim(rows):
+    """Drops empty trailing cells and rows (like the API does)."""
+    rows = [list(row) for row in rows]
+    for row in rows:
+        while row and row[-1] == "":
+            row.pop()
+    while rows and not any(rows[-1]):
+        rows.pop()
+    return rows
+
+
+def api_error(code, message, status="RESOURCE_EXHAUSTED"):
+    response = Response()
+    response.status_code = code
+    response._content = json.dumps({"error": {"code": code, "message": message, "status": status}}).encode("utf-8")
+    return APIError(response)
+
+
+class FakeApi:
+    """
+    Stands in for the Sheets API: counts each call, and optionally makes it slow, or fail.
+
+    Params:
+        latency_ms (float) : how long each call takes
+
+        error_rate (float) : the fraction of calls (between 0 and 1) which fail with a quota error (429)
+    """
+
+    def __init__(self, latency_ms=0, error_rate=0, seed=None):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = RLock()
+        self.calls = {} # method name -> count
+        self.failures = []
+
+    def call(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self.failures:
+                raise self.failures.pop(0)
+            fail = self.error_rate and self.random.random() < self.error_rate
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if fail:
+            raise api_error(429, "Quota exceeded for quota metric 'Read requests' (fake)")
+
+    def fail_next(self, count=1, code=429, message="Quota exceeded (fake)"):
+        """Makes the next few calls fail with the given error."""
+        with self.lock:
+            self.failures += [api_error(code, message) for _ in range(count)]
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+class FakeWorksheet:
+    """An in-memory worksheet, with the methods of a gspread Worksheet that the SpreadsheetService uses."""
+
+    def __init__(self, api, title, header, sheet_id=0):
+        self.api = api
+        self.title = title
+        self.id = sheet_id
+        self.rows = [list(header)]
+        self.lock = RLock()
+
+    @property
+    def col_count(self):
+        return max([len(row) for row in self.rows] + [26])
+
+    @property
+    def row_count(self):
+        return max(len(self.rows), 1000)
+
+    def table_length(self):
+        """The number of rows, up to the last non-empty one."""
+        length = len(self.rows)
+        while length and not any(self.rows[length - 1]):
+            length -= 1
+        return length
+
+    def get_values(self, start_row=1, end_row=None, start_col=1, end_col=None):
+        with self.lock:
+            rows = self.rows[start_row - 1:end_row]
+            return trim([row[start_col - 1:end_col] for row in rows])
+
+    # GSPREAD METHODS
+
+    def get_all_values(self, **kwargs):
+        self.api.call("get_all_values")
+        rows = self.get_values()
+        width = max([len(row) for row in rows] + [0])
+        return [row + [""] * (width - len(row)) for row in rows]
+
+    def row_values(self, row_number, **kwargs):
+        self.api.call("row_values")
+        rows = self.get_values(row_number, row_number)
+        return rows[0] if rows else []
+
+    def col_values(self, col_number, **kwargs):
+        self.api.call("col_values")
+        values = [row[0] if row else "" for row in self.get_values(start_col=col_number, end_col=col_number)]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def append_rows(self, values, table_range=None, **kwargs):
+        self.api.call("append_rows")
+        with self.lock:
+            start_row = self.table_length() + 1
+            for i, row in enumerate(values):
+                self.write_row(start_row + i, [format_value(value) for value in row])
+            end_row = start_row + len(values) - 1
+        last_col = max([len(row) for row in values] + [1])
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start_row}:{rowcol_to_a1(end_row, last_col)}", "updatedRows": len(values)}}
+
+    def delete_rows(self, start_index, end_index=None):
+        self.api.call("delete_rows")
+        with self.lock:
+            del self.rows[start_index - 1:(end_index or start_index)]
+
+    # HELPERS
+
+    def write_row(self, row_number, values):
+        while len(self.rows) < row_number:
+            self.rows.append([])
+        self.rows[row_number - 1] = list(values)
+
+    def clear(self, start_row=1, end_row=None, start_col=1, end_col=None):
+        with self.lock:
+            for row in self.rows[start_row - 1:end_row]:
+                stop = len(row) if end_col is None else min(end_col, len(row))
+                for i in range(start_col - 1, stop):
+                    row[i] = ""
+
+
+class FakeSpreadsheet:
+    """An in-memory spreadsheet document, with the methods of a gspread Spreadsheet that the SpreadsheetService uses."""
+
+    def __init__(self, api, document_id, headers=DEFAULT_HEADERS):
+        self.api = api
+        self.id = document_id
+        self.title = "Fake Spreadsheet"
+        self.sheets = {}
+        for title, header in headers.items():
+            self.add_worksheet(title, header)
+
+    def add_worksheet(self, title, header):
+        self.sheets[title] = FakeWorksheet(self.api, title, header, sheet_id=len(self.sheets))
+        return self.sheets[title]
+
+    def sheet(self, title):
+        try:
+            return self.sheets[title]
+        except KeyError:
+            raise api_error(400, f"Unable to parse range: '{title}'", status="INVALID_ARGUMENT")
+
+    # GSPREAD METHODS
+
+    def worksheets(self, **kwargs):
+        self.api.call("worksheets")
+        return list(self.sheets.values())
+
+    def worksheet(self, title):
+        self.api.call("worksheet")
+        if title not in self.sheets:
+            raise WorksheetNotFound(title)
+        return self.sheets[title]
+
+    def values_batch_get(self, ranges, params=None):
+        self.api.call("values_batch_get")
+        value_ranges = []
+        for a1_range in ranges:
+            title, start_row, end_row, start_col, end_col = parse_range(a1_range)
+            values = self.sheet(title).get_values(start_row, end_row, start_col, end_col)
+            value_range = {"range": a1_range, "majorDimension": "ROWS"}
+            if values:
+                value_range["values"] = values
+            value_ranges.append(value_range)
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    def values_update(self, range, params=None, body=None):
+        self.api.call("values_update")
+        title, start_row, end_row, start_col, end_col = parse_range(range)
+        sheet = self.sheet(title)
+        with sheet.lock:
+            for row_number, values in enumerate((body or {}).get("values", []), start=start_row):
+                row = sheet.rows[row_number - 1] if row_number <= len(sheet.rows) else []
+                row = row + [""] * max(0, start_col - 1 + len(values) - len(row))
+                row[start_col - 1:start_col - 1 + len(values)] = [format_value(value) for value in values]
+                sheet.write_row(row_number, row)
+        return {"spreadsheetId": self.id, "updatedRange": range}
+
+    def values_batch_clear(self, params=None, body=None):
+        self.api.call("values_batch_clear")
+        ranges = (body or {}).get("ranges", [])
+        for a1_range in ranges:
+            title, start_row, end_row, start_col, end_col = parse_range(a1_range)
+            self.sheet(title).clear(start_row, end_row, start_col, end_col)
+        return {"spreadsheetId": self.id, "clearedRanges": ranges}
+
+
+class FakeClient:
+    """
+    An in-memory stand-in for the gspread client, to use the SpreadsheetService without a Google Sheets document
+    (for example in tests and benchmarks):
+
+        ss = SpreadsheetService(document_id="example", client=FakeClient(latency_ms=50))
+
+    Params: see FakeApi
+    """
+
+    def __init__(self, latency_ms=0, error_rate=0, seed=None, headers=DEFAULT_HEADERS):
+        self.api = FakeApi(latency_ms=latency_ms, error_rate=error_rate, seed=seed)
+        self.headers = headers
+        self.documents = {}
+
+    def open_by_key(self, document_id):
+        self.api.call("open_by_key")
+        if document_id not in self.documents:
+            self.documents[document_id] = FakeSpreadsheet(self.api, document_id, self.headers)
+        return self.documents[document_id]
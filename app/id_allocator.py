@@ -0,0 +1,115 @@
+import os
+import json
+import time
+from threading import Lock
+from contextlib import contextmanager
+
+from app.locking import exclusive_lock, atomic_write, document_prefix, private_directory, LockStats
+
+# where to store the id counters (should be shared by all the web server's worker processes, and only writable by them):
+DEFAULT_ID_COUNTERS_DIRPATH = os.path.join(os.path.dirname(__file__), "..", "cache")
+ID_COUNTERS_DIRPATH = os.getenv("ID_COUNTERS_DIRPATH", default=DEFAULT_ID_COUNTERS_DIRPATH)
+# how often (in seconds) to check the counters against the largest id in the sheet (in case rows were added some other way):
+ID_COUNTERS_TTL = int(os.getenv("ID_COUNTERS_TTL", default="3600"))
+
+
+class IdAllocator:
+    """
+    Hands out auto-incrementing integer identifiers for the records in each sheet,
+    without needing to read all the existing records every time.
+
+    The next available id for each sheet is stored in a small counter file,
+    which is only read and written while holding an exclusive file lock,
+    so concurrent worker processes on the same server never receive the same ids.
+
+    Each counter is checked against the largest id in the sheet (and moved past it if necessary) when it is first used,
+    again by each new process (in case rows were added while the app was down), and again once it is older than the ttl.
+
+    Params:
+        document_id (str) : the google sheets document, so different documents get different counters
+
+        dirpath (str) : the directory to store the counter file in
+
+        ttl (int) : how long (in seconds) to trust a counter before checking it against the sheet again
+    """
+
+    def __init__(self, document_id, dirpath=ID_COUNTERS_DIRPATH, ttl=ID_COUNTERS_TTL):
+        self.filepath = document_prefix(private_directory(dirpath), "sheets-ids", document_id) + ".json"
+        self.lock_filepath = f"{self.filepath}.lock"
+        self.lock = Lock() # for threads within this process (the file lock is for other processes)
+        self.lock_stats = LockStats()
+        self.ttl = ttl
+        self.started_at = time.time()
+
+    @contextmanager
+    def locked(self):
+        with exclusive_lock(self.lock, self.lock_filepath, stats=self.lock_stats):
+            yield
+
+    def read_counters(self):
+        try:
+            with open(self.filepath, "r") as json_file:
+                return json.load(json_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def write_counters(self, counters):
+        with atomic_write(self.filepath) as json_file:
+            json.dump(counters, json_file)
+
+    @staticmethod
+    def get_counter(counters:dict, sheet_name:str) -> dict:
+        counter = counters.get(sheet_name)
+        return counter if isinstance(counter, dict) else {} # none yet (or written by an older version of the app)
+
+    def expired(self, counter:dict):
+        """Whether the counter was last checked against the sheet before this process started, or longer ago than the ttl."""
+        checked_at = counter.get("checked_at", 0)
+        return checked_at < self.started_at or time.time() - checked_at > self.ttl
+
+    def allocate(self, sheet_name:str, count:int, find_max_id, known_max_id:int=0):
+        """
+        Reserves a number of consecutive identifiers, and returns the first one.
+
+        Params:
+            find_max_id (function) : returns the largest existing id in the sheet.
+                Only called when there is no counter for this sheet yet, or the counter has expired (see expired).
+
+            known_max_id (int) : the largest id we already know of (for example from our cached records), to make sure we start after it
+        """
+        # check the sheet (an API call) before taking the lock, so the other workers don't have to wait for it:
+        max_id = find_max_id() if self.expired(self.get_counter(self.read_counters(), sheet_name)) else None
+
+        with self.locked():
+            counters = self.read_counters()
+            counter = self.get_counter(counters, sheet_name)
+            next_id = counter.get("next_id", 1)
+            checked_at = counter.get("checked_at", 0)
+            if max_id is None and self.expired(counter):
+                max_id = find_max_id() # the counter expired (or was removed) just now
+            if max_id is not None:
+                next_id = max(next_id, max_id + 1)
+                checked_at = time.time()
+            next_id = max(next_id, known_max_id + 1)
+            counters[sheet_name] = {"next_id": next_id + count, "checked_at": checked_at}
+            self.write_counters(counters)
+            return next_id
+
+    def reallocate(self, sheet_name:str, count:int, find_max_id):
+        """
+        Reserves a number of consecutive identifiers after the largest one in the sheet (or the counter, if that's larger),
+        and returns the first one. For when ids from the counter turn out to be taken already (see SpreadsheetService.check_ids).
+        """
+        with self.locked():
+            counters = self.read_counters()
+            next_id = max(self.get_counter(counters, sheet_name).get("next_id", 1), find_max_id() + 1)
+            counters[sheet_name] = {"next_id": next_id + count, "checked_at": time.time()}
+            self.write_counters(counters)
+            return next_id
+
+    def reset(self, sheet_name:str, next_id:int=1):
+        """Starts counting again (for example after removing all records from the sheet)."""
+        with self.locked():
+            counters = self.read_counters()
+            counters[sheet_name] = {"next_id": next_id, "checked_at": time.time()}
+            self.write_counters(counters)
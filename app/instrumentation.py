@@ -0,0 +1,164 @@
+import time
+import inspect
+import functools
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+
+# upper bounds (in milliseconds) of the histogram buckets:
+BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+
+
+class Histogram:
+    """Counts observed durations by bucket, to summarize them without keeping each one."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0
+        self.max_ms = 0
+
+    def observe(self, duration_ms):
+        self.counts[bisect_left(BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def percentile(self, pct):
+        """Approximates the given percentile, as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return None
+        threshold = self.count * pct / 100
+        running_total = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            running_total += count
+            if running_total >= threshold:
+                return min(bound, self.max_ms)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {f"le_{bound}": count for bound, count in zip(BUCKETS_MS, self.counts)},
+        }
+
+
+class Metrics:
+    """Aggregated durations and counters for the whole process."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, duration_ms):
+        with self.lock:
+            self.histograms.setdefault(name, Histogram()).observe(duration_ms)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        with self.lock:
+            return {
+                "histograms": {name: histogram.summary() for name, histogram in self.histograms.items()},
+                "counters": dict(self.counters),
+            }
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+
+class RequestTimings:
+    """The timings collected while handling a single web request."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.durations = {} # name -> [count, total milliseconds]
+        self.api_calls = 0
+        self.api_bytes = 0
+        self.api_ms = 0
+
+    def add(self, name, duration_ms):
+        entry = self.durations.setdefault(name, [0, 0])
+        entry[0] += 1
+        entry[1] += duration_ms
+
+    def server_timing(self):
+        """Formats the timings for a "Server-Timing" response header (shown in the browser's developer tools)."""
+        parts = [f'{name};dur={round(total_ms, 1)};desc="{name} x{count}"' for name, (count, total_ms) in self.durations.items()]
+        parts.append(f'api;dur={round(self.api_ms, 1)};desc="{self.api_calls} calls, {self.api_bytes} bytes"')
+        parts.append(f"total;dur={round((time.perf_counter() - self.started_at) * 1000, 1)}")
+        return ", ".join(parts)
+
+
+metrics = Metrics()
+
+current_request = ContextVar("current_request", default=None)
+
+
+def start_request():
+    timings = RequestTimings()
+    current_request.set(timings)
+    return timings
+
+
+def end_request():
+    timings = current_request.get()
+    current_request.set(None)
+    return timings
+
+
+def record(name, duration_ms):
+    """Records a duration for the whole process, and for the current request (if any)."""
+    metrics.observe(name, duration_ms)
+    timings = current_request.get()
+    if timings:
+        timings.add(name, duration_ms)
+
+
+def timed(name):
+    """Decorator which records how long each call to the decorated function takes."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            # time until the coroutine finishes (not just until it is created):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record(name, (time.perf_counter() - start) * 1000)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorator
+
+
+def track_api_response(response, *args, **kwargs):
+    """A response hook for the HTTP session, which counts each API call, and how many bytes it returned."""
+    nbytes = len(response.content or b"")
+    duration_ms = response.elapsed.total_seconds() * 1000
+    metrics.increment("api_calls")
+    metrics.increment("api_bytes", nbytes)
+    metrics.observe("api", duration_ms)
+    timings = current_request.get()
+    if timings:
+        timings.api_calls += 1
+        timings.api_bytes += nbytes
+        timings.api_ms += duration_ms
+    return response
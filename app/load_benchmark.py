@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timezone
+
+from app.fake_sheets import FakeClient
+from app.id_allocator import IdAllocator
+from app.spreadsheet_service import SpreadsheetService
+
+# the sizes of the orders sheet to benchmark (comma separated numbers of rows):
+LOAD_BENCHMARK_ROWS = os.getenv("LOAD_BENCHMARK_ROWS", default="100,1000,10000")
+# how many requests to make to each endpoint, for each sheet size:
+LOAD_BENCHMARK_REQUESTS = int(os.getenv("LOAD_BENCHMARK_REQUESTS", default="50"))
+# how long (in milliseconds) each call to the fake Sheets API takes:
+LOAD_BENCHMARK_LATENCY_MS = float(os.getenv("LOAD_BENCHMARK_LATENCY_MS", default="0"))
+# the fraction of calls to the fake Sheets API which fail with a quota error (429):
+LOAD_BENCHMARK_ERROR_RATE = float(os.getenv("LOAD_BENCHMARK_ERROR_RATE", default="0"))
+# the results to compare against (see --save-baseline):
+LOAD_BENCHMARK_BASELINE = os.getenv("LOAD_BENCHMARK_BASELINE", default=os.path.join(os.path.dirname(__file__), "..", "test", "data", "load_benchmark_baseline.json"))
+# how much slower than the baseline (as a fraction) counts as a regression:
+LOAD_BENCHMARK_TOLERANCE = float(os.getenv("LOAD_BENCHMARK_TOLERANCE", default="0.5"))
+
+USER_EMAIL = "benchmark@example.com"
+USER_COUNT = 100 # the orders are spread across this many users (including the benchmark user)
+
+ENDPOINTS = ["/products", "/user/orders", "/user/orders/create"]
+
+
+def make_service(rows, latency_ms=0, error_rate=0, seed=1):
+    """
+    Returns a spreadsheet service backed by a fake in-memory document (see FakeClient),
+    with the default products, and the given number of orders (written directly, without any API calls).
+    The latency and errors only apply once the document has been filled.
+    """
+    client = FakeClient(seed=seed)
+    document_id = f"load-benchmark-{rows}"
+    id_allocator = IdAllocator(document_id, dirpath=tempfile.mkdtemp())
+    service = SpreadsheetService(document_id=document_id, client=client, id_allocator=id_allocator)
+    service.seed_products()
+
+    products = client.open_by_key(document_id).sheet("products").get_values(start_row=2)
+    orders_sheet = client.open_by_key(document_id).sheet("orders")
+    created_at = str(datetime(2023, 1, 1, tzinfo=timezone.utc))
+    for i in range(rows):
+        product = products[i % len(products)]
+        user_email = USER_EMAIL if i % USER_COUNT == 0 else f"user{i % USER_COUNT}@example.com"
+        orders_sheet.write_row(i + 2, [str(i + 1), user_email, product[0], product[1], product[3], created_at])
+
+    client.api.latency_ms = latency_ms
+    client.api.error_rate = error_rate
+    return service
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def benchmark_endpoint(test_client, path, requests):
+    """Makes a number of requests to the given endpoint (after one warm up request), and returns their timings."""
+    def make_request():
+        if path == "/user/orders/create":
+            return test_client.post(path, data={"product_id": "1", "product_name": "Benchmark Product", "product_price": "4.99"})
+        return test_client.get(path)
+
+    make_request()
+    durations = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        response = make_request()
+        durations.append((time.perf_counter() - request_started) * 1000)
+        # the create route redirects back to the products page when the order fails:
+        if response.status_code >= 500 or response.headers.get("Location") == "/products":
+            errors += 1
+    elapsed = time.perf_counter() - started
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(durations), 2),
+        "p99_ms": round(percentile(durations, 99), 2),
+        "errors": errors,
+    }
+
+
+def run_benchmark(rows_list, requests=LOAD_BENCHMARK_REQUESTS, latency_ms=LOAD_BENCHMARK_LATENCY_MS, error_rate=LOAD_BENCHMARK_ERROR_RATE):
+    """
+    Returns the results for each sheet size and endpoint, like {"1000": {"/products": {"requests_per_second": 950.0, ...}}}.
+
+    Params:
+        rows_list (list[int]) : the sizes of the orders sheet to benchmark
+    """
+    from web_app import create_app
+
+    results = {}
+    for rows in rows_list:
+        print("BENCHMARKING", rows, "ROWS...")
+        service = make_service(rows, latency_ms=latency_ms, error_rate=error_rate)
+        app = create_app(spreadsheet_service=service)
+        test_client = app.test_client()
+        with test_client.session_transaction() as session:
+            session["current_user"] = {"email": USER_EMAIL}
+
+        results[str(rows)] = {path: benchmark_endpoint(test_client, path, requests) for path in ENDPOINTS}
+        results[str(rows)]["api_calls"] = service.client.api.total_calls
+    return results
+
+
+def find_regressions(results, baseline, tolerance=LOAD_BENCHMARK_TOLERANCE):
+    """Returns a message for each endpoint which is slower than the baseline (by more than the tolerance)."""
+    regressions = []
+    for rows, endpoints in results.items():
+        for path in ENDPOINTS:
+            expected = baseline.get(rows, {}).get(path)
+            if not expected or path not in endpoints:
+                continue
+            actual = endpoints[path]
+            if actual["requests_per_second"] < expected["requests_per_second"] * (1 - tolerance):
+                regressions.append(f"{rows} ROWS {path}: {actual['requests_per_second']} REQUESTS/S (BASELINE {expected['requests_per_second']})")
+            if actual["p99_ms"] > expected["p99_ms"] * (1 + tolerance):
+                regressions.append(f"{rows} ROWS {path}: P99 {actual['p99_ms']} MS (BASELINE {expected['p99_ms']})")
+    return regressions
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the web app against a fake in-memory Sheets document.")
+    parser.add_argument("--rows", default=LOAD_BENCHMARK_ROWS, help="sizes of the orders sheet (comma separated)")
+    parser.add_argument("--requests", type=int, default=LOAD_BENCHMARK_REQUESTS, help="requests per endpoint")
+    parser.add_argument("--latency-ms", type=float, default=LOAD_BENCHMARK_LATENCY_MS, help="latency of each API call")
+    parser.add_argument("--error-rate", type=float, default=LOAD_BENCHMARK_ERROR_RATE, help="fraction of API calls which fail with a 429")
+    parser.add_argument("--baseline", default=LOAD_BENCHMARK_BASELINE, help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="save these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=LOAD_BENCHMARK_TOLERANCE, help="allowed slowdown (as a fraction)")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = parse_args()
+    rows_list = [int(rows) for rows in args.rows.split(",")]
+    results = run_benchmark(rows_list, requests=args.requests, latency_ms=args.latency_ms, error_rate=args.error_rate)
+
+    print("----------------")
+    for rows, endpoints in results.items():
+        print(f"{rows} ROWS ({endpoints['api_calls']} API CALLS):")
+        for path in ENDPOINTS:
+            result = endpoints[path]
+            print(f"  {path}: {result['requests_per_second']} REQUESTS/S, P50 {result['p50_ms']} MS, P99 {result['p99_ms']} MS, {result['errors']} ERRORS")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+        print("SAVED BASELINE:", os.path.normpath(args.baseline))
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline, "r") as json_file:
+            regressions = find_regressions(results, json.load(json_file), tolerance=args.tolerance)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if regressions:
+            sys.exit(1)
+        print("NO REGRESSIONS (COMPARED TO BASELINE)")
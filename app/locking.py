@@ -0,0 +1,150 @@
+import os
+import stat
+import time
+import hashlib
+from threading import Lock, get_ident
+from contextlib import contextmanager, ExitStack
+
+try:
+    import fcntl # not available on windows
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_filepath:str, blocking=True):
+    """
+    Holds an exclusive lock on the given file, to coordinate with other processes on the same server.
+    (Threads within a process should use their own lock as well).
+
+    Yields whether or not the lock was acquired (always True when blocking).
+
+    Example:
+        with file_lock("/tmp/example.lock") as acquired:
+            ...
+    """
+    with open(lock_filepath, "a") as lock_file:
+        acquired = True
+        if fcntl:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                acquired = False
+        try:
+            yield acquired
+        finally:
+            if fcntl and acquired:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def atomic_write(filepath:str, mode="w", **kwargs):
+    """
+    Opens a temporary file to write to, and moves it into place once the block finishes,
+    so other threads and processes never read a half-written file (and a crash never leaves one behind).
+    If the block raises, the existing file is left as it was.
+
+    Example:
+        with atomic_write("/tmp/example.json") as json_file:
+            json.dump(data, json_file)
+    """
+    tmp_filepath = f"{filepath}.{os.getpid()}.{get_ident()}.tmp"
+    try:
+        with open(tmp_filepath, mode, **kwargs) as tmp_file:
+            yield tmp_file
+        os.replace(tmp_filepath, filepath)
+    except BaseException:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
+
+
+def document_prefix(dirpath:str, name:str, document_id:str) -> str:
+    """
+    The start of the path for files about the given google sheets document (so different documents don't share files),
+    like "/tmp/sheets-ids-0123456789ab".
+    """
+    digest = hashlib.md5(document_id.encode("utf-8")).hexdigest()[0:12]
+    return os.path.join(dirpath, f"{name}-{digest}")
+
+
+def private_directory(dirpath:str) -> str:
+    """
+    Makes sure the given directory exists (creating it if necessary), is owned by the current user, and no one else can write to it,
+    so other users on the server can't plant files in it for us to load. Returns the directory path.
+    """
+    os.makedirs(dirpath, mode=0o700, exist_ok=True)
+    info = os.stat(dirpath)
+    if hasattr(os, "getuid") and (info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+        raise PermissionError(f"EXPECTING THE '{dirpath}' DIRECTORY TO BE OWNED BY THE CURRENT USER, AND NOT WRITABLE BY ANYONE ELSE")
+    return dirpath
+
+
+class LockStats:
+    """
+    Measures contention for a lock: how often it was already held by another thread or process (so we had to wait),
+    how long we waited, and how long we held it (the critical section).
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.hold_seconds = 0.0
+        self.max_hold_seconds = 0.0
+
+    def record(self, contended, wait_seconds, hold_seconds):
+        with self.lock:
+            self.acquisitions += 1
+            self.contended += int(contended)
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self.hold_seconds += hold_seconds
+            self.max_hold_seconds = max(self.max_hold_seconds, hold_seconds)
+
+    def stats(self):
+        with self.lock:
+            count = self.acquisitions or 1
+            return {
+                "acquisitions": self.acquisitions,
+                "contended": self.contended,
+                "contention_rate": round(self.contended / count, 3),
+                "avg_wait_ms": round(self.wait_seconds / count * 1000, 3),
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+                "avg_hold_ms": round(self.hold_seconds / count * 1000, 3),
+                "max_hold_ms": round(self.max_hold_seconds * 1000, 3),
+            }
+
+
+@contextmanager
+def exclusive_lock(thread_lock, lock_filepath:str, stats:LockStats=None):
+    """
+    Holds both the given thread lock and a file lock, so only one thread (in one process on this server) at a time runs the block.
+    Records any contention in the given stats (see LockStats).
+
+    Example:
+        with exclusive_lock(self.lock, "/tmp/example.lock", stats=self.lock_stats):
+            ...
+    """
+    started = time.perf_counter()
+    contended = not thread_lock.acquire(blocking=False)
+    if contended:
+        thread_lock.acquire()
+    try:
+        with ExitStack() as stack:
+            if not stack.enter_context(file_lock(lock_filepath, blocking=False)):
+                # another process has the file lock, so wait for it:
+                stack.close()
+                contended = True
+                stack.enter_context(file_lock(lock_filepath))
+            acquired_at = time.perf_counter()
+            try:
+                yield
+            finally:
+                if stats:
+                    stats.record(contended, acquired_at - started, time.perf_counter() - acquired_at)
+    finally:
+        thread_lock.release()
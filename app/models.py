@@ -0,0 +1,144 @@
+from datetime import datetime, timezone
+
+
+def generate_timestamp():
+    return datetime.now(tz=timezone.utc)
+
+
+def parse_timestamp(ts:str):
+    """
+        ts (str) : a timestamp string like '2023-03-08 19:59:16.471152+00:00'
+    """
+    # much faster than strptime, and handles the format written by str(datetime)
+    return datetime.fromisoformat(ts)
+
+
+# FIXED SCHEMA / DECORATORS
+# ... to make sure when writing to sheet the values are in the proper order
+
+def _convert(value, converter):
+    """Converts a cell value, leaving blank or unexpected values as they are (like get_all_records does)."""
+    if value is None or value == "":
+        return ""
+    try:
+        return converter(value)
+    except (ValueError, TypeError):
+        return value
+
+
+class Record:
+    """
+    A compact record with a fixed set of fields (using slots instead of a per-instance dictionary),
+    which also supports dictionary-style access (record["name"], record.get("name"), dict(record)),
+    so it can be used anywhere records used to be plain dictionaries.
+
+    Rows of cell values are mapped to and from records by position, according to the sheet's header row.
+    """
+
+    __slots__ = ()
+    FIELDS = () # the column names, in their usual order
+    CONVERTERS = {} # how to parse the cell values in certain columns
+
+    def __init__(self, attrs=None):
+        attrs = attrs or {}
+        for field in self.FIELDS:
+            setattr(self, field, attrs.get(field, ""))
+
+    @classmethod
+    def positions(cls, header):
+        """The position of each field in the given header row (or None if the sheet has no such column)."""
+        return [header.index(field) if field in header else None for field in cls.FIELDS]
+
+    @classmethod
+    def from_row(cls, row, positions=None):
+        """Creates a record from a row of cell values.
+
+        Params:
+            positions (list) : the position of each field in the row (see positions),
+                defaults to the usual order of the fields
+        """
+        record = cls.__new__(cls)
+        row_length = len(row)
+        for field, position in zip(cls.FIELDS, positions or range(len(cls.FIELDS))):
+            value = row[position] if position is not None and position < row_length else ""
+            converter = cls.CONVERTERS.get(field)
+            setattr(record, field, _convert(value, converter) if converter else value)
+        return record
+
+    def to_row(self, header=None):
+        """The record's values in the order of the given header row (defaults to the usual order of the fields)."""
+        return [self.cell_value(column) for column in (header or self.FIELDS)]
+
+    def cell_value(self, column):
+        if column not in self.FIELDS:
+            return ""
+        value = getattr(self, column)
+        return str(value) if column == "created_at" else value
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    # DICTIONARY-STYLE ACCESS
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        return list(self.FIELDS)
+
+    def values(self):
+        return [getattr(self, field) for field in self.FIELDS]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.FIELDS]
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) == type(other) and self.values() == other.values()
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.to_dict()})"
+
+
+class Product(Record):
+    __slots__ = ("id", "name", "description", "price", "url", "created_at")
+    FIELDS = __slots__
+    CONVERTERS = {"id": int, "price": float, "created_at": parse_timestamp}
+
+
+class Order(Record):
+    __slots__ = ("id", "user_email", "product_id", "product_name", "product_price", "created_at")
+    FIELDS = __slots__
+    CONVERTERS = {"id": int, "product_id": int, "product_price": float, "created_at": parse_timestamp}
+
+
+MODEL_CLASSES = {"products": Product, "orders": Order}
+
+
+# SEED DATA
+
+DEFAULT_PRODUCTS = [
+    {'id': 1, 'name': 'Strawberries', 'description': 'Juicy organic strawberries.', 'price': 4.99, 'url': 'https://picsum.photos/id/1080/360/200'},
+    {'id': 2, 'name': 'Cup of Tea', 'description': 'An individually-prepared tea or coffee of choice.', 'price': 3.49, 'url': 'https://picsum.photos/id/225/360/200'},
+    {'id': 3, 'name': 'Textbook', 'description': 'It has all the answers.', 'price': 129.99, 'url': 'https://picsum.photos/id/24/360/200'}
+]
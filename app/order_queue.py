@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import atexit
+from datetime import datetime
+from threading import Thread, Event, Lock
+
+from app.locking import file_lock
+from app.models import generate_timestamp
+
+# whether to accept orders into a local queue, and write them to the database in batches (in the background):
+ORDER_QUEUE_ENABLED = (os.getenv("ORDER_QUEUE_ENABLED", default="false") == "true")
+# the journal file where queued orders are kept until written (should be shared by all the web server's worker processes):
+DEFAULT_ORDER_QUEUE_FILEPATH = os.path.join(os.path.dirname(__file__), "..", "order_queue.jsonl")
+ORDER_QUEUE_FILEPATH = os.getenv("ORDER_QUEUE_FILEPATH", default=DEFAULT_ORDER_QUEUE_FILEPATH)
+# write the queued orders every N milliseconds, or as soon as there are M of them, whichever comes first:
+ORDER_QUEUE_FLUSH_INTERVAL_MS = int(os.getenv("ORDER_QUEUE_FLUSH_INTERVAL_MS", default="1000"))
+ORDER_QUEUE_FLUSH_SIZE = int(os.getenv("ORDER_QUEUE_FLUSH_SIZE", default="50"))
+# how many times to try writing a batch of orders, before setting it aside (in a ".dead" file next to the journal) so later orders can be written:
+ORDER_QUEUE_MAX_ATTEMPTS = int(os.getenv("ORDER_QUEUE_MAX_ATTEMPTS", default="5"))
+
+# notes added to the end of a journal being flushed (rather than orders):
+MARKER_KEYS = ["written_ids", "flush_error"]
+
+
+class OrderQueue:
+    """
+    Accepts new orders into a durable append-only journal file (acknowledging them immediately),
+    while a background thread writes the queued orders to the database in a single batch every so often.
+
+    All worker processes on the server can share the same journal:
+    orders are appended to it under a file lock, and only one process at a time flushes it.
+    To flush, the journal is first renamed (so new orders can keep arriving in a fresh one),
+    and the renamed file is only deleted after its orders have been written.
+    If writing fails (or the process dies), the next flush tries again,
+    unless the orders were written before it failed (which is noted at the end of the renamed file, see mark_written).
+    A batch which keeps failing is eventually moved to a dead-letter file (see set_aside), for someone to look into.
+
+    Params:
+        service : the database service (see app.storage.StorageBackend)
+    """
+
+    def __init__(self, service, filepath=ORDER_QUEUE_FILEPATH, flush_interval_ms=ORDER_QUEUE_FLUSH_INTERVAL_MS, flush_size=ORDER_QUEUE_FLUSH_SIZE, max_attempts=ORDER_QUEUE_MAX_ATTEMPTS):
+        self.service = service
+        self.filepath = filepath
+        self.flushing_filepath = f"{filepath}.flushing"
+        self.dead_filepath = f"{filepath}.dead"
+        self.lock_filepath = f"{filepath}.lock"
+        self.flush_lock_filepath = f"{filepath}.flush.lock"
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_size = flush_size
+        self.max_attempts = max_attempts
+
+        self.lock = Lock()
+        self.flush_lock = Lock()
+        self.wakeup = Event()
+        self.stopped = Event()
+        self.thread = None
+
+        self.enqueued_count = 0
+        self.unflushed_count = 0 # orders this process has queued since it last moved the journal aside to flush it
+        self.dead_count = 0
+        self.flushed_count = 0
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.last_flush_ms = None
+        self.total_flush_ms = 0
+
+    # ACCEPTING ORDERS
+
+    def enqueue(self, new_order:dict):
+        """Durably records a new order to be written later."""
+        entry = dict(new_order)
+        entry["accepted_at"] = str(generate_timestamp())
+
+        with self.lock, file_lock(self.lock_filepath):
+            self.append_entry(self.filepath, entry)
+            self.enqueued_count += 1
+            self.unflushed_count += 1
+            unflushed_count = self.unflushed_count
+
+        if unflushed_count >= self.flush_size:
+            self.wakeup.set()
+
+    @staticmethod
+    def append_entry(filepath, entry:dict):
+        """Durably adds a line to the end of a journal file."""
+        with open(filepath, "a") as journal:
+            journal.write(json.dumps(entry) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    @staticmethod
+    def read_journal(filepath):
+        try:
+            with open(filepath, "r") as journal:
+                # skip a partially written last line (if the process died while writing it)
+                return [json.loads(line) for line in journal if line.endswith("\n")]
+        except FileNotFoundError:
+            return []
+
+    @classmethod
+    def unwritten_orders(cls, filepath):
+        """The orders in a journal file, or none if they have already been written (see mark_written)."""
+        entries = cls.read_journal(filepath)
+        if any("written_ids" in entry for entry in entries):
+            return []
+        return [entry for entry in entries if not any(key in entry for key in MARKER_KEYS)]
+
+    def queued_orders(self):
+        return self.unwritten_orders(self.flushing_filepath) + self.read_journal(self.filepath)
+
+    def depth(self):
+        """The number of orders waiting to be written (by any process)."""
+        return len(self.queued_orders())
+
+    def pending_orders(self, user_email):
+        """The given user's orders that have not been written yet (so we can show them anyway)."""
+        return [
+            {
+                "id": "(pending)",
+                "user_email": entry["user_email"],
+                "product_id": entry["product_id"],
+                "product_name": entry["product_name"],
+                "product_price": entry["product_price"],
+                "created_at": datetime.fromisoformat(entry["accepted_at"]),
+            }
+            for entry in self.queued_orders() if entry.get("user_email") == user_email
+        ]
+
+    # WRITING ORDERS
+
+    def flush(self):
+        """Writes all the queued orders in a single batch.
+            Returns the number of orders written (or None if another process is already flushing).
+        """
+        with self.flush_lock, file_lock(self.flush_lock_filepath, blocking=False) as acquired:
+            if not acquired:
+                return None
+
+            # orders from a previous flush that didn't finish get written first:
+            if not os.path.exists(self.flushing_filepath):
+                with self.lock, file_lock(self.lock_filepath):
+                    self.unflushed_count = 0
+                    if not os.path.exists(self.filepath):
+                        return 0
+                    os.replace(self.filepath, self.flushing_filepath)
+
+            entries = self.read_journal(self.flushing_filepath)
+            if any("written_ids" in entry for entry in entries):
+                print("ORDER QUEUE: SKIPPING ORDERS WHICH WERE ALREADY WRITTEN")
+                os.remove(self.flushing_filepath)
+                return 0
+            attempts = len([entry for entry in entries if "flush_error" in entry])
+            new_orders = [{k: v for k, v in entry.items() if k != "accepted_at"} for entry in self.unwritten_orders(self.flushing_filepath)]
+
+            start = time.perf_counter()
+            try:
+                if any(new_orders):
+                    self.service.create_orders(new_orders, on_written=self.mark_written)
+            except Exception as err:
+                self.flush_errors += 1
+                print("ORDER QUEUE FLUSH ERROR:", err)
+                self.append_entry(self.flushing_filepath, {"flush_error": str(err)})
+                if attempts + 1 >= self.max_attempts:
+                    self.set_aside(len(new_orders), attempts + 1)
+                raise
+            os.remove(self.flushing_filepath)
+
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            self.total_flush_ms += self.last_flush_ms
+            self.flush_count += 1
+            self.flushed_count += len(new_orders)
+            print(f"ORDER QUEUE FLUSHED {len(new_orders)} ORDERS IN {round(self.last_flush_ms)} MS")
+            return len(new_orders)
+
+    def mark_written(self, created_records):
+        """Notes that the orders being flushed have been written, so if anything fails after this, the next flush doesn't write them again."""
+        self.append_entry(self.flushing_filepath, {"written_ids": [record["id"] for record in created_records]})
+
+    def set_aside(self, order_count, attempts):
+        """Moves a batch of orders which keeps failing to the end of the dead-letter file (along with its errors),
+            so the orders queued after it can be written.
+        """
+        with open(self.flushing_filepath, "r") as journal, open(self.dead_filepath, "a") as dead_letters:
+            dead_letters.write(journal.read())
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+        os.remove(self.flushing_filepath)
+        self.dead_count += order_count
+        print(f"ORDER QUEUE: GAVE UP ON {order_count} ORDERS AFTER {attempts} ATTEMPTS, MOVED THEM TO '{self.dead_filepath}'")
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(timeout=self.flush_interval_ms / 1000)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass # already logged, and we'll try again next time
+
+    def start(self):
+        """Starts writing queued orders in a background thread (until the process exits)."""
+        if self.thread is None:
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Stops the background thread, after a final attempt to write any queued orders."""
+        self.stopped.set()
+        self.wakeup.set()
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "enqueued": self.enqueued_count,
+            "flushed": self.flushed_count,
+            "flushes": self.flush_count,
+            "flush_errors": self.flush_errors,
+            "dead": self.dead_count,
+            "last_flush_ms": self.last_flush_ms,
+            "avg_flush_ms": (self.total_flush_ms / self.flush_count) if self.flush_count else None,
+        }
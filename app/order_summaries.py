@@ -0,0 +1,89 @@
+import os
+import time
+from datetime import datetime, timezone
+from collections import Counter
+from threading import RLock
+
+# how long (in seconds) to trust the order summaries before rebuilding them
+# ... (they won't know about orders written by other processes in the meantime)
+ORDER_SUMMARIES_TTL = int(os.getenv("ORDER_SUMMARIES_TTL", default="60"))
+
+
+class OrderSummary:
+    """
+    Running totals of a user's orders: how many, how much they spent, when they last ordered, and what they order most.
+
+    Params:
+        user_email (str) : the user who placed the orders
+    """
+
+    def __init__(self, user_email, orders=None):
+        self.user_email = user_email
+        self.order_count = 0
+        self.total_spend = 0.0
+        self.last_order_at = None
+        self.product_counts = Counter() # (product id, product name) -> number of orders
+        for order in (orders or []):
+            self.add(order)
+
+    def add(self, order):
+        self.order_count += 1
+        if isinstance(order["product_price"], (int, float)):
+            self.total_spend += order["product_price"]
+        created_at = order["created_at"]
+        if isinstance(created_at, datetime):
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc) # like the ones the app writes (rows added by hand may not say)
+            if self.last_order_at is None or created_at > self.last_order_at:
+                self.last_order_at = created_at
+        self.product_counts[(order["product_id"], order["product_name"])] += 1
+
+    def top_products(self, limit=3):
+        """The products the user has ordered most often (most first), with how many times they ordered each."""
+        return [
+            {"product_id": product_id, "product_name": product_name, "order_count": count}
+            for (product_id, product_name), count in self.product_counts.most_common(limit)
+        ]
+
+    def to_dict(self):
+        return {
+            "user_email": self.user_email,
+            "order_count": self.order_count,
+            "total_spend": round(self.total_spend, 2),
+            "last_order_at": self.last_order_at,
+            "top_products": self.top_products(),
+        }
+
+
+class OrderSummaries:
+    """
+    An order summary (see OrderSummary) for each user, which can be built from all the orders at once,
+    and then kept up to date as new orders are written, so reading a user's totals doesn't need to go through all their orders.
+
+    Params:
+        orders (list) : the existing orders
+    """
+
+    def __init__(self, orders=None, ttl=ORDER_SUMMARIES_TTL):
+        self.ttl = ttl
+        self.lock = RLock()
+        self.summaries = {} # user email -> OrderSummary
+        self.built_at = time.monotonic()
+        self.add(orders or [])
+
+    @property
+    def expired(self):
+        return (time.monotonic() - self.built_at) > self.ttl
+
+    def add(self, orders):
+        with self.lock:
+            for order in orders:
+                user_email = order["user_email"]
+                if user_email not in self.summaries:
+                    self.summaries[user_email] = OrderSummary(user_email)
+                self.summaries[user_email].add(order)
+
+    def get(self, user_email) -> dict:
+        with self.lock:
+            summary = self.summaries.get(user_email) or OrderSummary(user_email)
+            return summary.to_dict()
@@ -0,0 +1,128 @@
+import os
+import time
+import random
+from threading import Lock
+
+# the Sheets API quotas (requests per minute) available to this process,
+# ... see: https://developers.google.com/sheets/api/limits (divide by the number of worker processes sharing the quota)
+SHEETS_READ_QUOTA = int(os.getenv("SHEETS_READ_QUOTA", default="60"))
+SHEETS_WRITE_QUOTA = int(os.getenv("SHEETS_WRITE_QUOTA", default="60"))
+# how many requests of each kind may be made at once (out of the quota), before pacing the rest evenly across the minute:
+SHEETS_BURST = int(os.getenv("SHEETS_BURST", default="10"))
+# how many times to retry a request which was rate limited (429) or failed on the server's end (5xx), waiting longer each time
+# ... (writes are only retried when rate limited, since after a server error they may have gone through anyway):
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", default="5"))
+SHEETS_BACKOFF_SECONDS = float(os.getenv("SHEETS_BACKOFF_SECONDS", default="1"))
+SHEETS_MAX_BACKOFF_SECONDS = float(os.getenv("SHEETS_MAX_BACKOFF_SECONDS", default="32"))
+
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+WRITE_RETRY_STATUS_CODES = [429] # the request was rejected before doing anything
+
+
+class TokenBucket:
+    """
+    Paces requests to stay within a per-minute quota.
+
+    Up to "burst" requests can be made right away, and the rest are spread evenly across the minute,
+    so that no sixty second window ever sees more than the quota.
+
+    Params:
+        quota (int) : requests per minute
+        burst (int) : how many requests can be made at once
+    """
+
+    def __init__(self, quota, burst=SHEETS_BURST):
+        if quota < 1:
+            raise ValueError(f"EXPECTING A QUOTA OF AT LEAST ONE REQUEST PER MINUTE (GOT {quota})")
+        self.burst = max(1, min(burst, quota - 1))
+        self.rate = max(1, quota - self.burst) / 60 # tokens per second
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self.lock = Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self):
+        """Takes a token (possibly one which isn't available yet),
+            and returns the number of seconds to wait before making the request (zero if it can be made now).
+        """
+        with self.lock:
+            self.refill()
+            self.tokens -= 1
+            return max(0, -self.tokens / self.rate)
+
+    def remaining(self):
+        """How many requests can be made right now without waiting."""
+        with self.lock:
+            self.refill()
+            return max(0, int(self.tokens))
+
+
+class RequestScheduler:
+    """
+    Keeps this process's API requests within the read and write quotas (waiting instead of being rate limited),
+    and decides whether and when to retry failed requests (with exponential backoff, plus some random jitter,
+    so that retries from different requests don't all happen at the same time).
+    """
+
+    def __init__(self, read_quota=SHEETS_READ_QUOTA, write_quota=SHEETS_WRITE_QUOTA, burst=SHEETS_BURST,
+                    max_retries=SHEETS_MAX_RETRIES, backoff_seconds=SHEETS_BACKOFF_SECONDS, max_backoff_seconds=SHEETS_MAX_BACKOFF_SECONDS):
+        self.buckets = {"read": TokenBucket(read_quota, burst), "write": TokenBucket(write_quota, burst)}
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self.lock = Lock()
+        self.waits = 0
+        self.wait_seconds = 0
+        self.retries = 0
+
+    @staticmethod
+    def kind(method):
+        """Reads use GET requests, while writes use POST or PUT."""
+        return "read" if method.upper() == "GET" else "write"
+
+    def reserve(self, method):
+        """Reserves quota for a request, and returns the number of seconds to wait before making it."""
+        delay = self.buckets[self.kind(method)].reserve()
+        if delay:
+            with self.lock:
+                self.waits += 1
+                self.wait_seconds += delay
+        return delay
+
+    def wait(self, method):
+        """Waits until the request can be made within the quota."""
+        delay = self.reserve(method)
+        if delay:
+            time.sleep(delay)
+
+    def should_retry(self, status_code, attempt, method="GET"):
+        """Reads are retried when rate limited or after a server error, but writes only when rate limited
+            (a write which failed on the server's end may still have been applied, so retrying it could apply it twice).
+        """
+        status_codes = RETRY_STATUS_CODES if self.kind(method) == "read" else WRITE_RETRY_STATUS_CODES
+        return status_code in status_codes and attempt < self.max_retries
+
+    def backoff(self, attempt):
+        """The number of seconds to wait before the given retry attempt (starting at zero)."""
+        with self.lock:
+            self.retries += 1
+        delay = self.backoff_seconds * (2 ** attempt) + random.uniform(0, self.backoff_seconds)
+        return min(delay, self.max_backoff_seconds)
+
+    def stats(self):
+        return {
+            "reads_remaining": self.buckets["read"].remaining(),
+            "writes_remaining": self.buckets["write"].remaining(),
+            "waits": self.waits,
+            "wait_ms": round(self.wait_seconds * 1000),
+            "retries": self.retries,
+        }
+
+
+# shared by every client in the process, since they all draw on the same quota:
+scheduler = RequestScheduler()
@@ -0,0 +1,224 @@
+import os
+import sys
+import time
+from itertools import count
+from collections import OrderedDict
+from threading import RLock, Thread
+
+from app.columnar import ColumnarRecords
+from app.single_flight import SingleFlight
+
+# how long (in seconds) cached records are considered fresh:
+RECORDS_CACHE_TTL = int(os.getenv("RECORDS_CACHE_TTL", default="30"))
+# approximate upper bound on the size of all cached records (least recently used sheets get evicted first):
+RECORDS_CACHE_MAX_BYTES = int(os.getenv("RECORDS_CACHE_MAX_BYTES", default=str(50 * 1024 * 1024)))
+# whether to keep serving expired records while fetching new ones in the background:
+RECORDS_CACHE_STALE_WHILE_REVALIDATE = (os.getenv("RECORDS_CACHE_STALE_WHILE_REVALIDATE", default="false") == "true")
+
+
+# how many records to measure when estimating the size of a list of records:
+ESTIMATE_SAMPLE_SIZE = 100
+
+
+def estimate_size(records):
+    """Approximates how many bytes of memory a list of records occupies,
+        by measuring an evenly spaced sample of them (measuring every record of a large sheet would take longer than parsing it).
+        The column names are shared by all the records, so they aren't counted.
+    """
+    nbytes = sys.getsizeof(records)
+    record_count = len(records)
+    if not record_count:
+        return nbytes
+    step = max(1, record_count // ESTIMATE_SAMPLE_SIZE)
+    sample = [records[i] for i in range(0, record_count, step)]
+    sample_nbytes = sum([sys.getsizeof(record) + sum([sys.getsizeof(value) for value in record.values()]) for record in sample])
+    return nbytes + round(sample_nbytes / len(sample) * record_count)
+
+
+def copy_records(records):
+    """A copy of the given records, which callers can change without affecting the original
+        (columnar records are read-only, so they are shared instead of copied).
+    """
+    return records if isinstance(records, ColumnarRecords) else list(records)
+
+
+class CacheEntry:
+    def __init__(self, records, version=None):
+        self.records = records
+        self.nbytes = estimate_size(records)
+        self.stored_at = time.monotonic()
+        self.version = version
+
+    def age(self):
+        return time.monotonic() - self.stored_at
+
+
+class RecordCache:
+    """
+    An in-process cache of parsed records, keyed by sheet name.
+
+    Reads go through the cache (see get), and writers are expected to update or invalidate
+    the corresponding entry (see append, set, and invalidate), so users see their own writes immediately.
+
+    Params:
+        ttl (int) : number of seconds an entry is considered fresh
+
+        max_bytes (int) : approximate memory budget, enforced by evicting the least recently used entries
+
+        stale_while_revalidate (bool) : whether to serve an expired entry while refreshing it in a background thread
+    """
+
+    def __init__(self, ttl=RECORDS_CACHE_TTL, max_bytes=RECORDS_CACHE_MAX_BYTES, stale_while_revalidate=RECORDS_CACHE_STALE_WHILE_REVALIDATE):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stale_while_revalidate = stale_while_revalidate
+
+        self.lock = RLock()
+        self.entries = OrderedDict() # least recently used first
+        self.refreshing = set() # keys with a background refresh in progress
+        self.versions = count(1) # each change to an entry gets a new version number
+        self.flights = SingleFlight() # so concurrent misses for the same key share one call to the loader
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def nbytes(self):
+        return sum([entry.nbytes for entry in self.entries.values()])
+
+    def get(self, key, loader):
+        """Returns the cached records for the given key,
+            or calls the loader function to fetch them (and caches the result).
+            If other threads miss the same key while the records are being fetched, they wait for them, instead of fetching them again.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                if entry.age() <= self.ttl:
+                    self.hits += 1
+                    return copy_records(entry.records)
+                if self.stale_while_revalidate:
+                    self.stale_hits += 1
+                    self.revalidate(key, loader)
+                    return copy_records(entry.records)
+            self.misses += 1
+
+        records = self.flights.do(key, lambda: self.load(key, loader))
+        return copy_records(records)
+
+    def load(self, key, loader):
+        with self.lock:
+            entry = self.entries.get(key)
+            stale_records = entry.records if entry else None
+
+        records = loader()
+        with self.lock:
+            # don't clobber any records written while we were fetching:
+            current = self.entries.get(key)
+            if current is None or current.records is stale_records:
+                self.set(key, records)
+        return records
+
+    def peek(self, key):
+        """Returns the cached records for the given key if they are fresh, otherwise None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.age() > self.ttl:
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return copy_records(entry.records)
+
+    def version(self, key):
+        """The version number of the cached records for the given key, which changes whenever they do,
+            or None if there aren't any fresh records.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.age() > self.ttl:
+                return None
+            return entry.version
+
+    def stale(self, key):
+        """Returns the cached records for the given key even if they have expired (or None if there aren't any)."""
+        with self.lock:
+            entry = self.entries.get(key)
+            return copy_records(entry.records) if entry is not None else None
+
+    def revalidate(self, key, loader):
+        """Refreshes the entry in a background thread (at most one refresh per key at a time)."""
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+            entry = self.entries.get(key)
+            stale_records = entry.records if entry else None
+
+        def refresh():
+            try:
+                records = loader()
+                with self.lock:
+                    # don't clobber any records written while we were fetching:
+                    current = self.entries.get(key)
+                    if current is None or current.records is stale_records:
+                        self.set(key, records)
+            except Exception as err:
+                print("CACHE REFRESH ERROR:", key, err)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        Thread(target=refresh, daemon=True).start()
+
+    def set(self, key, records):
+        with self.lock:
+            self.entries[key] = CacheEntry(copy_records(records), version=next(self.versions))
+            self.entries.move_to_end(key)
+            self.evict()
+
+    def append(self, key, new_records):
+        """Adds newly written records to an existing entry (write-through).
+            If there is no entry, there is nothing to update (the next read will fetch everything).
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            new_records = list(new_records)
+            entry.records = entry.records + new_records
+            entry.nbytes += estimate_size(new_records) - sys.getsizeof(new_records) # just the records, not their list
+            entry.version = next(self.versions)
+            self.evict()
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def evict(self):
+        """Drops least recently used entries until the cache fits within its memory budget
+            (but always keeps the most recently used one, even if it doesn't fit by itself, rather than not caching a large sheet at all).
+        """
+        with self.lock:
+            while len(self.entries) > 1 and self.nbytes > self.max_bytes:
+                key, _ = self.entries.popitem(last=False)
+                self.evictions += 1
+                print("EVICTING CACHED RECORDS:", key)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.nbytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.flights.coalesced,
+            }
@@ -0,0 +1,75 @@
+import os
+import time
+from threading import RLock
+
+# how long (in seconds) to trust an index before rebuilding it
+# ... (it won't know about rows written by other processes in the meantime)
+RECORDS_INDEX_TTL = int(os.getenv("RECORDS_INDEX_TTL", default="60"))
+
+
+def row_ranges(row_numbers):
+    """Groups row numbers into as few contiguous (start, end) ranges as possible.
+
+    Example: [2, 3, 4, 7, 9, 10] => [(2, 4), (7, 7), (9, 10)]
+    """
+    ranges = []
+    for row_number in sorted(set(row_numbers)):
+        if ranges and row_number == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], row_number)
+        else:
+            ranges.append((row_number, row_number))
+    return ranges
+
+
+class SecondaryIndex:
+    """
+    Maps each value in a given column of a sheet to the numbers of the rows containing that value,
+    so we can fetch only the matching rows instead of the whole sheet.
+
+    Values are compared as strings (the way the sheet displays them).
+
+    Params:
+        values (list) : the column's values, starting with the first record (row 2)
+    """
+
+    def __init__(self, values, ttl=RECORDS_INDEX_TTL):
+        self.ttl = ttl
+        self.lock = RLock()
+        self.rows = {}
+        self.built_at = time.monotonic()
+        for row_number, value in enumerate(values, start=2):
+            self.add(value, row_number)
+
+    @property
+    def expired(self):
+        return (time.monotonic() - self.built_at) > self.ttl
+
+    def add(self, value, row_number:int):
+        with self.lock:
+            self.rows.setdefault(str(value), []).append(row_number)
+
+    def lookup(self, value):
+        with self.lock:
+            return list(self.rows.get(str(value), []))
+
+
+class UniqueIndex:
+    """
+    Maps each value in a given column (like "id") to the record containing that value,
+    so we can look up a record without going through all of them.
+
+    Values are compared as strings (the way the sheet displays them).
+
+    Params:
+        records (list) : the records to index
+
+        version : the version of the records (see RecordCache.version), to tell whether the index is still up to date
+    """
+
+    def __init__(self, records, column_name="id", version=None):
+        self.column_name = column_name
+        self.version = version
+        self.records = {str(record[column_name]): record for record in records}
+
+    def get(self, value):
+        return self.records.get(str(value))
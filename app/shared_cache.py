@@ -0,0 +1,124 @@
+import os
+import mmap
+import time
+import pickle
+import struct
+from threading import Lock
+
+from app.record_cache import copy_records
+from app.locking import file_lock, atomic_write, document_prefix, private_directory
+
+# whether the web server's worker processes should share their latest records (instead of each fetching their own):
+SHARED_CACHE_ENABLED = (os.getenv("SHARED_CACHE_ENABLED", default="false") == "true")
+# where to keep the shared records (should be a local directory shared by all the server's worker processes, which only they can write to):
+DEFAULT_SHARED_CACHE_DIRPATH = os.path.join(os.path.dirname(__file__), "..", "cache")
+SHARED_CACHE_DIRPATH = os.getenv("SHARED_CACHE_DIRPATH", default=DEFAULT_SHARED_CACHE_DIRPATH)
+
+
+class VersionStamp:
+    """
+    A version number in a tiny memory-mapped file, so every process on the server sees the same number,
+    and checking it is just a memory read (no system calls).
+    """
+
+    def __init__(self, filepath):
+        self.lock_filepath = f"{filepath}.lock"
+        self.lock = Lock()
+
+        fd = os.open(filepath, os.O_RDWR | os.O_CREAT)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8) # starts at zero
+            self.memory = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    def read(self):
+        return struct.unpack_from("<Q", self.memory, 0)[0]
+
+    def bump(self):
+        """Increments the version number, and returns the new one."""
+        with self.lock, file_lock(self.lock_filepath):
+            version = self.read() + 1
+            struct.pack_into("<Q", self.memory, 0, version)
+            return version
+
+
+class SharedCache:
+    """
+    A cache of the latest records from each sheet, shared by all the worker processes on the server.
+
+    Each sheet has a version stamp, which any worker bumps when it writes to the sheet,
+    signaling the other workers to discard what they have cached for that sheet.
+    Alongside it, a snapshot file holds the latest records (tagged with the version they belong to),
+    so a worker which needs the records can load them from disk instead of fetching them from the API.
+
+    Params:
+        document_id (str) : the google sheets document, so different documents don't share records
+    """
+
+    def __init__(self, document_id, dirpath=SHARED_CACHE_DIRPATH):
+        self.prefix = document_prefix(private_directory(dirpath), "sheets-cache", document_id)
+        self.lock = Lock()
+        self.stamps = {}
+
+        self.snapshot_hits = 0
+        self.snapshot_misses = 0
+        self.publishes = 0
+
+    def stamp(self, sheet_name) -> VersionStamp:
+        with self.lock:
+            if sheet_name not in self.stamps:
+                self.stamps[sheet_name] = VersionStamp(f"{self.prefix}-{sheet_name}.version")
+            return self.stamps[sheet_name]
+
+    def snapshot_filepath(self, sheet_name):
+        return f"{self.prefix}-{sheet_name}.snapshot"
+
+    def version(self, sheet_name):
+        return self.stamp(sheet_name).read()
+
+    def bump(self, sheet_name):
+        """Call after writing to a sheet, to invalidate what every worker has cached. Returns the new version."""
+        return self.stamp(sheet_name).bump()
+
+    def load(self, sheet_name, max_age=None):
+        """Returns the shared records for the given sheet,
+            or None if there aren't any for the current version (or they are older than max_age seconds).
+        """
+        version = self.version(sheet_name)
+        try:
+            with open(self.snapshot_filepath(sheet_name), "rb") as snapshot_file:
+                snapshot_version, stored_at, records = pickle.load(snapshot_file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            snapshot_version = None
+
+        if snapshot_version != version or (max_age is not None and time.time() - stored_at > max_age):
+            self.snapshot_misses += 1
+            return None
+
+        self.snapshot_hits += 1
+        return records
+
+    def publish(self, sheet_name, records, version):
+        """Shares the latest records for the given sheet, as of the given version
+            (unless the version has changed since, in which case they are already out of date).
+        """
+        stamp = self.stamp(sheet_name)
+        with stamp.lock, file_lock(stamp.lock_filepath):
+            if stamp.read() != version:
+                return False
+
+            with atomic_write(self.snapshot_filepath(sheet_name), "wb") as snapshot_file:
+                pickle.dump((version, time.time(), copy_records(records)), snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.publishes += 1
+        return True
+
+    def stats(self):
+        return {
+            "versions": {sheet_name: stamp.read() for sheet_name, stamp in self.stamps.items()},
+            "snapshot_hits": self.snapshot_hits,
+            "snapshot_misses": self.snapshot_misses,
+            "publishes": self.publishes,
+        }
@@ -0,0 +1,87 @@
+import os
+import time
+from threading import Lock
+
+from google.auth.transport.requests import AuthorizedSession
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+from gspread import Client
+from gspread.auth import DEFAULT_SCOPES
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+from app.rate_limiter import scheduler
+
+# how many connections to the Sheets API each worker process keeps open (and re-uses), for requests handled in parallel:
+SHEETS_POOL_SIZE = int(os.getenv("SHEETS_POOL_SIZE", default="10"))
+
+
+class PooledSession(AuthorizedSession):
+    """
+    An authorized HTTP session, which can be shared by all the threads in a worker process.
+
+    Keeps a pool of open (keep-alive) connections to the API, so requests in different threads can run in parallel,
+    without each one opening a new connection.
+    When the access token expires, only one thread refreshes it (while the others wait and then use the new token),
+    instead of every in-flight request refreshing its own.
+
+    Params:
+        credentials : the google service account credentials
+        pool_size (int) : the maximum number of connections to keep open
+    """
+
+    def __init__(self, credentials, pool_size=SHEETS_POOL_SIZE):
+        super().__init__(credentials)
+        self.pool_size = pool_size
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+        self.refresh_lock = Lock()
+        self.token_refreshes = 0
+
+    def refresh_token(self):
+        """Refreshes the access token if it has expired (just once, even if several threads notice at the same time)."""
+        if not self.credentials.valid:
+            with self.refresh_lock:
+                if not self.credentials.valid:
+                    print("REFRESHING ACCESS TOKEN...")
+                    self.credentials.refresh(self._auth_request)
+                    self.token_refreshes += 1
+
+    def request(self, method, url, *args, **kwargs):
+        self.refresh_token()
+        return super().request(method, url, *args, **kwargs)
+
+    def stats(self):
+        return {"pool_size": self.pool_size, "token_refreshes": self.token_refreshes}
+
+
+class ScheduledHTTPClient(HTTPClient):
+    """
+    Makes each API request when the quota allows (instead of getting rate limited),
+    and retries requests which were rate limited anyway, or (for reads) failed on the server's end, after a backoff.
+    See RequestScheduler.
+    """
+
+    scheduler = scheduler
+
+    def request(self, method, endpoint, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.scheduler.wait(method)
+            try:
+                return super().request(method, endpoint, *args, **kwargs)
+            except APIError as err:
+                if not self.scheduler.should_retry(err.code, attempt, method):
+                    raise
+                delay = self.scheduler.backoff(attempt)
+                print(f"API ERROR {err.code}, RETRYING IN {round(delay, 1)} SECONDS...")
+                time.sleep(delay)
+                attempt += 1
+
+
+def authorize(credentials_filepath, pool_size=SHEETS_POOL_SIZE) -> Client:
+    """Returns a gspread client, which uses a pooled session (see PooledSession), and paces its requests (see ScheduledHTTPClient)."""
+    credentials = Credentials.from_service_account_file(credentials_filepath, scopes=DEFAULT_SCOPES)
+    return Client(auth=credentials, session=PooledSession(credentials, pool_size=pool_size), http_client=ScheduledHTTPClient)
@@ -0,0 +1,59 @@
+from threading import Lock, Event
+
+
+class Flight:
+    """A call in progress, which other callers can wait for."""
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Makes sure only one call for a given key is in progress at a time.
+    Callers who ask for the same key while it is in progress wait for that call to finish, and share its result (or error),
+    instead of making the same call again.
+
+    Example:
+        flights = SingleFlight()
+        records = flights.do("products", lambda: fetch_records("products"))
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.flights = {} # key -> Flight
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as err:
+            flight.error = err
+            raise
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self.flights)}
@@ -0,0 +1,120 @@
+import os
+import time
+import pickle
+from threading import Lock
+
+from app.record_cache import copy_records
+from app.locking import file_lock, atomic_write, document_prefix, private_directory
+
+# whether new worker processes should start out with the records saved by the last one (refreshing them in the background):
+WARM_START_ENABLED = (os.getenv("WARM_START_ENABLED", default="false") == "true")
+# where to save the records (should be a local directory which survives restarts and deploys, and which only the app can write to):
+DEFAULT_SNAPSHOT_DIRPATH = os.path.join(os.path.dirname(__file__), "..", "cache")
+SNAPSHOT_DIRPATH = os.getenv("SNAPSHOT_DIRPATH", default=DEFAULT_SNAPSHOT_DIRPATH)
+# the oldest saved records (in seconds) we'd still show while fetching the latest ones:
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", default=str(24 * 60 * 60)))
+
+# bump whenever the contents of the snapshot files change, so we never load ones written by an older version of the app:
+SNAPSHOT_FORMAT = 1
+
+
+class Snapshot:
+    """
+    The records from a sheet as of a certain time, along with where they end in the sheet (see SyncState),
+    so the next fetch can get just the rows added since.
+    """
+
+    def __init__(self, records, sync_state=None, saved_at=None):
+        self.records = records
+        self.sync_state = sync_state
+        self.saved_at = saved_at or time.time()
+
+    @property
+    def age(self):
+        return time.time() - self.saved_at
+
+
+class SnapshotStore:
+    """
+    Saves the latest records from each sheet to local disk (in a compact binary format), so a new worker process
+    (after a restart or deploy) can serve them right away instead of waiting for the API.
+
+    Also makes sure that when several processes need to fetch the same sheet at the same time (like when they all start at once),
+    only one of them does, and the others use what it saved (see single_flight).
+
+    Params:
+        document_id (str) : the google sheets document, so different documents don't share snapshots
+
+        max_age (int) : the oldest snapshot (in seconds) to load
+    """
+
+    def __init__(self, document_id, dirpath=SNAPSHOT_DIRPATH, max_age=SNAPSHOT_MAX_AGE):
+        self.prefix = document_prefix(private_directory(dirpath), "sheets-snapshot", document_id)
+        self.max_age = max_age
+        self.lock = Lock()
+
+        self.saves = 0
+        self.loads = 0
+        self.fetches = 0
+        self.coalesced = 0
+
+    def filepath(self, sheet_name):
+        return f"{self.prefix}-{sheet_name}.snapshot"
+
+    def load(self, sheet_name):
+        """Returns the saved snapshot for the given sheet, or None if there isn't one (or it is too old, or unreadable)."""
+        try:
+            with open(self.filepath(sheet_name), "rb") as snapshot_file:
+                snapshot_format, snapshot = pickle.load(snapshot_file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError, AttributeError, ImportError) as err:
+            if not isinstance(err, FileNotFoundError):
+                print("UNABLE TO LOAD SNAPSHOT:", sheet_name, err)
+            return None
+
+        if snapshot_format != SNAPSHOT_FORMAT or snapshot.age > self.max_age:
+            return None
+
+        with self.lock:
+            self.loads += 1
+        return snapshot
+
+    def save(self, sheet_name, records, sync_state=None) -> Snapshot:
+        snapshot = Snapshot(copy_records(records), sync_state)
+        with atomic_write(self.filepath(sheet_name), "wb") as snapshot_file:
+            pickle.dump((SNAPSHOT_FORMAT, snapshot), snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self.lock:
+            self.saves += 1
+        return snapshot
+
+    def single_flight(self, sheet_name, fetch) -> Snapshot:
+        """
+        Calls the fetch function (which should save and return a new snapshot), unless another process is already fetching the same sheet,
+        in which case waits for it to finish, and returns the snapshot it saved instead.
+
+        Params:
+            fetch (function) : fetches the sheet's records, and saves them (see save)
+        """
+        started = time.time()
+        lock_filepath = f"{self.filepath(sheet_name)}.lock"
+        with file_lock(lock_filepath, blocking=False) as acquired:
+            if acquired:
+                return self.fetch(fetch)
+
+        # another process is fetching the sheet, so wait for it:
+        with file_lock(lock_filepath):
+            snapshot = self.load(sheet_name)
+            if snapshot is not None and snapshot.saved_at >= started:
+                with self.lock:
+                    self.coalesced += 1
+                return snapshot
+            return self.fetch(fetch) # it failed, so try ourselves
+
+    def fetch(self, fetch):
+        with self.lock:
+            self.fetches += 1
+        return fetch()
+
+    def stats(self):
+        with self.lock:
+            return {"saves": self.saves, "loads": self.loads, "fetches": self.fetches, "coalesced": self.coalesced}
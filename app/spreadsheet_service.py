@@ -7,94 +7,669 @@
 # ... https://raw.githubusercontent.com/prof-rossetti/flask-sheets-template-2020/master/web_app/spreadsheet_service.py
 
 import os
-from datetime import datetime, timezone
+import time
 from pprint import pprint
+from threading import RLock
 
-from dotenv import load_dotenv
-import gspread
-from gspread.exceptions import SpreadsheetNotFound
 
+from app.models import MODEL_CLASSES, DEFAULT_PRODUCTS, generate_timestamp, parse_timestamp
+from app.columnar import ColumnarRecords
+from app.instrumentation import timed, track_api_response
+from app.record_cache import RecordCache
+from app.shared_cache import SharedCache, SHARED_CACHE_ENABLED
+from app.snapshot_store import SnapshotStore, WARM_START_ENABLED
+from app.id_allocator import IdAllocator
+from app.record_index import SecondaryIndex, UniqueIndex, row_ranges
+from app.sync_state import SyncState
+from app.order_summaries import OrderSummaries
+from app.single_flight import SingleFlight
 
-load_dotenv()
+
+# note: gspread (and the google auth libraries it uses) are imported only when first needed,
+# ... so starting the web server doesn't wait for them (see the client property)
 
 DEFAULT_FILEPATH = os.path.join(os.path.dirname(__file__), "..", "google-credentials.json")
 GOOGLE_CREDENTIALS_FILEPATH = os.getenv("GOOGLE_CREDENTIALS_FILEPATH", default=DEFAULT_FILEPATH)
 
 GOOGLE_SHEETS_DOCUMENT_ID = os.getenv("GOOGLE_SHEETS_DOCUMENT_ID", default="OOPS Please get the spreadsheet identifier from its URL, and set the 'GOOGLE_SHEETS_DOCUMENT_ID' environment variable accordingly...")
 
+# how long (in seconds) to trust the cached document and worksheet metadata, before fetching it again:
+SHEETS_METADATA_TTL = int(os.getenv("SHEETS_METADATA_TTL", default="300"))
+
+# whether to parse records column by column (faster for large sheets), see ColumnarRecords:
+COLUMNAR_RECORDS = (os.getenv("COLUMNAR_RECORDS", default="false") == "true")
+
+# sheets which only ever get rows appended (not edited), so we can fetch just the new rows when our cached records expire:
+INCREMENTAL_SYNC_SHEETS = [name for name in os.getenv("INCREMENTAL_SYNC_SHEETS", default="orders").split(",") if name]
+
+# columns we frequently search by, for which we maintain an index of matching row numbers:
+INDEXED_COLUMNS = {"orders": ["user_email"]}
+
+# whether to check that no other server handed out the same ids, after each write (see check_ids)
+# ... only needed when running the app on more than one server (each one has its own id counter), costs an extra read per write:
+ID_CONFLICT_CHECK = (os.getenv("ID_CONFLICT_CHECK", default="false") == "true")
+
 
 class SpreadsheetService:
-    # TODO: consider implementing a locking mechanism on sheet writes, to prevent overwriting (if it becomes an issue)
+    # concurrent writers don't overwrite each other: the API appends each batch of rows after the end of the table (atomically),
+    # ... and ids come from a counter which only one process on this server can use at a time (see IdAllocator, and check_ids for multiple servers)
     # ... however we know that if we want a more serious database solution, we would choose SQL database (and this app is just a small scale demo)
 
-    def __init__(self, credentials_filepath=GOOGLE_CREDENTIALS_FILEPATH, document_id=GOOGLE_SHEETS_DOCUMENT_ID):
+    def __init__(self, credentials_filepath=GOOGLE_CREDENTIALS_FILEPATH, document_id=GOOGLE_SHEETS_DOCUMENT_ID, metadata_ttl=SHEETS_METADATA_TTL, records_cache=None, id_allocator=None, columnar=COLUMNAR_RECORDS, shared_cache=None, client=None, snapshots=None):
         print("INITIALIZING NEW SPREADSHEET SERVICE...")
 
-        #self.credentials = credentials or ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_FILEPATH, AUTH_SCOPE)
-        #self.credentials = ServiceAccountCredentials._from_parsed_json_keyfile(json.loads(GOOGLE_API_CREDENTIALS), AUTH_SCOPE)
-        #self.client = gspread.authorize(self.credentials) #> <class 'gspread.client.Client'>
-        self.client = gspread.service_account(filename=credentials_filepath)
+        # the client gets created (and authorized) on first use, see the client property:
+        self.credentials_filepath = credentials_filepath
+        self._client = client
+        self.client_lock = RLock()
 
         self.document_id = document_id
 
-        # TODO: consider storing and caching the latest version of each sheet, given the small number of sheets
-        # ... showing preference for speed over brevity
-        #self.products_sheet = None
-        #self.orders_sheet = None
+        # cache the document and a registry of its worksheets (by name), given the small number of sheets
+        # ... so we don't make metadata API calls every time we read or write some records
+        self.metadata_ttl = metadata_ttl
+        self.metadata_lock = RLock()
+        self._doc = None
+        self._sheets = {}
+        self._sheets_loaded_at = None
+        self.metadata_calls = 0
+        self.metadata_calls_saved = 0
+
+        self.columnar = columnar
+
+        # cache the parsed records from each sheet as well (see RecordCache for the settings)
+        self.records_cache = records_cache or RecordCache()
+
+        # optionally share the latest records with the server's other worker processes (see SharedCache)
+        if shared_cache is None and SHARED_CACHE_ENABLED:
+            shared_cache = SharedCache(document_id)
+        self.shared_cache = shared_cache
+        self.seen_versions = {} # sheet name -> the shared version of the records we have cached
+
+        # optionally save the latest records to disk, so the next process can start out with them (see SnapshotStore and warm_start)
+        if snapshots is None and WARM_START_ENABLED:
+            snapshots = SnapshotStore(document_id)
+        self.snapshots = snapshots
+        self.warm_started = set() # sheet names
+        self.warm_start_lock = RLock()
+
+        # hand out ids from a counter, instead of reading the whole sheet to find the next one:
+        self.id_allocator = id_allocator or IdAllocator(document_id)
+        self.id_conflict_check = ID_CONFLICT_CHECK
+        self.id_conflicts = 0
+
+        # indexes of row numbers, to find matching records without reading the whole sheet (see find_records)
+        self.indexed_columns = INDEXED_COLUMNS
+        self.indexes = {} # (sheet name, column name) -> SecondaryIndex
+        self.product_index = None # UniqueIndex of the cached products, by id (see get_product)
+        self.headers = {} # sheet name -> list of column names
+
+        # for append-only sheets, remember where our cached records end, so we can fetch only the rows after that (see sync_records)
+        self.incremental_sheets = INCREMENTAL_SYNC_SHEETS
+        self.sync_states = {} # sheet name -> SyncState
+        self.tail_syncs = 0
+        self.tail_rows_fetched = 0
+        self.full_reloads = 0
+
+        # each user's order totals, built from all the orders on first use, then kept up to date as orders are written (see get_user_summary)
+        self.order_summaries = None # OrderSummaries
+        self.flights = SingleFlight() # so concurrent requests share one rebuild
+        self.summaries_lock = RLock() # so a rebuild doesn't miss orders written at the same time
 
-    @staticmethod
-    def generate_timestamp():
-        return datetime.now(tz=timezone.utc)
+    @property
+    def client(self):
+        """The gspread client, created on first use (and shared by all threads)."""
+        if self._client is None:
+            with self.client_lock:
+                if self._client is None:
+                    print("AUTHORIZING SPREADSHEET CLIENT...")
+                    from app.sheets_client import authorize
+
+                    #self.credentials = credentials or ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_FILEPATH, AUTH_SCOPE)
+                    #self.credentials = ServiceAccountCredentials._from_parsed_json_keyfile(json.loads(GOOGLE_API_CREDENTIALS), AUTH_SCOPE)
+                    #self.client = gspread.authorize(self.credentials) #> <class 'gspread.client.Client'>
+                    #client = gspread.service_account(filename=self.credentials_filepath)
+                    # a pooled session, so parallel requests (in a threaded web server) can share it, see PooledSession:
+                    client = authorize(self.credentials_filepath)
+                    # count each API call (and how much data it returns), see app.instrumentation:
+                    client.http_client.session.hooks["response"].append(track_api_response)
+                    self._client = client
+        return self._client
+
+    generate_timestamp = staticmethod(generate_timestamp)
+
+    parse_timestamp = staticmethod(parse_timestamp)
+
+    # METADATA
 
-    @staticmethod
-    def parse_timestamp(ts:str):
+    @property
+    @timed("doc")
+    def doc(self):
+        """Opens the document the first time, and re-uses it afterwards.
+            note: use refresh() to forget it and open it again
         """
-            ts (str) : a timestamp string like '2023-03-08 19:59:16.471152+00:00'
+        with self.metadata_lock:
+            if self._doc is None:
+                self._doc = self.client.open_by_key(self.document_id) #> <class 'gspread.models.Spreadsheet'>
+                self.metadata_calls += 1
+            return self._doc
+
+    @property
+    def sheets_expired(self):
+        if self._sheets_loaded_at is None:
+            return True
+        return (time.monotonic() - self._sheets_loaded_at) > self.metadata_ttl
+
+    def load_sheets(self):
+        """Fetches all worksheets in a single metadata API call, and registers them by name."""
+        with self.metadata_lock:
+            if self._doc is None:
+                self._doc = self.client.open_by_key(self.document_id)
+                self.metadata_calls += 1
+            worksheets = self._doc.worksheets()
+            self.metadata_calls += 1
+            self._sheets = {sheet.title: sheet for sheet in worksheets}
+            self._sheets_loaded_at = time.monotonic()
+
+    def refresh(self):
+        """Forgets the cached document and worksheets, so they will be fetched again on next use
+            (for example after a sheet has been renamed, added, or removed).
+        """
+        print("REFRESHING SPREADSHEET METADATA...")
+        with self.metadata_lock:
+            self._doc = None
+            self._sheets = {}
+            self._sheets_loaded_at = None
+            self.headers = {}
+            self.indexes = {}
+
+    @timed("get_sheet")
+    def get_sheet(self, sheet_name):
+        with self.metadata_lock:
+            if self.sheets_expired:
+                self.load_sheets()
+            elif sheet_name in self._sheets:
+                # otherwise we would have opened the document and looked up the worksheet (two calls):
+                self.metadata_calls_saved += 2
+
+            if sheet_name not in self._sheets:
+                # maybe the sheet was just created or renamed, so check again before giving up:
+                self.refresh()
+                self.load_sheets()
+
+            try:
+                return self._sheets[sheet_name] #> <class 'gspread.models.Worksheet'>
+            except KeyError:
+                from gspread.exceptions import WorksheetNotFound
+                raise WorksheetNotFound(sheet_name)
+
+    def with_sheet(self, sheet_name, operation):
+        """Performs an operation on the given (cached) sheet.
+            If the API complains the sheet no longer exists where we thought it was,
+            refreshes the metadata and tries once more.
+
+        Params:
+            operation (function) : accepts the sheet, and returns some result
+
+        Returns the sheet and the result.
+        """
+        from gspread.exceptions import APIError
+
+        sheet = self.get_sheet(sheet_name)
+        try:
+            return sheet, operation(sheet)
+        except APIError as err:
+            if not self.is_stale_sheet_error(err):
+                raise
+            print("STALE SHEET:", sheet_name, err)
+            self.refresh()
+            sheet = self.get_sheet(sheet_name)
+            return sheet, operation(sheet)
+
+    def with_sheets(self, sheet_names, operation):
+        """Like with_sheet, for an operation on several sheets at once (such as a batch request).
+
+        Params:
+            operation (function) : accepts a list of the sheets (in the same order as the names), and returns some result
+
+        Returns the sheets and the result.
         """
-        date_format = "%Y-%m-%d %H:%M:%S.%f%z"
-        return datetime.strptime(ts, date_format)
+        from gspread.exceptions import APIError
+
+        sheets = [self.get_sheet(sheet_name) for sheet_name in sheet_names]
+        try:
+            return sheets, operation(sheets)
+        except APIError as err:
+            if not self.is_stale_sheet_error(err):
+                raise
+            print("STALE SHEETS:", sheet_names, err)
+            self.refresh()
+            sheets = [self.get_sheet(sheet_name) for sheet_name in sheet_names]
+            return sheets, operation(sheets)
 
-    # READING DATA
-    # ... TODO: consider passing the sheet or the sheet name, and getting the sheet only if necessary
+    @staticmethod
+    def is_stale_sheet_error(err):
+        """A missing sheet shows up as a 404, or as a 400 when the range refers to an old sheet title."""
+        message = str(err.error.get("message", ""))
+        return err.code == 404 or (err.code == 400 and "Unable to parse range" in message)
 
-    @property
-    def doc(self):
-        """note: this will make an API call each time, to get the new data"""
-        return self.client.open_by_key(self.document_id) #> <class 'gspread.models.Spreadsheet'>
+    def metadata_stats(self):
+        return {"metadata_calls": self.metadata_calls, "metadata_calls_saved": self.metadata_calls_saved}
 
-    def get_sheet(self, sheet_name):
-        return self.doc.worksheet(sheet_name)
+    def session_stats(self):
+        http_client = getattr(self._client, "http_client", None)
+        session = getattr(http_client, "session", None)
+        return session.stats() if hasattr(session, "stats") else {}
+
+    def lock_stats(self):
+        return {**self.id_allocator.lock_stats.stats(), "id_conflicts": self.id_conflicts}
+
+    def quota_stats(self):
+        http_client = getattr(self._client, "http_client", None)
+        scheduler = getattr(http_client, "scheduler", None)
+        return scheduler.stats() if scheduler else {}
+
+    # READING DATA
 
     def get_records(self, sheet_name):
-        """Gets all records from a sheet,
+        """Gets all records from a sheet (from the cache if possible),
             converts datetime columns back to Python datetime objects
+
+        note: the records may be shared with other callers, so please don't modify them
+        """
+        records = self.cached_records(sheet_name)
+        return self.get_sheet(sheet_name), records
+
+    @timed("get_records")
+    def cached_records(self, sheet_name):
+        """Gets all records from a sheet (from the cache if possible), without needing the sheet's metadata."""
+        self.sync_shared_version(sheet_name)
+        self.warm_start(sheet_name)
+        return self.records_cache.get(sheet_name, lambda: self.load_records(sheet_name))
+
+    def warm_start(self, sheet_name):
+        """The first time this process needs a sheet's records, starts out with the ones saved to disk by the last process (if any),
+            and fetches the latest ones in the background.
+        """
+        if not self.snapshots or sheet_name in self.warm_started:
+            return
+        with self.warm_start_lock:
+            if sheet_name in self.warm_started:
+                return
+            self.warm_started.add(sheet_name)
+            if self.records_cache.stale(sheet_name) is not None:
+                return
+            snapshot = self.snapshots.load(sheet_name)
+            if snapshot is None:
+                return
+
+            print(f"WARM START: '{sheet_name}' ({len(snapshot.records)} RECORDS FROM {round(snapshot.age)} SECONDS AGO)")
+            if snapshot.sync_state is not None:
+                self.sync_states[sheet_name] = snapshot.sync_state
+            self.records_cache.set(sheet_name, snapshot.records)
+            self.records_cache.revalidate(sheet_name, lambda: self.load_records(sheet_name))
+
+    def sync_shared_version(self, sheet_name):
+        """Discards what we have cached for the given sheet, if another worker process has written to it since."""
+        if not self.shared_cache:
+            return
+        version = self.shared_cache.version(sheet_name)
+        if self.seen_versions.get(sheet_name, version) != version:
+            self.discard_cached(sheet_name)
+        self.seen_versions[sheet_name] = version
+
+    def discard_cached(self, sheet_name):
+        """Discards our cached records, indexes, and summaries for the given sheet (so they get rebuilt on next use)."""
+        self.records_cache.invalidate(sheet_name)
+        for key in [key for key in self.indexes if key[0] == sheet_name]:
+            self.indexes.pop(key, None)
+        if sheet_name == "orders":
+            self.order_summaries = None
+
+    def load_records(self, sheet_name):
+        """Gets all records from a sheet, from the records shared by the other worker processes if possible,
+            otherwise fetches them (and shares them).
+        """
+        if not self.shared_cache:
+            return self.fetch_and_save(sheet_name)
+
+        records = self.shared_cache.load(sheet_name, max_age=self.records_cache.ttl)
+        if records is not None:
+            self.sync_states.pop(sheet_name, None) # we don't know which rows these came from
+            return records
+
+        version = self.shared_cache.version(sheet_name)
+        records = self.fetch_and_save(sheet_name)
+        self.shared_cache.publish(sheet_name, records, version)
+        return records
+
+    def fetch_and_save(self, sheet_name):
+        """Gets all records from a sheet (see sync_records), and saves them to disk for the next process to start out with.
+            When several processes need the same sheet at once (like when they all start at the same time),
+            only one of them fetches it, and the others use the records it saved (see SnapshotStore.single_flight).
         """
+        if not self.snapshots:
+            return self.sync_records(sheet_name)
+
+        def fetch():
+            records = self.sync_records(sheet_name)
+            return self.snapshots.save(sheet_name, records, self.sync_states.get(sheet_name))
+
+        snapshot = self.snapshots.single_flight(sheet_name, fetch)
+        if snapshot.sync_state is not None:
+            self.sync_states[sheet_name] = snapshot.sync_state
+        else:
+            self.sync_states.pop(sheet_name, None)
+        return snapshot.records
+
+    def share_write(self, sheet_name):
+        """After writing to a sheet, lets the other worker processes know their records are out of date,
+            and shares our records with them (if we have all of them).
+            If another worker wrote to the sheet since we last checked, our records are missing its rows, so discards them instead.
+        """
+        if not self.shared_cache:
+            return
+        seen_version = self.seen_versions.get(sheet_name)
+        version = self.shared_cache.bump(sheet_name)
+        self.seen_versions[sheet_name] = version
+        if seen_version is None or version != seen_version + 1:
+            self.discard_cached(sheet_name)
+            return
+        records = self.records_cache.peek(sheet_name)
+        if records is not None:
+            self.shared_cache.publish(sheet_name, records, version)
+
+    def sync_records(self, sheet_name):
+        """Gets all records from a sheet (always makes an API call).
+            For append-only sheets, only fetches the rows added since we last read the sheet, and adds them to our (expired) cached records,
+            unless the sheet looks different than we left it (for example it has been cleared), in which case it fetches everything.
+        """
+        state = self.sync_states.get(sheet_name)
+        records = self.records_cache.stale(sheet_name) if sheet_name in self.incremental_sheets else None
+        if state is None or records is None or not state.matches(records):
+            return self.fetch_records(sheet_name)
+
+        new_records = self.fetch_tail(sheet_name, state)
+        if new_records is None:
+            print("SHEET HAS CHANGED, RELOADING:", sheet_name)
+            self.full_reloads += 1
+            return self.fetch_records(sheet_name)
+
+        self.tail_syncs += 1
+        self.tail_rows_fetched += len(new_records)
+        records = records + new_records
+        self.sync_states[sheet_name] = SyncState.after(state.header, state.last_row + len(new_records), records)
+        return records
+
+    def fetch_tail(self, sheet_name, state):
+        """Gets the records in the rows after the last one we have, in a single API call (along with the header row, and our last row),
+            or None if the header row or our last row have changed since we read them.
+        """
+        header = state.header
+        ranges = [self.column_range(sheet_name, 1, 1, width=len(header)), self.column_range(sheet_name, state.last_row, width=len(header))]
+        sheet, response = self.with_sheet(sheet_name, lambda sheet: self.doc.values_batch_get(ranges))
+        header_range, tail_range = response.get("valueRanges", [{}, {}])
+        current_header = (header_range.get("values") or [[]])[0]
+        tail = tail_range.get("values") or [[]]
+        anchor, rows = tail[0], tail[1:]
+
+        if current_header != header or not state.anchor_matches(anchor):
+            return None
+
+        if self.columnar:
+            return ColumnarRecords([header] + rows)
+        return self.parse_records(sheet_name, header, rows)
+
+    def fetch_records(self, sheet_name):
+        """Gets all records from a sheet, bypassing the cache (always makes an API call)."""
         #print(f"GETTING RECORDS FROM SHEET: '{sheet_name}'")
-        sheet = self.get_sheet(sheet_name) #> <class 'gspread.models.Worksheet'>
-        records = sheet.get_all_records() #> <class 'list'>
-        for record in records:
+        sheet, values = self.with_sheet(sheet_name, lambda sheet: sheet.get_all_values()) #> <class 'list'>
+        return self.records_from_values(sheet_name, values)
+
+    def records_from_values(self, sheet_name, values):
+        """Converts the cell values from a whole sheet (where the first row contains the column names) into records."""
+        if not any(values):
+            self.sync_states.pop(sheet_name, None)
+            return []
+
+        header, rows = values[0], values[1:]
+        self.headers[sheet_name] = header
+        if self.columnar:
+            records = ColumnarRecords(values)
+        else:
+            records = self.parse_records(sheet_name, header, rows)
+        # the records are in rows 2 through N+1:
+        self.sync_states[sheet_name] = SyncState.after(header, len(records) + 1, records)
+        return records
+
+    @timed("get_many")
+    def get_many(self, sheet_names:list):
+        """Gets all records from each of the given sheets (from the cache if possible),
+            fetching any others in a single API call. Returns a dictionary of records by sheet name.
+        """
+        records = {}
+        for sheet_name in sheet_names:
+            self.sync_shared_version(sheet_name)
+            records[sheet_name] = self.records_cache.peek(sheet_name)
+
+        missing = [sheet_name for sheet_name in sheet_names if records[sheet_name] is None]
+        versions = {}
+        if self.shared_cache:
+            for sheet_name in list(missing):
+                shared_records = self.shared_cache.load(sheet_name, max_age=self.records_cache.ttl)
+                if shared_records is not None:
+                    records[sheet_name] = shared_records
+                    self.records_cache.set(sheet_name, shared_records)
+                    missing.remove(sheet_name)
+                else:
+                    versions[sheet_name] = self.shared_cache.version(sheet_name)
+
+        if any(missing):
+            for sheet_name, values in self.fetch_many(missing).items():
+                records[sheet_name] = self.records_from_values(sheet_name, values)
+                self.records_cache.set(sheet_name, records[sheet_name])
+                if self.shared_cache:
+                    self.shared_cache.publish(sheet_name, records[sheet_name], versions[sheet_name])
+        return records
+
+    def fetch_many(self, sheet_names:list):
+        """Gets the cell values from each of the given sheets, in a single API call (bypassing the cache).
+            Returns a dictionary of values by sheet name.
+        """
+        from gspread.utils import absolute_range_name
+
+        def batch_get(sheets):
+            return self.doc.values_batch_get([absolute_range_name(sheet.title) for sheet in sheets])
+
+        sheets, response = self.with_sheets(sheet_names, batch_get)
+        value_ranges = response.get("valueRanges", [])
+        return {sheet_name: value_range.get("values", []) for sheet_name, value_range in zip(sheet_names, value_ranges)}
+
+    def sync_stats(self):
+        return {"tail_syncs": self.tail_syncs, "tail_rows_fetched": self.tail_rows_fetched, "full_reloads": self.full_reloads}
+
+    @timed("parse_records")
+    def parse_records(self, sheet_name, header, rows):
+        """Converts rows of cell values into records (see Product and Order),
+            or into dictionaries (the same way get_all_records does) for sheets we don't have a model for.
+        """
+        model_class = MODEL_CLASSES.get(sheet_name)
+        if model_class:
+            positions = model_class.positions(header)
+            return [model_class.from_row(row, positions) for row in rows]
+
+        from gspread.utils import numericise_all, rightpad
+
+        records = []
+        for row in rows:
+            record = dict(zip(header, numericise_all(rightpad(row, len(header)))))
             if record.get("created_at"):
                 record["created_at"] = self.parse_timestamp(record["created_at"])
-        return sheet, records
+            records.append(record)
+        return records
+
+    def get_header(self, sheet_name):
+        """Gets the column names from the first row of the sheet (these are cached)."""
+        if sheet_name not in self.headers:
+            sheet, header = self.with_sheet(sheet_name, lambda sheet: sheet.row_values(1))
+            self.headers[sheet_name] = header
+        return self.headers[sheet_name]
+
+    def column_range(self, sheet_name, start_row, end_row=None, width=None):
+        """The range of the given rows, across the sheet's columns (or the first few), like "'orders'!A2:F10".
+            Leave out the end row to include every row from the start row down.
 
+        Params:
+            width (int) : the number of columns (defaults to the number of columns in the header row)
+        """
+        from gspread.utils import rowcol_to_a1, absolute_range_name
+
+        last_col = rowcol_to_a1(1, width or len(self.get_header(sheet_name)))[:-1] # column letter (like "F")
+        return absolute_range_name(sheet_name, f"A{start_row}:{last_col}{end_row or ''}")
+
+    def get_index(self, sheet_name, column_name):
+        """Gets an index of row numbers by value for the given column, (re)building it by reading only that column if necessary."""
+        key = (sheet_name, column_name)
+        index = self.indexes.get(key)
+        if index is None or index.expired:
+            col_number = self.get_header(sheet_name).index(column_name) + 1
+            sheet, values = self.with_sheet(sheet_name, lambda sheet: sheet.col_values(col_number))
+            index = SecondaryIndex(values[1:])
+            self.indexes[key] = index
+        return index
+
+    def fetch_rows(self, sheet_name, row_numbers):
+        """Gets the records in the given rows, fetching all the ranges of rows in a single API call."""
+        if not any(row_numbers):
+            return []
+
+        header = self.get_header(sheet_name)
+        ranges = [self.column_range(sheet_name, start, end) for start, end in row_ranges(row_numbers)]
+        sheet, response = self.with_sheet(sheet_name, lambda sheet: self.doc.values_batch_get(ranges))
+        rows = []
+        for value_range in response.get("valueRanges", []):
+            rows += value_range.get("values", [])
+        return self.parse_records(sheet_name, header, rows)
+
+    def iter_records(self, sheet_name, chunk_size=1000):
+        """Yields lists of records from a sheet, fetching a fixed number of rows at a time (bypassing the cache),
+            so reading a large sheet doesn't need to hold all of it in memory at once.
+        """
+        header = self.get_header(sheet_name)
+        start = 2
+        while True:
+            a1_range = self.column_range(sheet_name, start, start + chunk_size - 1)
+            sheet, response = self.with_sheet(sheet_name, lambda sheet: self.doc.values_batch_get([a1_range]))
+            rows = (response.get("valueRanges") or [{}])[0].get("values", [])
+            if any(rows):
+                yield self.parse_records(sheet_name, header, rows)
+            if len(rows) < chunk_size:
+                return
+            start += chunk_size
+
+    def find_records(self, sheet_name, **equals):
+        """Finds the records where each of the given columns equals the given value.
+
+        Example: find_records("orders", user_email="example@test.com")
+
+        Uses fresh cached records if available, otherwise fetches only the matching rows
+        if one of the columns is indexed, otherwise falls back to reading (and filtering) all the records.
+        """
+        def matches(record):
+            return all([record.get(col) == val for col, val in equals.items()])
+
+        self.sync_shared_version(sheet_name)
+        self.warm_start(sheet_name)
+        records = self.records_cache.peek(sheet_name)
+        if records is None:
+            indexed = [col for col in equals if col in self.indexed_columns.get(sheet_name, [])]
+            if any(indexed):
+                index = self.get_index(sheet_name, indexed[0])
+                # checking the fetched records still match, in case rows have moved since the index was built:
+                records = self.fetch_rows(sheet_name, index.lookup(equals[indexed[0]]))
+            else:
+                _, records = self.get_records(sheet_name)
+
+        return [record for record in records if matches(record)]
+
+    @timed("destroy_all")
     def destroy_all(self, sheet_name):
         """Removes all records from a given sheet, except the header row."""
-        sheet, records = self.get_records(sheet_name)
-        # start on the second row, and delete one more than the number of records,
-        # ... to account for the header row
-        sheet.delete_rows(start_index=2, end_index=len(records)+1)
+        self.destroy_many([sheet_name])
+
+    @timed("destroy_many")
+    def destroy_many(self, sheet_names:list):
+        """Removes all records from each of the given sheets (except their header rows), in a single API call."""
+        def batch_clear(sheets):
+            # clear everything from the second row down (appending finds the end of the table, so blank rows are re-used):
+            ranges = [self.column_range(sheet.title, 2, width=sheet.col_count) for sheet in sheets]
+            return self.doc.values_batch_clear(body={"ranges": ranges})
+
+        self.with_sheets(sheet_names, batch_clear)
+
+        for sheet_name in sheet_names:
+            self.records_cache.set(sheet_name, [])
+            if sheet_name in self.headers:
+                self.sync_states[sheet_name] = SyncState.after(self.headers[sheet_name], 1, [])
+            self.id_allocator.reset(sheet_name)
+            for key in [key for key in self.indexes if key[0] == sheet_name]:
+                self.indexes[key] = SecondaryIndex([])
+            if sheet_name == "orders":
+                self.order_summaries = OrderSummaries([])
+            self.share_write(sheet_name)
+
+    def find_max_id(self, sheet_name):
+        """Finds the largest identifier in the sheet, reading only the "id" column."""
+        sheet, values = self.with_sheet(sheet_name, lambda sheet: sheet.col_values(1))
+        if values and values[0] != "id":
+            raise ValueError(f"EXPECTING THE FIRST COLUMN OF THE '{sheet_name}' SHEET TO BE 'id'")
+        ids = [int(val) for val in values[1:] if str(val).isdigit()]
+        return max(ids) if ids else 0
+
+    def known_max_id(self, sheet_name):
+        """The id of the last record we have read from (or written to) the sheet, or zero if we don't know."""
+        state = self.sync_states.get(sheet_name)
+        return state.last_id if state is not None and isinstance(state.last_id, int) else 0
 
     def get_products(self):
-        _, products = self.get_records("products")
-        return products
+        return self.cached_records("products")
+
+    def get_product(self, product_id):
+        """Looks up a product by id (or returns None if there is no such product), without going through all the products.
+            The index is rebuilt whenever the cached products change (including when they expire and get fetched again).
+        """
+        self.sync_shared_version("products")
+        version = self.records_cache.version("products")
+        index = self.product_index
+        if index is None or version is None or index.version != version:
+            products = self.get_products()
+            index = UniqueIndex(products, version=self.records_cache.version("products"))
+            self.product_index = index
+        return index.get(product_id)
 
     def get_orders(self):
-        _, orders = self.get_records("orders")
-        return records
+        return self.cached_records("orders")
 
     def get_user_orders(self, user_email):
-        _, orders = self.get_records("orders")
-        return [order for order in orders if order["user_email"] == user_email]
+        return self.find_records("orders", user_email=user_email)
+
+    def get_user_summary(self, user_email) -> dict:
+        """Gets a user's order count, total spend, last order time, and most ordered products (see OrderSummary)."""
+        summaries = self.order_summaries
+        if summaries is None or summaries.expired:
+            summaries = self.flights.do("order_summaries", self.build_order_summaries)
+        return summaries.get(user_email)
+
+    @timed("build_order_summaries")
+    def build_order_summaries(self):
+        """Summarizes all the orders, from the cached orders (which a single read fills, and later syncs just the rows added since)."""
+        orders = self.cached_records("orders")
+        with self.summaries_lock:
+            # including any orders written since we read them (which have been added to the cached orders, but not to any summaries):
+            orders = self.records_cache.peek("orders") or orders
+            summaries = OrderSummaries(orders)
+            self.order_summaries = summaries
+        return summaries
 
 
     # WRITING DATA
@@ -102,12 +677,7 @@ class SpreadsheetService:
     def seed_products(self):
         sheet, products = self.get_records("products")
         if not any(products):
-            DEFAULT_PRODUCTS = [
-                {'id': 1, 'name': 'Strawberries', 'description': 'Juicy organic strawberries.', 'price': 4.99, 'url': 'https://picsum.photos/id/1080/360/200'},
-                {'id': 2, 'name': 'Cup of Tea', 'description': 'An individually-prepared tea or coffee of choice.', 'price': 3.49, 'url': 'https://picsum.photos/id/225/360/200'},
-                {'id': 3, 'name': 'Textbook', 'description': 'It has all the answers.', 'price': 129.99, 'url': 'https://picsum.photos/id/24/360/200'}
-            ]
-            self.create_products(DEFAULT_PRODUCTS)
+            self.create_products([dict(product) for product in DEFAULT_PRODUCTS])
 
     def create_products(self, new_products:list):
         self.create_records("products", new_products)
@@ -115,73 +685,142 @@ class SpreadsheetService:
     def create_product(self, new_product:dict):
         self.create_records("products", [new_product])
 
-    def create_orders(self, new_orders:list):
-        self.create_records("orders", new_orders)
+    def create_orders(self, new_orders:list, on_written=None):
+        self.create_records("orders", new_orders, on_written=on_written)
 
     def create_order(self, new_order:dict):
         self.create_records("orders", [new_order])
 
 
 
-    def create_records(self, sheet_name:str, new_records:list):
-        model_class = {"products": Product, "orders": Order}[sheet_name]
+    @timed("create_records")
+    def create_records(self, sheet_name:str, new_records:list, keep_timestamps=False, on_written=None):
+        """Appends new records to the end of the sheet, assigning each an auto-incrementing "id" and a "created_at" timestamp.
+            Doesn't need to read the existing records, so the cost doesn't grow with the size of the sheet.
+            Once the rows have been appended, doesn't raise (so callers never retry a write which went through).
 
-        sheet, records = self.get_records(sheet_name)
-        next_row_number = len(records) + 2 # plus headers plus one
+        Params:
+            keep_timestamps (bool) : whether to keep the records' existing "created_at" timestamps (for example when importing old records)
 
-        # auto-increment integer identifier
-        if any(records):
-            existing_ids = [r["id"] for r in records]
-            next_id = max(existing_ids) + 1
-        else:
-            next_id = 1
+            on_written (function) : called with the created records as soon as they have been appended (before updating the caches)
+        """
+        model_class = MODEL_CLASSES[sheet_name]
+        if not any(new_records):
+            return
+
+        # auto-increment integer identifier:
+        next_id = self.id_allocator.allocate(sheet_name, len(new_records), lambda: self.find_max_id(sheet_name), known_max_id=self.known_max_id(sheet_name))
+
+        # write the values in the same order as the sheet's columns:
+        header = self.get_header(sheet_name)
 
         new_rows = []
+        created_records = []
         for new_record in new_records:
             new_record["id"] = next_id
-            new_record["created_at"] = self.generate_timestamp()
-            new_row = model_class(new_record).to_row
-            new_rows.append(new_row)
+            if not (keep_timestamps and new_record.get("created_at")):
+                new_record["created_at"] = self.generate_timestamp()
+            model = model_class(new_record)
+            new_rows.append(model.to_row(header))
+            created_records.append(model)
 
             next_id += 1
 
-        sheet.insert_rows(new_rows, row=next_row_number)
-
-
-
-
-
-
-# FIXED SCHEMA / DECORATORS
-# ... to make sure when writing to sheet the values are in the proper order
-
-class Product:
-    def __init__(self, attrs):
-        self.id = attrs.get("id")
-        self.name = attrs.get("name")
-        self.description = attrs.get("description")
-        self.price = attrs.get("price")
-        self.url = attrs.get("url")
-        self.created_at = attrs.get("created_at")
-
-    @property
-    def to_row(self):
-        return [self.id, self.name, self.description, self.price, self.url, str(self.created_at)]
-
+        # the API finds the end of the table for us (after the last non-empty row):
+        sheet, response = self.with_sheet(sheet_name, lambda sheet: sheet.append_rows(new_rows, table_range="A1"))
+
+        first_row_number = self.appended_row_number(response)
+        try:
+            if on_written:
+                on_written(created_records)
+            if self.id_conflict_check and first_row_number:
+                self.check_ids(sheet_name, created_records, first_row_number)
+
+            # write-through, so the cache and indexes reflect what we just wrote
+            # (after discarding them if another worker has written since, as they'd be missing its rows):
+            self.sync_shared_version(sheet_name)
+            with self.summaries_lock:
+                self.records_cache.append(sheet_name, created_records)
+                if sheet_name == "orders" and self.order_summaries is not None:
+                    self.order_summaries.add(created_records)
+            self.update_sync_state(sheet_name, created_records, first_row_number)
+            self.update_indexes(sheet_name, created_records, first_row_number)
+            self.share_write(sheet_name)
+        except Exception as err:
+            # the rows are written, so rather than raising, make sure we fetch them fresh next time:
+            print("UNABLE TO UPDATE CACHES AFTER WRITING:", sheet_name, err)
+            self.discard_cached(sheet_name)
+            self.sync_states.pop(sheet_name, None)
+
+    def check_ids(self, sheet_name, created_records, first_row_number):
+        """
+        Makes sure the ids of the rows we just appended aren't already used by the rows above them
+        (which can happen when the app runs on more than one server, because each server has its own id counter).
+        If they are, reserves new ids after the largest one in the sheet, and rewrites the ids of our rows (and records).
 
-class Order:
-    def __init__(self, attrs):
-        self.id = attrs.get("id")
-        self.user_email = attrs.get("user_email")
-        self.product_id = attrs.get("product_id")
-        self.product_name = attrs.get("product_name")
-        self.product_price = attrs.get("product_price")
-        self.created_at = attrs.get("created_at")
+        Each writer checks the rows appended before its own, so whichever of two conflicting writes comes second fixes its ids.
+        """
+        if first_row_number <= 2:
+            return # there's only the header row above ours
+
+        id_range = self.column_range(sheet_name, 2, first_row_number - 1, width=1)
+        sheet, response = self.with_sheet(sheet_name, lambda sheet: self.doc.values_batch_get([id_range]))
+        values = (response.get("valueRanges") or [{}])[0].get("values", [])
+        ids = [int(row[0]) for row in values if row and str(row[0]).isdigit()]
+        if not ids or max(ids) < created_records[0]["id"]:
+            return
+
+        print("ID CONFLICT, REASSIGNING IDS:", sheet_name, created_records[0]["id"], "-", created_records[-1]["id"])
+        self.id_conflicts += 1
+        next_id = self.id_allocator.reallocate(sheet_name, len(created_records), lambda: max(ids + [record["id"] for record in created_records]))
+        for record in created_records:
+            record["id"] = next_id
+            next_id += 1
+        id_range = self.column_range(sheet_name, first_row_number, first_row_number + len(created_records) - 1, width=1)
+        self.with_sheet(sheet_name, lambda sheet: self.doc.values_update(id_range, params={"valueInputOption": "RAW"}, body={"values": [[record["id"]] for record in created_records]}))
 
+    @staticmethod
+    def appended_row_number(append_response):
+        """The row number of the first row we appended (or None if the response doesn't say)."""
+        from gspread.utils import a1_to_rowcol, get_a1_from_absolute_range
+
+        try:
+            updated_range = append_response["updates"]["updatedRange"] #> "orders!A5:F7"
+            first_row_number, _ = a1_to_rowcol(get_a1_from_absolute_range(updated_range).split(":")[0])
+            return first_row_number
+        except (KeyError, TypeError) as err:
+            print("UNABLE TO FIND APPENDED ROWS:", err)
+            return None
+
+    def update_sync_state(self, sheet_name, created_records, first_row_number):
+        """Moves the end of our cached records past the rows we just appended,
+            unless someone else appended rows in between (in which case we'll need to fetch everything next time).
+        """
+        state = self.sync_states.get(sheet_name)
+        if state is None:
+            return
+        if first_row_number != state.last_row + 1:
+            self.sync_states.pop(sheet_name, None)
+            return
+        count = len(created_records)
+        self.sync_states[sheet_name] = SyncState(state.header, state.last_row + count, state.record_count + count, created_records[-1]["id"])
+
+    def update_indexes(self, sheet_name, created_records, first_row_number):
+        """Adds the rows we just appended to any existing indexes for this sheet."""
+        keys = [key for key in self.indexes if key[0] == sheet_name]
+        if not any(keys):
+            return
+
+        if first_row_number is None:
+            for key in keys:
+                self.indexes.pop(key, None) # rebuild on next use
+            return
+
+        for key in keys:
+            _, column_name = key
+            for row_number, record in enumerate(created_records, start=first_row_number):
+                self.indexes[key].add(record.get(column_name), row_number)
 
-    @property
-    def to_row(self):
-        return [self.id, self.user_email, self.product_id, self.product_name, self.product_price, str(self.created_at)]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,217 @@
+import os
+import sqlite3
+from pprint import pprint
+from threading import RLock
+
+from app.models import MODEL_CLASSES, DEFAULT_PRODUCTS, generate_timestamp, parse_timestamp
+from app.order_summaries import OrderSummary
+
+DEFAULT_SQLITE_FILEPATH = os.path.join(os.path.dirname(__file__), "..", "database.db")
+SQLITE_FILEPATH = os.getenv("SQLITE_FILEPATH", default=DEFAULT_SQLITE_FILEPATH)
+
+# same tables and columns as the sheets in the google sheets document:
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        description TEXT,
+        price REAL,
+        url TEXT,
+        created_at TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY,
+        user_email TEXT,
+        product_id INTEGER,
+        product_name TEXT,
+        product_price REAL,
+        created_at TEXT
+    )
+    """,
+    # the "id" primary key is already indexed (it is the table's rowid)
+    "CREATE INDEX IF NOT EXISTS orders_user_email ON orders (user_email)",
+]
+
+
+class SqliteService:
+    """
+    A local SQLite database with the same interface as the SpreadsheetService,
+    for when you need speed (or don't have network access), instead of a Google Sheets document.
+
+    Params:
+        filepath (str) : the database file, or ":memory:" for a temporary in-memory database
+    """
+
+    def __init__(self, filepath=SQLITE_FILEPATH):
+        print("INITIALIZING NEW SQLITE SERVICE...")
+        self.filepath = filepath
+
+        # a single connection, shared by all threads (taking turns):
+        self.lock = RLock()
+        self.connection = sqlite3.connect(filepath, check_same_thread=False, timeout=10)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            if filepath != ":memory:":
+                # allow other processes to read while one is writing:
+                self.connection.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    generate_timestamp = staticmethod(generate_timestamp)
+
+    parse_timestamp = staticmethod(parse_timestamp)
+
+    @staticmethod
+    def table_name(sheet_name):
+        if sheet_name not in MODEL_CLASSES:
+            raise ValueError(f"UNKNOWN TABLE: '{sheet_name}'")
+        return sheet_name
+
+    @staticmethod
+    def to_records(table_name, rows):
+        """Converts rows into records (see Product and Order), like the ones read from a sheet."""
+        model_class = MODEL_CLASSES[table_name]
+        if not any(rows):
+            return []
+        positions = model_class.positions(list(rows[0].keys()))
+        return [model_class.from_row(row, positions) for row in rows]
+
+    # READING DATA
+
+    def get_records(self, sheet_name):
+        """Gets all records from a table.
+            Returns the table name in place of the sheet, to match the SpreadsheetService.
+        """
+        table_name = self.table_name(sheet_name)
+        with self.lock:
+            rows = self.connection.execute(f"SELECT * FROM {table_name} ORDER BY id").fetchall()
+        return table_name, self.to_records(table_name, rows)
+
+    def get_many(self, sheet_names:list):
+        """Gets all records from each of the given tables. Returns a dictionary of records by table name."""
+        with self.lock:
+            return {sheet_name: self.get_records(sheet_name)[1] for sheet_name in sheet_names}
+
+    def iter_records(self, sheet_name, chunk_size=1000):
+        """Yields lists of records from a table, a fixed number at a time (in order of id)."""
+        table_name = self.table_name(sheet_name)
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.connection.execute(f"SELECT * FROM {table_name} WHERE id > ? ORDER BY id LIMIT ?", [last_id, chunk_size]).fetchall()
+            if any(rows):
+                yield self.to_records(table_name, rows)
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1]["id"]
+
+    def find_records(self, sheet_name, **equals):
+        """Finds the records where each of the given columns equals the given value.
+
+        Example: find_records("orders", user_email="example@test.com")
+        """
+        table_name = self.table_name(sheet_name)
+        unknown_columns = [col for col in equals if col not in MODEL_CLASSES[table_name].FIELDS]
+        if any(unknown_columns):
+            raise ValueError(f"UNKNOWN COLUMNS: {unknown_columns}")
+
+        with self.lock:
+            where = " AND ".join([f"{col} = ?" for col in equals]) or "1 = 1"
+            rows = self.connection.execute(f"SELECT * FROM {table_name} WHERE {where} ORDER BY id", list(equals.values())).fetchall()
+        return self.to_records(table_name, rows)
+
+    def destroy_all(self, sheet_name):
+        """Removes all records from a given table."""
+        table_name = self.table_name(sheet_name)
+        with self.lock, self.connection:
+            self.connection.execute(f"DELETE FROM {table_name}")
+
+    def destroy_many(self, sheet_names:list):
+        """Removes all records from each of the given tables (in a single transaction)."""
+        table_names = [self.table_name(sheet_name) for sheet_name in sheet_names]
+        with self.lock, self.connection:
+            for table_name in table_names:
+                self.connection.execute(f"DELETE FROM {table_name}")
+
+    def get_products(self):
+        _, products = self.get_records("products")
+        return products
+
+    def get_product(self, product_id):
+        """Looks up a product by id (or returns None if there is no such product)."""
+        products = self.find_records("products", id=product_id)
+        return products[0] if any(products) else None
+
+    def get_orders(self):
+        _, orders = self.get_records("orders")
+        return orders
+
+    def get_user_orders(self, user_email):
+        return self.find_records("orders", user_email=user_email)
+
+    def get_user_summary(self, user_email) -> dict:
+        """Gets a user's order count, total spend, last order time, and most ordered products (see OrderSummary)."""
+        return OrderSummary(user_email, self.get_user_orders(user_email)).to_dict()
+
+    # WRITING DATA
+
+    def seed_products(self):
+        _, products = self.get_records("products")
+        if not any(products):
+            self.create_products([dict(product) for product in DEFAULT_PRODUCTS])
+
+    def create_products(self, new_products:list):
+        self.create_records("products", new_products)
+
+    def create_product(self, new_product:dict):
+        self.create_records("products", [new_product])
+
+    def create_orders(self, new_orders:list, on_written=None):
+        self.create_records("orders", new_orders, on_written=on_written)
+
+    def create_order(self, new_order:dict):
+        self.create_records("orders", [new_order])
+
+    def create_records(self, sheet_name:str, new_records:list, keep_timestamps=False, on_written=None):
+        """Inserts new records, assigning each an auto-incrementing "id" and a "created_at" timestamp.
+
+        Params:
+            keep_timestamps (bool) : whether to keep the records' existing "created_at" timestamps (for example when importing old records)
+
+            on_written (function) : called with the created records once they have been committed
+        """
+        table_name = self.table_name(sheet_name)
+        model_class = MODEL_CLASSES[sheet_name]
+
+        with self.lock, self.connection:
+            for new_record in new_records:
+                new_record["id"] = None # let the database choose the next id
+                if not (keep_timestamps and new_record.get("created_at")):
+                    new_record["created_at"] = self.generate_timestamp()
+                columns = [col for col in model_class.FIELDS if col != "id"]
+                placeholders = ", ".join(["?"] * len(columns))
+                cursor = self.connection.execute(
+                    f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})",
+                    model_class(new_record).to_row(columns)
+                )
+                new_record["id"] = cursor.lastrowid
+
+        if on_written:
+            on_written(new_records)
+
+
+
+if __name__ == "__main__":
+
+    ss = SqliteService()
+
+    ss.seed_products()
+
+    table_name, records = ss.get_records("products")
+
+    for record in records:
+        print("-----")
+        pprint(record)
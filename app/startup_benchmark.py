@@ -0,0 +1,48 @@
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+# how many fresh interpreters to start (each one boots the web app once):
+STARTUP_BENCHMARK_RUNS = int(os.getenv("STARTUP_BENCHMARK_RUNS", default="5"))
+
+# runs in a fresh interpreter, so nothing is already imported or initialized:
+BOOT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+from web_app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "total_ms": (created - start) * 1000,
+    "gspread_imported": "gspread" in sys.modules,
+}))
+"""
+
+
+def boot_once():
+    """Boots the web app in a new process (like a new web server worker), and returns its timings."""
+    result = subprocess.run([sys.executable, "-c", BOOT_SCRIPT], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(runs=STARTUP_BENCHMARK_RUNS):
+    timings = [boot_once() for _ in range(runs)]
+    summary = {"runs": runs, "gspread_imported": any(t["gspread_imported"] for t in timings)}
+    for key in ["import_ms", "create_app_ms", "total_ms"]:
+        values = [t[key] for t in timings]
+        summary[key] = {"median": round(statistics.median(values), 1), "min": round(min(values), 1)}
+    return summary
+
+
+if __name__ == "__main__":
+
+    summary = run_benchmark()
+    print("STARTUP BENCHMARK:", summary["runs"], "RUNS")
+    for key in ["import_ms", "create_app_ms", "total_ms"]:
+        print(f"{key.upper()}: MEDIAN {summary[key]['median']} / MIN {summary[key]['min']}")
+    print("GSPREAD IMPORTED AT STARTUP:", summary["gspread_imported"])
@@ -0,0 +1,75 @@
+import os
+from typing import Iterator, Protocol
+
+# which kind of database to use: "sheets" (google sheets document) or "sqlite" (local database file)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", default="sheets")
+
+
+class StorageBackend(Protocol):
+    """
+    The interface the web app expects from its database service,
+    implemented by the SpreadsheetService and the SqliteService.
+
+    Records are dictionaries with an auto-incrementing integer "id",
+    and a "created_at" datetime (both assigned when the records are created).
+    """
+
+    def get_records(self, sheet_name:str) -> tuple:
+        """Returns the sheet (or table), and a list of all its records."""
+        ...
+
+    def get_many(self, sheet_names:list) -> dict:
+        """Returns all the records from each of the given sheets (or tables), by name."""
+        ...
+
+    def iter_records(self, sheet_name:str, chunk_size:int) -> Iterator[list]:
+        """Yields lists of records from the sheet (or table), a fixed number at a time."""
+        ...
+
+    def create_records(self, sheet_name:str, new_records:list, keep_timestamps:bool=False, on_written=None) -> None:
+        """Creates the records, then calls on_written (if given) with them, as soon as they have been written."""
+        ...
+
+    def destroy_all(self, sheet_name:str) -> None:
+        ...
+
+    def destroy_many(self, sheet_names:list) -> None:
+        ...
+
+    def get_products(self) -> list:
+        ...
+
+    def get_product(self, product_id) -> dict:
+        """Returns the product with the given id (or None if there is no such product)."""
+        ...
+
+    def get_orders(self) -> list:
+        ...
+
+    def get_user_orders(self, user_email:str) -> list:
+        ...
+
+    def get_user_summary(self, user_email:str) -> dict:
+        """Returns the user's order count, total spend, last order time, and most ordered products."""
+        ...
+
+    def create_orders(self, new_orders:list, on_written=None) -> None:
+        ...
+
+    def create_order(self, new_order:dict) -> None:
+        ...
+
+    def seed_products(self) -> None:
+        ...
+
+
+def get_storage_service(backend=STORAGE_BACKEND) -> StorageBackend:
+    """Initializes the database service specified by the "STORAGE_BACKEND" environment variable."""
+    if backend == "sheets":
+        from app.spreadsheet_service import SpreadsheetService
+        return SpreadsheetService()
+    elif backend == "sqlite":
+        from app.sqlite_service import SqliteService
+        return SqliteService()
+    else:
+        raise ValueError(f"UNKNOWN STORAGE BACKEND: '{backend}' (expecting 'sheets' or 'sqlite')")
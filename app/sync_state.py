@@ -0,0 +1,34 @@
+class SyncState:
+    """
+    Where our cached records for a sheet end (the last row we have read),
+    so next time we can fetch only the rows after it, after checking the sheet hasn't otherwise changed.
+
+    Params:
+        header (list) : the column names we read
+        last_row (int) : the row number of our last record (or 1, the header row, if we have none)
+        record_count (int) : how many records we have
+        last_id : the id of our last record (or None if we have none)
+    """
+
+    def __init__(self, header, last_row, record_count, last_id):
+        self.header = header
+        self.last_row = last_row
+        self.record_count = record_count
+        self.last_id = last_id
+
+    @classmethod
+    def after(cls, header, last_row, records):
+        return cls(header, last_row, len(records), records[-1]["id"] if any(records) else None)
+
+    def matches(self, records):
+        """Whether the given (cached) records are the ones this state describes."""
+        last_id = records[-1]["id"] if any(records) else None
+        return len(records) == self.record_count and last_id == self.last_id
+
+    def anchor_matches(self, anchor:list):
+        """Whether our last row still has the same contents (the same id, or the same column names for the header row).
+            If not, rows have been removed or moved since we read them.
+        """
+        if self.record_count == 0:
+            return anchor == self.header
+        return any(anchor) and str(anchor[0]) == str(self.last_id)
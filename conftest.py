@@ -1,11 +1,12 @@
 
 import pytest
 import os
-from time import sleep
 
 from dotenv import load_dotenv
 
 from app.spreadsheet_service import SpreadsheetService
+from app.sqlite_service import SqliteService
+from app.fake_sheets import FakeClient
 from web_app import create_app
 
 
@@ -13,18 +14,25 @@ load_dotenv()
 
 # an example sheet that is being used for testing purposes:
 GOOGLE_SHEETS_TEST_DOCUMENT_ID= os.getenv("GOOGLE_SHEETS_TEST_DOCUMENT_ID", default="1TZCr9x6CZmlccSKgpOkAIE6dCfRmS_83tSlb_GyALsw")
-TEST_SLEEP = int(os.getenv("TEST_SLEEP", default="10"))
 
-# it would be nice to reset the database for each test, but we are hitting rate limits
-# we could consider using a single instance of the test database, but maybe that's worse than sleeping after each test?
+# set to "sqlite" to run the tests against a temporary local database,
+# ... or to "fake" to run them against an in-memory stand-in for the google sheets document (no network access required):
+TEST_STORAGE_BACKEND = os.getenv("TEST_STORAGE_BACKEND", default="sheets")
+
+# the spreadsheet service paces its requests to stay within the API's rate limits (see RequestScheduler),
+# ... so we can reset the database for each test without sleeping in between
 @pytest.fixture() # scope="module"
 def ss():
     """spreadsheet service to use when testing"""
-    ss = SpreadsheetService(document_id=GOOGLE_SHEETS_TEST_DOCUMENT_ID)
+    if TEST_STORAGE_BACKEND == "sqlite":
+        ss = SqliteService(filepath=":memory:")
+    elif TEST_STORAGE_BACKEND == "fake":
+        ss = SpreadsheetService(document_id="fake-test-document", client=FakeClient())
+    else:
+        ss = SpreadsheetService(document_id=GOOGLE_SHEETS_TEST_DOCUMENT_ID)
 
-    # setup / remove any records that may exist:
-    ss.destroy_all("products")
-    ss.destroy_all("orders")
+    # setup / remove any records that may exist (in a single request):
+    ss.destroy_many(["products", "orders"])
 
     # seed default products:
     ss.seed_products()
@@ -34,8 +42,6 @@ def ss():
     # clean up:
     #ss.destroy_all("products")
     #ss.destroy_all("orders")
-    print("SLEEPING...")
-    sleep(TEST_SLEEP)
 
 
 
@@ -0,0 +1,61 @@
+import json
+
+from app.models import Product
+from web_app.routes.api_routes import records_after
+
+
+def test_products(test_client):
+    response = test_client.get("/api/products")
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json["products"]] == ["Strawberries", "Cup of Tea", "Textbook"]
+    assert response.json["next_cursor"] is None
+    assert isinstance(response.json["products"][0]["created_at"], str)
+
+
+def test_products_pagination(test_client):
+    response = test_client.get("/api/products?limit=2")
+    assert [p["id"] for p in response.json["products"]] == [1, 2]
+    cursor = response.json["next_cursor"]
+    assert cursor
+
+    response = test_client.get(f"/api/products?limit=2&cursor={cursor}")
+    assert [p["id"] for p in response.json["products"]] == [3]
+    assert response.json["next_cursor"] is None
+
+    response = test_client.get("/api/products?cursor=oops")
+    assert response.status_code == 400
+
+
+def test_products_stream(test_client):
+    response = test_client.get("/api/products?stream=true")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    products = [json.loads(line) for line in response.data.decode("utf-8").splitlines()]
+    assert [p["id"] for p in products] == [1, 2, 3]
+
+
+def test_records_without_ids():
+    # like a row added to the sheet by hand:
+    records = [Product({"id": 2, "name": "Cup of Tea"}), Product({"id": "", "name": "Mystery Product"}), Product({"id": 1, "name": "Strawberries"})]
+    assert [p["id"] for p in records_after(records, None)] == [1, 2]
+    assert [p["id"] for p in records_after(records, 1)] == [2]
+
+
+def test_user_orders(test_client):
+    # unauthenticated:
+    response = test_client.get("/api/user/orders")
+    assert response.status_code == 401
+
+    ss = test_client.application.config["SPREADSHEET_SERVICE"]
+    ss.create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Strawberries", "product_price": 4.99})
+    ss.create_order({"user_email": "someone.else@test.com", "product_id": 2, "product_name": "Cup of Tea", "product_price": 0.99})
+
+    with test_client.session_transaction() as session:
+        session["current_user"] = {"email": "example@test.com"}
+    response = test_client.get("/api/user/orders")
+    assert response.status_code == 200
+    orders = response.json["orders"]
+    assert len(orders) == 1
+    assert orders[0]["user_email"] == "example@test.com"
+    assert orders[0]["product_price"] == 4.99
+    assert response.json["pending"] == []
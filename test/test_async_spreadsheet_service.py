@@ -0,0 +1,98 @@
+import json
+import asyncio
+from datetime import datetime, timedelta
+from urllib.parse import unquote
+
+import httpx
+from google.auth.credentials import Credentials
+
+from app.async_spreadsheet_service import AsyncSpreadsheetService
+from app.id_allocator import IdAllocator
+from app.models import Product, Order
+
+
+class TokenCredentials(Credentials):
+    def __init__(self):
+        super().__init__()
+        self.token = "example-token"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    def refresh(self, request):
+        pass
+
+
+class FakeSheetsApi:
+    """Serves the few Sheets API endpoints the service uses, from an in-memory grid of values per sheet."""
+
+    def __init__(self):
+        self.sheets = {
+            "products": [["id", "name", "description", "price", "url", "created_at"]],
+            "orders": [["id", "user_email", "product_id", "product_name", "product_price", "created_at"]],
+        }
+        self.requests = []
+
+    def handle(self, request):
+        assert request.headers["Authorization"] == "Bearer example-token"
+        path = unquote(request.url.path).split("/values/")[-1]
+        self.requests.append((request.method, path))
+
+        if request.method == "POST" and path.endswith(":append"):
+            sheet_name = path.split("!")[0]
+            self.sheets[sheet_name] += json.loads(request.content)["values"]
+            return httpx.Response(200, json={"updates": {}})
+
+        sheet_name, _, cells = path.partition("!")
+        values = self.sheets[sheet_name]
+        if cells == "1:1":
+            values = values[0:1]
+        elif cells == "A:A":
+            values = [row[0:1] for row in values]
+        return httpx.Response(200, json={"values": [[str(value) for value in row] for row in values]})
+
+
+def make_service(api, tmpdir):
+    return AsyncSpreadsheetService(
+        document_id="example-document",
+        id_allocator=IdAllocator("example-document", dirpath=str(tmpdir)),
+        transport=httpx.MockTransport(api.handle),
+        credentials=TokenCredentials(),
+    )
+
+
+def test_seed_and_get_products(tmpdir):
+    api = FakeSheetsApi()
+    ss = make_service(api, tmpdir)
+
+    async def scenario():
+        await ss.seed_products()
+        products = await ss.get_products()
+        await ss.close()
+        return products
+
+    products = asyncio.run(scenario())
+    assert len(products) == 3
+    assert isinstance(products[0], Product)
+    assert [p["id"] for p in products] == [1, 2, 3]
+    assert len(api.sheets["products"]) == 4
+
+
+def test_create_order_and_get_many(tmpdir):
+    api = FakeSheetsApi()
+    ss = make_service(api, tmpdir)
+
+    async def scenario():
+        await ss.create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Strawberries", "product_price": 4.99})
+        # a fresh service, so the records get fetched:
+        other = make_service(api, tmpdir)
+        records = await other.get_many(["products", "orders"])
+        user_orders = await other.get_user_orders("example@test.com")
+        return records, user_orders
+
+    records, user_orders = asyncio.run(scenario())
+    assert list(records.keys()) == ["products", "orders"]
+    assert records["products"] == []
+    assert len(user_orders) == 1
+    assert isinstance(user_orders[0], Order)
+    assert user_orders[0]["id"] == 1
+    assert user_orders[0]["product_price"] == 4.99
+    assert isinstance(user_orders[0]["created_at"], datetime)
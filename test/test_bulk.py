@@ -0,0 +1,85 @@
+import json
+
+from app.bulk import import_records, export_records, Checkpoint
+
+CSV_CONTENTS = """id,user_email,product_id,product_name,product_price,created_at
+101,alice@test.com,1,Strawberries,4.99,2023-01-01T10:00:00+00:00
+102,bob@test.com,2,Cup of Tea,3.49,2023-01-02T10:00:00+00:00
+103,alice@test.com,3,Textbook,129.99,2023-01-03T10:00:00+00:00
+104,carol@test.com,1,Strawberries,4.99,
+105,bob@test.com,1,Strawberries,4.99,2023-01-05T10:00:00+00:00
+"""
+
+
+def test_import_and_export(ss, tmp_path):
+    csv_filepath = str(tmp_path / "orders.csv")
+    with open(csv_filepath, "w") as csv_file:
+        csv_file.write(CSV_CONTENTS)
+
+    assert import_records(ss, "orders", csv_filepath, chunk_size=2) == 5
+
+    orders = ss.get_orders()
+    assert [order["id"] for order in orders] == [1, 2, 3, 4, 5] # new ids
+    assert [order["user_email"] for order in orders] == ["alice@test.com", "bob@test.com", "alice@test.com", "carol@test.com", "bob@test.com"]
+    assert orders[2]["product_price"] == 129.99
+    assert orders[0]["created_at"].isoformat() == "2023-01-01T10:00:00+00:00" # kept
+    assert orders[3]["created_at"].year > 2023 # assigned
+
+    jsonl_filepath = str(tmp_path / "orders.jsonl")
+    assert export_records(ss, "orders", jsonl_filepath, chunk_size=2) == 5
+    with open(jsonl_filepath) as jsonl_file:
+        exported = [json.loads(line) for line in jsonl_file]
+    assert [row["id"] for row in exported] == [1, 2, 3, 4, 5]
+    assert exported[1]["product_name"] == "Cup of Tea"
+    assert exported[1]["created_at"] == "2023-01-02T10:00:00+00:00"
+
+
+def test_resume_import(ss, tmp_path):
+    csv_filepath = str(tmp_path / "orders.csv")
+    with open(csv_filepath, "w") as csv_file:
+        csv_file.write(CSV_CONTENTS)
+
+    # a previous import wrote the first two rows before it was interrupted:
+    Checkpoint(f"{csv_filepath}.checkpoint").save("orders", 2)
+
+    assert import_records(ss, "orders", csv_filepath, chunk_size=2) == 5
+    orders = ss.get_orders()
+    assert [order["user_email"] for order in orders] == ["alice@test.com", "carol@test.com", "bob@test.com"]
+    assert Checkpoint(f"{csv_filepath}.checkpoint").load("orders") == 0 # finished
+
+
+def test_import_error_after_write(ss, tmp_path):
+    csv_filepath = str(tmp_path / "orders.csv")
+    with open(csv_filepath, "w") as csv_file:
+        csv_file.write(CSV_CONTENTS)
+
+    # the second chunk gets written, but something fails right afterwards:
+    create_records = ss.create_records
+    def fail_after_second_chunk(sheet_name, new_records, keep_timestamps=False, on_written=None):
+        create_records(sheet_name, new_records, keep_timestamps=keep_timestamps, on_written=on_written)
+        if new_records[0]["user_email"] == "alice@test.com" and new_records[0]["product_id"] == 3:
+            raise RuntimeError("oops")
+
+    ss.create_records = fail_after_second_chunk
+    try:
+        import_records(ss, "orders", csv_filepath, chunk_size=2)
+    except RuntimeError:
+        pass
+
+    del ss.create_records
+    assert import_records(ss, "orders", csv_filepath, chunk_size=2) == 5
+    assert len(ss.get_orders()) == 5 # none written twice
+
+
+def test_interrupted_export(ss, tmp_path):
+    def fail(sheet_name, chunk_size):
+        yield [{"id": 1}]
+        raise RuntimeError("oops")
+
+    ss.iter_records = fail
+    csv_filepath = str(tmp_path / "orders.csv")
+    try:
+        export_records(ss, "orders", csv_filepath)
+    except RuntimeError:
+        pass
+    assert list(tmp_path.iterdir()) == [] # nothing which looks finished, and no temporary file left behind
@@ -0,0 +1,60 @@
+from array import array
+from datetime import datetime, timezone
+
+from app.columnar import ColumnarRecords
+
+
+def test_columnar_records():
+    values = [
+        ["id", "user_email", "product_id", "product_name", "product_price", "created_at"],
+        ["1", "example@test.com", "2", "Product 2", "4.99", "2023-03-08 19:59:16.471152+00:00"],
+        ["2", "other@test.com", "3", "Product 3", "5.99", "2023-03-09 10:00:00.000001+00:00"],
+    ]
+    records = ColumnarRecords(values)
+    assert len(records) == 2
+
+    # typed columns:
+    assert records.column("id") == array("q", [1, 2])
+    assert records.column("product_price") == array("d", [4.99, 5.99])
+    assert records.column("created_at")[0] == datetime(2023, 3, 8, 19, 59, 16, 471152, tzinfo=timezone.utc)
+
+    # dictionary-like rows:
+    order = records[-1]
+    assert order["id"] == 2
+    assert order["product_name"] == "Product 3"
+    assert order.get("oops") is None
+    assert dict(records[0])["user_email"] == "example@test.com"
+    assert [o["id"] for o in records] == [1, 2]
+
+
+def test_columnar_records_blanks():
+    values = [
+        ["id", "name", "price", "created_at"],
+        ["1", "Strawberries", "", ""],
+        ["2", "Textbook"], # trailing blank cells are omitted by the API
+    ]
+    records = ColumnarRecords(values)
+    assert records.column("id") == array("q", [1, 2])
+    assert records.column("price") == ["", ""]
+    assert records[1]["created_at"] == ""
+
+    assert len(ColumnarRecords([])) == 0
+
+
+def test_columnar_records_add():
+    values = [
+        ["id", "name", "price"],
+        ["1", "Strawberries", "2.99"],
+    ]
+    records = ColumnarRecords(values)
+    combined = records + [{"id": 2, "name": "Textbook", "price": 10}, {"id": 3, "name": "Peas"}]
+    assert isinstance(combined, ColumnarRecords)
+    assert combined.column("id") == array("q", [1, 2, 3])
+    assert combined.column("name") == ["Strawberries", "Textbook", "Peas"]
+    assert combined.column("price") == [2.99, 10, ""] # not all numbers any more
+    assert len(records) == 1 # unchanged
+
+    empty = ColumnarRecords([]) + [{"id": 1, "name": "Strawberries"}]
+    assert [dict(record) for record in empty] == [{"id": 1, "name": "Strawberries"}]
+    assert empty == [{"id": 1, "name": "Strawberries"}]
+    assert ColumnarRecords([]) == []
@@ -0,0 +1,292 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from gspread.exceptions import APIError, WorksheetNotFound
+
+from app.columnar import ColumnarRecords
+from app.fake_sheets import FakeClient, parse_range
+from app.id_allocator import IdAllocator
+from app.record_cache import RecordCache
+from app.shared_cache import SharedCache
+from app.spreadsheet_service import SpreadsheetService
+from app.load_benchmark import make_service, run_benchmark, find_regressions, USER_EMAIL
+
+
+@pytest.fixture()
+def fake_ss(tmp_path):
+    client = FakeClient()
+    return SpreadsheetService(document_id="fake-document", client=client, id_allocator=IdAllocator("fake-document", dirpath=str(tmp_path)))
+
+
+def test_parse_range():
+    assert parse_range("'orders'!A2:F10") == ("orders", 2, 10, 1, 6)
+    assert parse_range("'orders'!A5:F") == ("orders", 5, None, 1, 6)
+    assert parse_range("orders!1:1") == ("orders", 1, 1, 1, None)
+    assert parse_range("orders") == ("orders", 1, None, 1, None)
+
+
+def test_column_range(fake_ss):
+    assert fake_ss.column_range("orders", 2, 10) == "'orders'!A2:F10"
+    assert fake_ss.column_range("orders", 5) == "'orders'!A5:F"
+    assert fake_ss.column_range("orders", 2, 3, width=1) == "'orders'!A2:A3"
+
+
+def test_quota_errors(fake_ss):
+    fake_ss.client.api.fail_next(1)
+    with pytest.raises(APIError) as err:
+        fake_ss.get_products()
+    assert err.value.code == 429
+
+    assert fake_ss.get_products() == [] # the next call succeeds
+
+
+def test_append_only_sync(fake_ss):
+    fake_ss.create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+    assert len(fake_ss.get_orders()) == 1
+
+    # another process appends a row:
+    sheet = fake_ss.client.open_by_key("fake-document").sheet("orders")
+    sheet.write_row(3, ["2", "other@test.com", "1", "Product 1", "4.99", "2023-01-01T00:00:00"])
+
+    # once our cached orders expire, only the new row gets fetched:
+    calls = fake_ss.client.api.total_calls
+    orders = fake_ss.sync_records("orders")
+    assert [order["id"] for order in orders] == [1, 2]
+    assert fake_ss.client.api.total_calls == calls + 1
+    assert fake_ss.sync_stats()["tail_rows_fetched"] == 1
+
+
+def test_load_benchmark():
+    results = run_benchmark([100], requests=3)
+    assert sorted(results["100"].keys()) == ["/products", "/user/orders", "/user/orders/create", "api_calls"]
+    assert results["100"]["/products"]["errors"] == 0
+
+    slower = {"100": {"/products": {"requests_per_second": results["100"]["/products"]["requests_per_second"] * 10, "p99_ms": 1000}}}
+    assert len(find_regressions(results, slower)) == 1
+    assert find_regressions(results, {}) == []
+
+
+def test_id_conflicts(tmp_path):
+    # two servers, writing to the same document, with their own id counters:
+    client = FakeClient()
+    servers = []
+    for name in ["a", "b"]:
+        (tmp_path / name).mkdir()
+        ss = SpreadsheetService(document_id="fake-document", client=client, id_allocator=IdAllocator("fake-document", dirpath=str(tmp_path / name)))
+        ss.id_conflict_check = True
+        servers.append(ss)
+
+    new_order = {"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99}
+    servers[0].create_orders([dict(new_order), dict(new_order)]) # ids 1 and 2
+    servers[1].create_orders([dict(new_order), dict(new_order)]) # ids 3 and 4 (its counter starts after the largest id in the sheet)
+    servers[0].create_order(dict(new_order)) # id 3 according to its counter, which is taken
+
+    ids = [int(row[0]) for row in client.open_by_key("fake-document").sheet("orders").get_values(start_row=2)]
+    assert ids == [1, 2, 3, 4, 5]
+    assert servers[0].lock_stats()["id_conflicts"] == 1
+    assert servers[0].get_orders()[-1]["id"] == 5
+
+
+def test_coalesced_reads(tmp_path):
+    # concurrent requests for the products page, when the products aren't cached yet:
+    client = FakeClient(latency_ms=50)
+    ss = SpreadsheetService(document_id="fake-document", client=client, id_allocator=IdAllocator("fake-document", dirpath=str(tmp_path)))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: ss.get_products(), range(8)))
+
+    assert results == [[]] * 8
+    assert client.api.calls["get_all_values"] == 1
+    assert ss.records_cache.stats()["coalesced"] == 7
+
+
+def test_order_summaries_read_once():
+    ss = make_service(2500)
+    client = ss.client
+    client.api.calls = {}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        summaries = list(executor.map(lambda _: ss.get_user_summary(USER_EMAIL), range(4)))
+
+    assert [summary["order_count"] for summary in summaries] == [25] * 4
+    assert client.api.calls.get("get_all_values") == 1
+    assert client.api.calls.get("values_batch_get") is None
+
+
+def test_shared_cache_concurrent_writes(tmp_path):
+    # two worker processes on the same server, sharing their records and id counters:
+    client = FakeClient()
+    workers = [
+        SpreadsheetService(document_id="fake-document", client=client, id_allocator=IdAllocator("fake-document", dirpath=str(tmp_path)), shared_cache=SharedCache("fake-document", dirpath=str(tmp_path)))
+        for _ in range(2)
+    ]
+    new_order = {"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99}
+    assert workers[0].get_orders() == []
+    assert workers[1].get_orders() == []
+
+    workers[1].create_order(dict(new_order))
+    workers[0].create_order(dict(new_order)) # without seeing the other worker's write first
+
+    for worker in workers:
+        assert [order["id"] for order in worker.get_orders()] == [1, 2]
+
+
+def test_create_records_after_append_error(fake_ss):
+    fake_ss.create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+    assert len(fake_ss.get_orders()) == 1
+
+    def fail(*args):
+        raise RuntimeError("oops")
+
+    # the row gets written, so updating the cache afterwards shouldn't raise (and make callers write it again):
+    fake_ss.update_indexes = fail
+    fake_ss.create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+    assert fake_ss.records_cache.peek("orders") is None
+    assert [order["id"] for order in fake_ss.get_orders()] == [1, 2]
+
+
+def test_indexed_lookups(tmp_path):
+    # without cached records, finding a user's orders reads only the indexed column, and then only their rows:
+    client = FakeClient()
+    ss = SpreadsheetService(document_id="fake-document", client=client, id_allocator=IdAllocator("fake-document", dirpath=str(tmp_path)), records_cache=RecordCache(ttl=-1))
+    for user_email in ["example@test.com", "other@test.com", "example@test.com", "example@test.com"]:
+        ss.create_order({"user_email": user_email, "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+
+    client.api.calls = {}
+    assert [order["id"] for order in ss.get_user_orders("example@test.com")] == [1, 3, 4]
+    assert client.api.calls == {"col_values": 1, "values_batch_get": 1} # rows 2 and 4:5, in a single call
+
+    # the index is kept up to date as orders are written:
+    ss.create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+    client.api.calls = {}
+    assert [order["id"] for order in ss.get_user_orders("example@test.com")] == [1, 3, 4, 5]
+    assert client.api.calls == {"values_batch_get": 1}
+
+    ss.destroy_all("orders")
+    client.api.calls = {}
+    assert ss.get_user_orders("example@test.com") == []
+    assert client.api.calls == {}
+
+
+def test_metadata_reuse(fake_ss):
+    calls = fake_ss.client.api.calls
+    fake_ss.get_sheet("orders")
+    fake_ss.get_sheet("products")
+    assert (calls["open_by_key"], calls["worksheets"]) == (1, 1) # every sheet, in a single call
+    assert fake_ss.metadata_stats() == {"metadata_calls": 2, "metadata_calls_saved": 2}
+
+    # only sheet lookups count as saved calls (not every use of the document):
+    fake_ss.doc
+    fake_ss.doc
+    assert fake_ss.metadata_stats() == {"metadata_calls": 2, "metadata_calls_saved": 2}
+
+    # reloaded once the ttl has passed:
+    fake_ss.metadata_ttl = -1
+    fake_ss.get_sheet("orders")
+    assert (calls["open_by_key"], calls["worksheets"]) == (1, 2)
+    assert fake_ss.metadata_stats() == {"metadata_calls": 3, "metadata_calls_saved": 2}
+
+
+def test_metadata_refresh_for_new_sheets(fake_ss):
+    fake_ss.get_sheet("orders")
+
+    # a sheet added since we loaded the metadata:
+    fake_ss.client.open_by_key("fake-document").add_worksheet("reviews", ["id", "created_at"])
+    assert fake_ss.get_sheet("reviews").title == "reviews"
+    assert fake_ss.client.api.calls["worksheets"] == 2
+
+    with pytest.raises(WorksheetNotFound):
+        fake_ss.get_sheet("missing")
+    assert fake_ss.client.api.calls["worksheets"] == 3
+
+
+@pytest.mark.parametrize("code, message", [(400, "Unable to parse range: 'orders'!A1:F"), (404, "Requested entity was not found.")])
+def test_stale_sheet_retry(fake_ss, code, message):
+    fake_ss.get_sheet("orders")
+    api = fake_ss.client.api
+
+    # the sheet we cached no longer exists where we thought, so refresh the metadata and try once more:
+    api.fail_next(1, code, message)
+    sheet, header = fake_ss.with_sheet("orders", lambda sheet: sheet.row_values(1))
+    assert header[0] == "id"
+    assert api.calls["worksheets"] == 2
+
+    # same for batch requests:
+    api.fail_next(1, code, message)
+    sheets, response = fake_ss.with_sheets(["orders", "products"], lambda sheets: fake_ss.doc.values_batch_get([f"'{sheet.title}'!A1:A1" for sheet in sheets]))
+    assert len(response["valueRanges"]) == 2
+    assert api.calls["worksheets"] == 3
+
+
+def test_no_retry_for_other_errors(fake_ss):
+    fake_ss.get_sheet("orders")
+    fake_ss.client.api.fail_next(1, 400, "Invalid value")
+    with pytest.raises(APIError):
+        fake_ss.with_sheet("orders", lambda sheet: sheet.row_values(1))
+    assert fake_ss.client.api.calls["worksheets"] == 1
+
+
+def test_user_orders_page_reads_once():
+    from web_app import create_app
+
+    ss = make_service(500)
+    client = ss.client
+    client.api.calls = {}
+    test_client = create_app(spreadsheet_service=ss).test_client()
+    with test_client.session_transaction() as session:
+        session["current_user"] = {"email": USER_EMAIL}
+
+    response = test_client.get("/user/orders")
+    assert response.status_code == 200
+    assert client.api.calls.get("get_all_values") == 1 # the summary and the user's orders both come from it
+    assert client.api.calls.get("col_values") is None
+    assert client.api.calls.get("values_batch_get") is None
+
+
+def test_order_summaries_rebuild_during_write(fake_ss):
+    new_order = {"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99}
+    fake_ss.create_order(dict(new_order))
+
+    # another request writes an order while the summaries are being rebuilt (after the orders have been read):
+    cached_records = fake_ss.cached_records
+    def read_then_write(sheet_name):
+        records = cached_records(sheet_name)
+        fake_ss.create_order(dict(new_order))
+        return records
+
+    fake_ss.cached_records = read_then_write
+    assert fake_ss.get_user_summary("example@test.com")["order_count"] == 2
+
+
+def test_api_skips_rows_without_ids():
+    from web_app import create_app
+
+    ss = make_service(3)
+    orders_sheet = ss.client.open_by_key("load-benchmark-3").sheet("orders")
+    orders_sheet.write_row(5, ["", USER_EMAIL, "1", "Product 1", "4.99", "2023-01-01 00:00:00+00:00"]) # added by hand
+    test_client = create_app(spreadsheet_service=ss).test_client()
+
+    response = test_client.get("/api/products")
+    assert response.status_code == 200
+    with test_client.session_transaction() as session:
+        session["current_user"] = {"email": USER_EMAIL}
+    response = test_client.get("/api/user/orders")
+    assert response.status_code == 200
+    assert [order["id"] for order in response.json["orders"]] == [1]
+
+
+def test_columnar_orders(tmp_path):
+    client = FakeClient()
+    service = SpreadsheetService(document_id="fake-document", client=client, id_allocator=IdAllocator("fake-document", dirpath=str(tmp_path)), columnar=True)
+    service.create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+    sheet = client.open_by_key("fake-document").sheet("orders")
+    sheet.write_row(3, ["2", "other@test.com", "1", "Product 1", "4.99", "2023-01-01T00:00:00"])
+
+    # the records stay columnar, after a full read, a tail sync and a write-through:
+    orders = service.sync_records("orders")
+    assert isinstance(orders, ColumnarRecords)
+    assert list(orders.column("id")) == [1, 2]
+
+    service.create_order({"user_email": "example@test.com", "product_id": 2, "product_name": "Product 2", "product_price": 5.99})
+    orders = service.get_orders()
+    assert isinstance(orders, ColumnarRecords)
+    assert list(orders.column("id")) == [1, 2, 3]
+    assert list(orders.column("product_price")) == [4.99, 4.99, 5.99]
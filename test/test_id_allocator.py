@@ -0,0 +1,93 @@
+from time import sleep
+from threading import Event
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from app.id_allocator import IdAllocator
+
+
+def allocate_many(dirpath):
+    allocator = IdAllocator("example-doc", dirpath=dirpath)
+    return [allocator.allocate("orders", 2, lambda: 0) for _ in range(25)]
+
+
+def test_allocate(tmp_path):
+    allocator = IdAllocator("example-doc", dirpath=str(tmp_path))
+
+    # finds the max id the first time only:
+    assert allocator.allocate("orders", 3, lambda: 10) == 11
+    assert allocator.allocate("orders", 1, lambda: 999) == 14
+    assert allocator.allocate("products", 1, lambda: 0) == 1
+
+    allocator.reset("orders")
+    assert allocator.allocate("orders", 1, lambda: 999) == 1
+
+    # different documents get different counters:
+    other = IdAllocator("other-doc", dirpath=str(tmp_path))
+    assert other.allocate("orders", 1, lambda: 0) == 1
+
+
+def test_reseed(tmp_path):
+    allocator = IdAllocator("example-doc", dirpath=str(tmp_path))
+    assert allocator.allocate("orders", 1, lambda: 10) == 11
+
+    # never hands out an id we already know is taken:
+    assert allocator.allocate("orders", 1, lambda: 999, known_max_id=20) == 21
+
+    # a new process checks the sheet again (in case rows were added while the app was down):
+    restarted = IdAllocator("example-doc", dirpath=str(tmp_path))
+    assert restarted.allocate("orders", 1, lambda: 30) == 31
+    assert restarted.allocate("orders", 1, lambda: 999) == 32
+
+    # and so does this one, once the counter is older than the ttl:
+    restarted.ttl = -1
+    assert restarted.allocate("orders", 1, lambda: 40) == 41
+
+
+def test_find_max_id_outside_lock(tmp_path):
+    allocator = IdAllocator("example-doc", dirpath=str(tmp_path))
+
+    # so other workers don't wait for the API call:
+    def find_max_id():
+        assert not allocator.lock.locked()
+        return 10
+
+    assert allocator.allocate("orders", 1, find_max_id) == 11
+
+
+def test_concurrent_allocation(tmp_path):
+    dirpath = str(tmp_path)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        thread_results = list(executor.map(allocate_many, [dirpath] * 4))
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        process_results = list(executor.map(allocate_many, [dirpath] * 4))
+
+    first_ids = [i for results in thread_results + process_results for i in results]
+    assert len(first_ids) == 8 * 25
+    assert len(set(first_ids)) == len(first_ids)
+    assert sorted(first_ids) == list(range(1, 8 * 25 * 2, 2))
+
+
+def test_lock_stats(tmp_path):
+    allocator = IdAllocator("example-doc", dirpath=str(tmp_path))
+    allocator.allocate("orders", 1, lambda: 0)
+    assert allocator.lock_stats.stats()["acquisitions"] == 1
+    assert allocator.lock_stats.stats()["contended"] == 0
+
+    # another thread has to wait while we hold the lock:
+    started = Event()
+    def allocate_later():
+        started.set()
+        return allocator.allocate("orders", 1, lambda: 0)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with allocator.locked():
+            future = executor.submit(allocate_later)
+            started.wait()
+            sleep(0.05)
+        assert future.result() == 2
+
+    stats = allocator.lock_stats.stats()
+    assert stats["acquisitions"] == 3
+    assert stats["contended"] == 1
+    assert stats["max_wait_ms"] > 0
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from app.models import Product, Order
+
+
+def test_order_from_row():
+    header = ["id", "product_id", "user_email", "created_at"] # columns can be in any order
+    positions = Order.positions(header)
+    order = Order.from_row(["7", "3", "example@test.com", "2023-03-08 19:59:16.471152+00:00"], positions)
+
+    assert order.id == 7
+    assert order["product_id"] == 3
+    assert order["user_email"] == "example@test.com"
+    assert isinstance(order.get("created_at"), datetime)
+    assert order.get("product_name") == "" # not in the sheet
+    assert order.get("oops") is None
+    assert not hasattr(order, "__dict__")
+
+
+def test_product_to_row():
+    product = Product({"id": 4, "name": "Mock Product", "price": 999.99})
+    assert product.to_row() == [4, "Mock Product", "", 999.99, "", ""]
+    assert product.to_row(["name", "id", "other"]) == ["Mock Product", 4, ""]
+    assert dict(product)["name"] == "Mock Product"
+
+    # round trip:
+    assert Product.from_row(product.to_row()) == product
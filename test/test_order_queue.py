@@ -0,0 +1,105 @@
+from app.sqlite_service import SqliteService
+from app.order_queue import OrderQueue
+
+
+def test_order_queue(tmp_path):
+    ss = SqliteService(filepath=":memory:")
+    queue = OrderQueue(ss, filepath=str(tmp_path / "queue.jsonl"))
+
+    queue.enqueue({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+    queue.enqueue({"user_email": "other@test.com", "product_id": 2, "product_name": "Product 2", "product_price": 5.99})
+    assert queue.depth() == 2
+    assert not any(ss.get_orders())
+
+    pending = queue.pending_orders("example@test.com")
+    assert len(pending) == 1
+    assert pending[0]["product_name"] == "Product 1"
+
+    # written in a single batch:
+    assert queue.flush() == 2
+    assert queue.depth() == 0
+    assert [o["user_email"] for o in ss.get_orders()] == ["example@test.com", "other@test.com"]
+    assert queue.stats()["flushes"] == 1
+
+    assert queue.flush() == 0
+
+
+def test_order_queue_retries_failed_flush(tmp_path):
+    ss = SqliteService(filepath=":memory:")
+    queue = OrderQueue(ss, filepath=str(tmp_path / "queue.jsonl"))
+    queue.enqueue({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+
+    ss.create_orders = None # oops, not callable
+    try:
+        queue.flush()
+    except TypeError:
+        pass
+    assert queue.stats()["flush_errors"] == 1
+
+    # the orders are still there, and new ones can keep arriving:
+    queue.enqueue({"user_email": "example@test.com", "product_id": 2, "product_name": "Product 2", "product_price": 5.99})
+    assert queue.depth() == 2
+
+    del ss.create_orders
+    assert queue.flush() == 1 # the ones from the failed flush first
+    assert queue.flush() == 1
+    assert [o["product_id"] for o in ss.get_orders()] == [1, 2]
+
+
+def test_order_queue_doesnt_rewrite_written_orders(tmp_path):
+    ss = SqliteService(filepath=":memory:")
+    queue = OrderQueue(ss, filepath=str(tmp_path / "queue.jsonl"))
+    queue.enqueue({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+
+    def fail_after_writing(created_records):
+        queue.mark_written(created_records)
+        raise OSError("oops")
+
+    create_orders = ss.create_orders
+    ss.create_orders = lambda new_orders, on_written=None: create_orders(new_orders, on_written=fail_after_writing)
+    try:
+        queue.flush()
+    except OSError:
+        pass
+    assert queue.depth() == 0 # the orders were written, even though the flush failed
+
+    del ss.create_orders
+    assert queue.flush() == 0
+    assert len(ss.get_orders()) == 1
+
+
+def test_order_queue_sets_aside_failing_batch(tmp_path):
+    ss = SqliteService(filepath=":memory:")
+    queue = OrderQueue(ss, filepath=str(tmp_path / "queue.jsonl"), max_attempts=2)
+    queue.enqueue({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+
+    ss.create_orders = None # this batch always fails
+    for _ in range(2):
+        try:
+            queue.flush()
+        except TypeError:
+            pass
+
+    # moved to the dead-letter file, so later orders aren't stuck behind it:
+    assert queue.depth() == 0
+    assert queue.stats()["dead"] == 1
+    assert [entry["product_id"] for entry in queue.read_journal(queue.dead_filepath) if "product_id" in entry] == [1]
+
+    del ss.create_orders
+    queue.enqueue({"user_email": "example@test.com", "product_id": 2, "product_name": "Product 2", "product_price": 5.99})
+    assert queue.flush() == 1
+    assert [o["product_id"] for o in ss.get_orders()] == [2]
+
+
+def test_order_queue_flush_size(tmp_path):
+    ss = SqliteService(filepath=":memory:")
+    queue = OrderQueue(ss, filepath=str(tmp_path / "queue.jsonl"), flush_size=2)
+    queue.enqueue({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+    assert not queue.wakeup.is_set()
+    queue.enqueue({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+    assert queue.wakeup.is_set() # time to flush
+
+    queue.wakeup.clear()
+    queue.flush()
+    queue.enqueue({"user_email": "example@test.com", "product_id": 1, "product_name": "Product 1", "product_price": 4.99})
+    assert not queue.wakeup.is_set()
@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+from app.order_summaries import OrderSummaries
+
+ORDERS = [
+    {"user_email": "alice@test.com", "product_id": 1, "product_name": "Strawberries", "product_price": 4.99, "created_at": datetime(2023, 1, 1, tzinfo=timezone.utc)},
+    {"user_email": "bob@test.com", "product_id": 2, "product_name": "Cup of Tea", "product_price": 3.49, "created_at": datetime(2023, 1, 2, tzinfo=timezone.utc)},
+    {"user_email": "alice@test.com", "product_id": 3, "product_name": "Textbook", "product_price": 129.99, "created_at": datetime(2023, 1, 3, tzinfo=timezone.utc)},
+    {"user_email": "alice@test.com", "product_id": 1, "product_name": "Strawberries", "product_price": 4.99, "created_at": datetime(2023, 1, 4, tzinfo=timezone.utc)},
+]
+
+
+def test_build():
+    summaries = OrderSummaries(ORDERS)
+    summary = summaries.get("alice@test.com")
+    assert summary["order_count"] == 3
+    assert summary["total_spend"] == 139.97
+    assert summary["last_order_at"] == datetime(2023, 1, 4, tzinfo=timezone.utc)
+    assert [product["product_name"] for product in summary["top_products"]] == ["Strawberries", "Textbook"]
+    assert summary["top_products"][0]["order_count"] == 2
+
+    assert summaries.get("nobody@test.com")["order_count"] == 0
+
+
+def test_add():
+    summaries = OrderSummaries(ORDERS[0:2])
+    summaries.add(ORDERS[2:])
+    assert summaries.get("alice@test.com") == OrderSummaries(ORDERS).get("alice@test.com")
+
+
+def test_expired():
+    assert not OrderSummaries([]).expired
+    assert OrderSummaries([], ttl=-1).expired
+
+
+def test_timestamps_without_timezone():
+    summaries = OrderSummaries([dict(ORDERS[0], created_at=datetime(2023, 1, 5))]) # like a row added by hand
+    summaries.add(ORDERS[2:3])
+    assert summaries.get("alice@test.com")["last_order_at"] == datetime(2023, 1, 5, tzinfo=timezone.utc)
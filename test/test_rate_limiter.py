@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from requests import Response
+from gspread.exceptions import APIError
+
+from app.rate_limiter import TokenBucket, RequestScheduler
+from app.sheets_client import ScheduledHTTPClient
+
+
+def make_response(status_code, body=None):
+    response = Response()
+    response.status_code = status_code
+    response._content = json.dumps(body or {"error": {"code": status_code, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}}).encode("utf-8")
+    return response
+
+
+class FakeSession:
+    """Returns the given responses in order."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        return self.responses.pop(0)
+
+
+def make_client(responses, scheduler):
+    client = ScheduledHTTPClient(auth=None, session=FakeSession(responses))
+    client.scheduler = scheduler
+    return client
+
+
+def test_token_bucket():
+    bucket = TokenBucket(quota=60, burst=3)
+    assert bucket.remaining() == 3
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    assert bucket.remaining() == 0
+
+    # the rest of the quota is spread across the minute (57 requests, about one every 1.05 seconds):
+    assert bucket.reserve() == pytest.approx(60 / 57, rel=0.01)
+    assert bucket.reserve() == pytest.approx(2 * 60 / 57, rel=0.01)
+
+
+def test_token_bucket_small_quota():
+    bucket = TokenBucket(quota=1)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(60, rel=0.01)
+
+    with pytest.raises(ValueError):
+        TokenBucket(quota=0)
+
+
+def test_reads_and_writes():
+    scheduler = RequestScheduler(read_quota=60, write_quota=60, burst=1)
+    assert scheduler.kind("get") == "read"
+    assert scheduler.kind("POST") == "write"
+    assert scheduler.reserve("GET") == 0
+    assert scheduler.reserve("POST") == 0 # separate quota
+    assert scheduler.reserve("GET") > 0
+    assert scheduler.stats()["waits"] == 1
+
+
+def test_retry_after_rate_limit():
+    scheduler = RequestScheduler(backoff_seconds=0.001, max_retries=2)
+    client = make_client([make_response(429), make_response(503), make_response(200, {"values": []})], scheduler)
+
+    response = client.request("get", "https://sheets.googleapis.com/v4/spreadsheets/abc/values/orders")
+    assert response.status_code == 200
+    assert len(client.session.requests) == 3
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_no_retry_for_failed_writes():
+    # the append may have gone through before the server failed, so retrying could write the rows twice:
+    scheduler = RequestScheduler(backoff_seconds=0.001, max_retries=2)
+    client = make_client([make_response(503)], scheduler)
+
+    with pytest.raises(APIError):
+        client.request("post", "https://sheets.googleapis.com/v4/spreadsheets/abc/values/orders:append")
+    assert len(client.session.requests) == 1
+
+    # but rate limited writes were never made, so they are safe to retry:
+    client = make_client([make_response(429), make_response(200, {"updates": {}})], scheduler)
+    assert client.request("post", "https://sheets.googleapis.com/v4/spreadsheets/abc/values/orders:append").status_code == 200
+
+
+def test_give_up_after_max_retries():
+    scheduler = RequestScheduler(backoff_seconds=0.001, max_retries=1)
+    client = make_client([make_response(429), make_response(429)], scheduler)
+
+    with pytest.raises(APIError):
+        client.request("get", "https://sheets.googleapis.com/v4/spreadsheets/abc/values/orders")
+    assert len(client.session.requests) == 2
+
+
+def test_no_retry_for_client_errors():
+    scheduler = RequestScheduler(backoff_seconds=0.001)
+    client = make_client([make_response(400)], scheduler)
+
+    with pytest.raises(APIError):
+        client.request("post", "https://sheets.googleapis.com/v4/spreadsheets/abc/values/orders:append")
+    assert len(client.session.requests) == 1
+
+
+def test_backoff():
+    scheduler = RequestScheduler(backoff_seconds=1, max_backoff_seconds=5)
+    assert 1 <= scheduler.backoff(0) <= 2
+    assert 4 <= scheduler.backoff(2) <= 5
+    assert scheduler.backoff(10) == 5
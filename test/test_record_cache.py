@@ -0,0 +1,146 @@
+import sys
+import random
+from time import sleep
+from threading import Thread, Event
+
+from app.record_cache import RecordCache, estimate_size
+
+
+def test_read_through():
+    cache = RecordCache(ttl=60)
+    calls = []
+    def loader():
+        calls.append(1)
+        return [{"id": 1}]
+
+    assert cache.get("products", loader) == [{"id": 1}]
+    assert cache.get("products", loader) == [{"id": 1}]
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_expiration():
+    cache = RecordCache(ttl=0)
+    calls = []
+    def loader():
+        calls.append(1)
+        return [{"id": len(calls)}]
+
+    cache.get("products", loader)
+    sleep(0.01)
+    assert cache.get("products", loader) == [{"id": 2}]
+    assert len(calls) == 2
+
+
+def test_stale():
+    cache = RecordCache(ttl=0)
+    assert cache.stale("orders") is None
+
+    cache.set("orders", [{"id": 1}])
+    sleep(0.01)
+    assert cache.peek("orders") is None
+    assert cache.stale("orders") == [{"id": 1}]
+
+
+def test_version():
+    cache = RecordCache(ttl=60)
+    assert cache.version("products") is None
+    cache.set("products", [{"id": 1}])
+    version = cache.version("products")
+    assert version is not None
+    assert cache.version("products") == version # unchanged
+
+    cache.append("products", [{"id": 2}])
+    assert cache.version("products") != version
+    cache.invalidate("products")
+    assert cache.version("products") is None
+
+
+def test_stale_while_revalidate():
+    cache = RecordCache(ttl=0, stale_while_revalidate=True)
+    cache.set("products", [{"id": 1}])
+    sleep(0.01)
+
+    # serves the stale records, while refreshing in the background:
+    assert cache.get("products", lambda: [{"id": 2}]) == [{"id": 1}]
+    for _ in range(100):
+        if not cache.refreshing:
+            break
+        sleep(0.01)
+    assert cache.entries["products"].records == [{"id": 2}]
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_write_through():
+    cache = RecordCache(ttl=60)
+    cache.set("orders", [{"id": 1}])
+    cache.append("orders", [{"id": 2}])
+    assert cache.get("orders", lambda: []) == [{"id": 1}, {"id": 2}]
+
+    cache.invalidate("orders")
+    assert cache.get("orders", lambda: []) == []
+
+    # appending to a missing entry doesn't create a partial one:
+    cache.invalidate("orders")
+    cache.append("orders", [{"id": 3}])
+    assert "orders" not in cache.entries
+
+
+def test_lru_eviction():
+    records = [{"id": i, "name": "x" * 100} for i in range(10)]
+    cache = RecordCache(ttl=60)
+    cache.set("products", records)
+    cache.max_bytes = cache.nbytes * 2 + 1
+
+    cache.set("orders", records)
+    cache.get("products", lambda: []) # now "orders" is the least recently used
+    cache.set("users", records)
+
+    assert list(cache.entries.keys()) == ["products", "users"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_large_entry_kept():
+    records = [{"id": i, "name": "x" * 100} for i in range(10)]
+    cache = RecordCache(ttl=60, max_bytes=1)
+    cache.set("products", records)
+    cache.set("orders", records)
+    assert list(cache.entries.keys()) == ["orders"] # too big by itself, but still cached
+
+    cache.append("orders", records)
+    assert len(cache.get("orders", lambda: [])) == 20
+
+
+def test_estimate_size():
+    lengths = random.Random(1)
+    records = [{"id": i, "name": "x" * lengths.randint(0, 200)} for i in range(10000)]
+    exact = sys.getsizeof(records) + sum([sys.getsizeof(record) + sys.getsizeof(record["id"]) + sys.getsizeof(record["name"]) for record in records])
+    assert abs(estimate_size(records) - exact) < exact * 0.05 # from a sample of the records
+
+    # appends only measure the new records:
+    cache = RecordCache(ttl=60)
+    cache.set("orders", records[0:5000])
+    cache.append("orders", records[5000:])
+    assert abs(cache.nbytes - exact) < exact * 0.05
+
+
+def test_load_doesnt_clobber_writes():
+    cache = RecordCache(ttl=0)
+    cache.set("orders", [{"id": 1}])
+    sleep(0.01)
+
+    fetching = Event()
+    written = Event()
+    def loader():
+        fetching.set()
+        written.wait()
+        return [{"id": 1}] # fetched before the write below
+
+    reader = Thread(target=lambda: cache.get("orders", loader))
+    reader.start()
+    fetching.wait()
+    cache.append("orders", [{"id": 2}])
+    written.set()
+    reader.join()
+    assert cache.stale("orders") == [{"id": 1}, {"id": 2}]
@@ -0,0 +1,30 @@
+from app.record_index import SecondaryIndex, UniqueIndex, row_ranges
+
+
+def test_row_ranges():
+    assert row_ranges([]) == []
+    assert row_ranges([7]) == [(7, 7)]
+    assert row_ranges([10, 2, 3, 4, 9, 7, 3]) == [(2, 4), (7, 7), (9, 10)]
+
+
+def test_secondary_index():
+    index = SecondaryIndex(["a@test.com", "b@test.com", "a@test.com"])
+    assert index.lookup("a@test.com") == [2, 4]
+    assert index.lookup("b@test.com") == [3]
+    assert index.lookup("c@test.com") == []
+
+    index.add("c@test.com", 5)
+    assert index.lookup("c@test.com") == [5]
+
+    # values are compared the way the sheet displays them:
+    index = SecondaryIndex([1, "2", 1])
+    assert index.lookup("1") == [2, 4]
+    assert index.lookup(2) == [3]
+
+
+def test_unique_index():
+    index = UniqueIndex([{"id": 1, "name": "a"}, {"id": 2, "name": "b"}], version=7)
+    assert index.get(2)["name"] == "b"
+    assert index.get("1")["name"] == "a" # compared as strings
+    assert index.get(3) is None
+    assert index.version == 7
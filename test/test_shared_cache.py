@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from app.shared_cache import SharedCache
+
+
+def test_shared_cache(tmp_path):
+    # two worker processes, sharing the same directory:
+    cache = SharedCache("example-doc", dirpath=str(tmp_path))
+    other_cache = SharedCache("example-doc", dirpath=str(tmp_path))
+
+    assert cache.load("products") is None
+    version = cache.version("products")
+    assert cache.publish("products", [{"id": 1}], version)
+    assert other_cache.load("products") == [{"id": 1}]
+
+    # a write invalidates the records for everyone:
+    new_version = other_cache.bump("products")
+    assert cache.version("products") == new_version
+    assert cache.load("products") is None
+
+    # records fetched before the write are already out of date:
+    assert not cache.publish("products", [{"id": 1}], version)
+    assert cache.publish("products", [{"id": 1}, {"id": 2}], new_version)
+    assert other_cache.load("products") == [{"id": 1}, {"id": 2}]
+    assert other_cache.load("products", max_age=-1) is None
+
+    # different documents don't share records:
+    assert SharedCache("other-doc", dirpath=str(tmp_path)).load("products") is None
+
+
+def test_shared_cache_private_directory(tmp_path):
+    SharedCache("example-doc", dirpath=str(tmp_path / "cache"))
+    assert oct(os.stat(tmp_path / "cache").st_mode & 0o777) == "0o700"
+
+    # other users could plant records for us to load:
+    os.chmod(tmp_path / "cache", 0o777)
+    with pytest.raises(PermissionError):
+        SharedCache("example-doc", dirpath=str(tmp_path / "cache"))
@@ -0,0 +1,46 @@
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from google.auth.credentials import Credentials
+
+from app.sheets_client import PooledSession
+
+
+class SlowCredentials(Credentials):
+    """Credentials which take a while to refresh (like a real token request)."""
+
+    def __init__(self):
+        super().__init__()
+        self.refresh_calls = 0
+
+    def refresh(self, request):
+        self.refresh_calls += 1
+        time.sleep(0.05)
+        self.token = f"token-{self.refresh_calls}"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+def test_pool_size():
+    session = PooledSession(SlowCredentials(), pool_size=4)
+    adapter = session.get_adapter("https://sheets.googleapis.com/v4/spreadsheets")
+    assert adapter._pool_maxsize == 4
+    assert session.stats() == {"pool_size": 4, "token_refreshes": 0}
+
+
+def test_refresh_token_once():
+    credentials = SlowCredentials()
+    session = PooledSession(credentials)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in range(8):
+            executor.submit(session.refresh_token)
+
+    assert credentials.refresh_calls == 1
+    assert credentials.token == "token-1"
+    assert session.stats()["token_refreshes"] == 1
+
+    # refreshes again after the token expires:
+    credentials.expiry = datetime.utcnow() - timedelta(minutes=1)
+    session.refresh_token()
+    assert credentials.refresh_calls == 2
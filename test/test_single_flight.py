@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.single_flight import SingleFlight
+
+
+def test_single_flight():
+    flights = SingleFlight()
+    calls = []
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return [{"id": 1}]
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        results = list(executor.map(lambda _: flights.do("products", fetch), range(5)))
+
+    assert len(calls) == 1
+    assert results == [[{"id": 1}]] * 5
+    assert flights.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+
+    # once it's done, the next call runs again:
+    flights.do("products", fetch)
+    assert len(calls) == 2
+
+
+def test_shared_errors():
+    flights = SingleFlight()
+    def fetch():
+        time.sleep(0.1)
+        raise ValueError("OOPS")
+
+    def call(_):
+        with pytest.raises(ValueError):
+            flights.do("products", fetch)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(call, range(3)))
+    assert flights.stats()["calls"] == 1
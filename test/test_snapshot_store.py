@@ -0,0 +1,102 @@
+import os
+import time
+from threading import Thread, Event
+
+import pytest
+
+from app.locking import file_lock
+from app.models import Order
+from app.snapshot_store import SnapshotStore
+from app.sync_state import SyncState
+from app.fake_sheets import FakeClient
+from app.id_allocator import IdAllocator
+from app.spreadsheet_service import SpreadsheetService
+
+HEADER = ["id", "user_email", "product_id", "product_name", "product_price", "created_at"]
+RECORDS = [Order({"id": 1, "user_email": "example@test.com"}), Order({"id": 2, "user_email": "other@test.com"})]
+
+
+def test_save_and_load(tmp_path):
+    store = SnapshotStore("example-doc", dirpath=str(tmp_path))
+    assert store.load("orders") is None
+
+    store.save("orders", RECORDS, SyncState.after(HEADER, 3, RECORDS))
+    snapshot = store.load("orders")
+    assert snapshot.records == RECORDS
+    assert snapshot.sync_state.last_row == 3
+    assert snapshot.age < 5
+
+    # too old:
+    assert SnapshotStore("example-doc", dirpath=str(tmp_path), max_age=-1).load("orders") is None
+    # different documents don't share snapshots:
+    assert SnapshotStore("other-doc", dirpath=str(tmp_path)).load("orders") is None
+
+
+def test_private_directory(tmp_path):
+    # other users could plant snapshots for us to load:
+    os.chmod(tmp_path, 0o777)
+    with pytest.raises(PermissionError):
+        SnapshotStore("example-doc", dirpath=str(tmp_path))
+
+
+def test_single_flight(tmp_path):
+    store = SnapshotStore("example-doc", dirpath=str(tmp_path))
+    fetching = Event()
+
+    def slow_fetch():
+        # another process, which is already fetching the sheet:
+        with file_lock(f"{store.filepath('orders')}.lock"):
+            fetching.set()
+            time.sleep(0.1)
+            store.save("orders", RECORDS)
+
+    other_process = Thread(target=slow_fetch)
+    other_process.start()
+    fetching.wait()
+
+    calls = []
+    snapshot = store.single_flight("orders", lambda: calls.append(1))
+    other_process.join()
+
+    assert snapshot.records == RECORDS
+    assert calls == [] # used the other process's records instead of fetching
+    assert store.stats()["coalesced"] == 1
+
+
+def test_warm_start(tmp_path):
+    client = FakeClient()
+    id_allocator = IdAllocator("fake-document", dirpath=str(tmp_path))
+    ss = SpreadsheetService(document_id="fake-document", client=client, id_allocator=id_allocator, snapshots=SnapshotStore("fake-document", dirpath=str(tmp_path)))
+    ss.seed_products()
+    ss.create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Strawberries", "product_price": 4.99})
+    assert len(ss.get_orders()) == 1 # fetched, and saved
+
+    # a new process starts, after another order was written:
+    ss.create_order({"user_email": "example@test.com", "product_id": 2, "product_name": "Cup of Tea", "product_price": 3.49})
+    new_ss = SpreadsheetService(document_id="fake-document", client=client, id_allocator=id_allocator, snapshots=SnapshotStore("fake-document", dirpath=str(tmp_path)))
+    full_reads = client.api.calls["get_all_values"]
+    assert len(new_ss.get_orders()) == 1 # right away, from the snapshot
+
+    # then gets the new order in the background (just the new row):
+    for _ in range(100):
+        if not new_ss.records_cache.refreshing:
+            break
+        time.sleep(0.01)
+    assert len(new_ss.get_orders()) == 2
+    assert new_ss.sync_stats()["tail_rows_fetched"] == 1
+    assert client.api.calls["get_all_values"] == full_reads
+
+
+def test_warm_start_user_orders(tmp_path):
+    client = FakeClient()
+    id_allocator = IdAllocator("fake-document", dirpath=str(tmp_path))
+    ss = SpreadsheetService(document_id="fake-document", client=client, id_allocator=id_allocator, snapshots=SnapshotStore("fake-document", dirpath=str(tmp_path)))
+    ss.create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Strawberries", "product_price": 4.99})
+    ss.get_orders() # fetched, and saved
+
+    # a new process's first request is for a user's orders:
+    new_ss = SpreadsheetService(document_id="fake-document", client=client, id_allocator=id_allocator, snapshots=SnapshotStore("fake-document", dirpath=str(tmp_path)))
+    client.api.calls = {}
+    assert [order["id"] for order in new_ss.get_user_orders("example@test.com")] == [1] # from the snapshot
+    assert client.api.calls.get("col_values") is None # not the index (the refresh in the background only fetches the rows added since)
+    assert client.api.calls.get("get_all_values") is None
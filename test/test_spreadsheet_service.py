@@ -12,6 +12,13 @@ load_dotenv()
 CI_ENV = (os.getenv("CI", default="false") == "true")
 CI_SKIP_MESSAGE = "taking a lighter touch to testing on the CI server, to reduce API usage and prevent rate limits"
 
+TEST_STORAGE_BACKEND = os.getenv("TEST_STORAGE_BACKEND", default="sheets")
+SHEETS_ONLY = (TEST_STORAGE_BACKEND != "sheets")
+SHEETS_ONLY_MESSAGE = "only applies to the google sheets backend"
+
+# no need to go easy on the API when testing against a local database:
+CI_SKIP = CI_ENV and not SHEETS_ONLY
+
 
 def test_generate_timestamp():
     #dt = ss.generate_timestamp()
@@ -35,40 +42,61 @@ def test_parse_timestamp():
     assert dt.tzinfo == timezone.utc
 
 
+def test_lazy_client():
+    # doesn't read the credentials file (or authorize) until the client is actually needed:
+    ss = SpreadsheetService(credentials_filepath="missing-credentials.json", document_id="example-document")
+    assert ss._client is None
+
+    client = object()
+    ss = SpreadsheetService(document_id="example-document", client=client)
+    assert ss.client is client
+
+
 #
 # READING DATA
 #
 
-@pytest.mark.skipif(CI_ENV, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(SHEETS_ONLY, reason=SHEETS_ONLY_MESSAGE)
 def test_document(ss):
     assert isinstance(ss.doc, Document)
 
 
-@pytest.mark.skipif(CI_ENV, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(SHEETS_ONLY, reason=SHEETS_ONLY_MESSAGE)
 def test_get_sheet(ss):
     sheet = ss.get_sheet("products")
     assert isinstance(sheet, Worksheet)
 
-@pytest.mark.skipif(CI_ENV, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
 def test_get_records(ss):
     sheet, products = ss.get_records("products")
-    assert isinstance(sheet, Worksheet)
+    if TEST_STORAGE_BACKEND == "sheets":
+        assert isinstance(sheet, Worksheet)
     assert isinstance(products, list)
 
-@pytest.mark.skipif(CI_ENV, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
 def test_get_products(ss):
     products = ss.get_products()
     assert len(products) == 3
     assert [p["name"] for p in products] == ["Strawberries", "Cup of Tea", "Textbook"]
     assert [p["id"] for p in products] == [1,2,3]
 
-@pytest.mark.skipif(CI_ENV, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
 def test_get_orders(ss):
     orders = ss.get_orders()
     assert not any(orders)
 
 
-@pytest.mark.skipif(CI_ENV, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
+def test_get_many(ss):
+    records = ss.get_many(["products", "orders"])
+    assert list(records.keys()) == ["products", "orders"]
+    assert [p["id"] for p in records["products"]] == [1,2,3]
+    assert not any(records["orders"])
+
+
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
 def test_destroy_all(ss):
     sheet, records = ss.get_records("products")
     assert len(records) == 3
@@ -79,11 +107,22 @@ def test_destroy_all(ss):
     assert not any(records)
 
 
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
+def test_destroy_many(ss):
+    ss.create_order({"user_email": "example@test.com", "product_id": 3, "product_name": "Test Product", "product_price": 4.99})
+
+    ss.destroy_many(["products", "orders"])
+
+    records = ss.get_many(["products", "orders"])
+    assert not any(records["products"])
+    assert not any(records["orders"])
+
+
 #
 # WRITING DATA
 #
 
-@pytest.mark.skipif(CI_ENV, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
 def test_create_product(ss):
 
     sheet, products = ss.get_records("products")
@@ -105,7 +144,17 @@ def test_create_product(ss):
 
 
 
-@pytest.mark.skipif(CI_ENV, reason=CI_SKIP_MESSAGE)
+def test_get_product(ss):
+    assert ss.get_product(1)["name"] == "Strawberries"
+    assert ss.get_product("3")["price"] == 129.99
+    assert ss.get_product(4) is None
+
+    # picks up new products:
+    ss.create_product({"name": "Mock Product", "price": 9.99, "description": "Testing 123...", "url": ""})
+    assert ss.get_product(4)["name"] == "Mock Product"
+
+
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
 def test_create_order(ss):
     sheet, orders = ss.get_records("orders")
     assert not any(orders)
@@ -131,7 +180,7 @@ def test_create_order(ss):
 
 
 
-@pytest.mark.skipif(CI_ENV, reason=CI_SKIP_MESSAGE)
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
 def test_get_user_orders(ss):
     user_email = "example@test.com"
 
@@ -155,3 +204,27 @@ def test_get_user_orders(ss):
     assert [o["product_name"] for o in user_orders] == ["Product 2", "Product 2", "Product 2"]
     assert [o["product_price"] for o in user_orders] == [4.99,4.99,4.99]
     assert [isinstance(o["created_at"], datetime) for o in user_orders] == [True, True, True]
+
+
+@pytest.mark.skipif(CI_SKIP, reason=CI_SKIP_MESSAGE)
+def test_get_user_summary(ss):
+    user_email = "example@test.com"
+
+    summary = ss.get_user_summary(user_email)
+    assert summary["order_count"] == 0
+    assert summary["total_spend"] == 0
+    assert summary["last_order_at"] is None
+
+    ss.create_orders([
+        {"user_email": user_email,      "product_id": 2, "product_name": "Product 2", "product_price": 4.99},
+        {"user_email": user_email,      "product_id": 1, "product_name": "Product 1", "product_price": 5.99},
+        {"user_email": "other@yep.com", "product_id": 3, "product_name": "Product 3", "product_price": 6.99},
+    ])
+    ss.create_order({"user_email": user_email, "product_id": 2, "product_name": "Product 2", "product_price": 4.99})
+
+    summary = ss.get_user_summary(user_email)
+    assert summary["order_count"] == 3
+    assert summary["total_spend"] == 15.97
+    assert isinstance(summary["last_order_at"], datetime)
+    assert summary["top_products"][0] == {"product_id": 2, "product_name": "Product 2", "order_count": 2}
+    assert ss.get_user_summary("other@yep.com")["order_count"] == 1
@@ -0,0 +1,25 @@
+from app.sync_state import SyncState
+
+HEADER = ["id", "user_email", "product_id", "product_name", "product_price", "created_at"]
+
+
+def test_matches():
+    records = [{"id": 1}, {"id": 2}]
+    state = SyncState.after(HEADER, 3, records)
+    assert state.last_row == 3
+    assert state.matches(records)
+    assert state.matches(records + []) # a copy is fine
+    assert not state.matches(records[0:1])
+    assert not state.matches([{"id": 1}, {"id": 5}])
+
+
+def test_anchor_matches():
+    state = SyncState.after(HEADER, 3, [{"id": 1}, {"id": 2}])
+    assert state.anchor_matches(["2", "example@test.com"])
+    assert not state.anchor_matches(["3", "example@test.com"])
+    assert not state.anchor_matches([]) # the sheet has been cleared
+
+    # with no records yet, the anchor is the header row:
+    state = SyncState.after(HEADER, 1, [])
+    assert state.anchor_matches(HEADER)
+    assert not state.anchor_matches(["id", "email"])
@@ -21,3 +21,78 @@ def test_products(test_client):
     assert b"Textbook" in response.data
     assert b"Cup of Tea" in response.data
     assert b"Strawberries" in response.data
+
+def test_products_not_modified(test_client):
+    response = test_client.get("/products")
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"].startswith("public")
+
+    # the browser already has this version of the page:
+    response = test_client.get("/products", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    # after the products change:
+    test_client.application.config["SPREADSHEET_SERVICE"].create_product({"name": "Mock Product", "price": 9.99, "description": "Testing 123...", "url": ""})
+    response = test_client.get("/products", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"Mock Product" in response.data
+    assert response.headers["ETag"] != etag
+
+    # logged in users see a different page (with their own nav bar), which isn't shared:
+    with test_client.session_transaction() as session:
+        session["current_user"] = {"email": "example@test.com", "picture": None}
+    response = test_client.get("/products", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"Orders" in response.data
+    assert "private" in response.headers["Cache-Control"]
+
+def test_server_timing(test_client):
+    response = test_client.get("/products")
+    assert response.status_code == 200
+    assert "total;dur=" in response.headers["Server-Timing"]
+    assert "render_template" in response.headers["Server-Timing"]
+
+def test_metrics(test_client, monkeypatch):
+    # unauthenticated:
+    response = test_client.get("/metrics")
+    assert response.status_code == 302
+    assert response.location.endswith("/login")
+
+    # not an admin:
+    with test_client.session_transaction() as session:
+        session["current_user"] = {"email": "example@test.com"}
+    response = test_client.get("/metrics")
+    assert response.status_code == 302
+
+    monkeypatch.setattr("web_app.routes.wrappers.ADMIN_EMAILS", ["example@test.com"])
+    test_client.get("/products")
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json["histograms"]["request"]["count"] >= 1
+
+def test_user_profile(test_client):
+    test_client.application.config["SPREADSHEET_SERVICE"].create_order({"user_email": "example@test.com", "product_id": 1, "product_name": "Strawberries", "product_price": 4.99})
+    with test_client.session_transaction() as session:
+        session["current_user"] = {"email": "example@test.com"}
+    response = test_client.get("/user/profile")
+    assert response.status_code == 200
+    assert b"Orders: 1" in response.data
+    assert b"Total Spend: $4.99" in response.data
+    assert b"Favorite Products: Strawberries" in response.data
+
+def test_create_order(test_client):
+    with test_client.session_transaction() as session:
+        session["current_user"] = {"email": "example@test.com"}
+
+    # the name and price come from the catalog, not the form:
+    response = test_client.post("/user/orders/create", data={"product_id": "1", "product_name": "Free Stuff", "product_price": "0.01"})
+    assert response.status_code == 302
+    assert response.location.endswith("/user/orders")
+    orders = test_client.application.config["SPREADSHEET_SERVICE"].get_user_orders("example@test.com")
+    assert [(order["product_name"], order["product_price"]) for order in orders] == [("Strawberries", 4.99)]
+
+    response = test_client.post("/user/orders/create", data={"product_id": "999"})
+    assert response.status_code == 302
+    assert response.location.endswith("/products")
+    assert len(test_client.application.config["SPREADSHEET_SERVICE"].get_user_orders("example@test.com")) == 1
@@ -7,11 +7,15 @@ from flask import Flask
 from authlib.integrations.flask_client import OAuth
 
 from app import APP_ENV, APP_VERSION
-from app.spreadsheet_service import SpreadsheetService
+from app.storage import get_storage_service
+from app.order_queue import OrderQueue, ORDER_QUEUE_ENABLED
+from web_app.page_cache import PageCache
 
 from web_app.routes.home_routes import home_routes
 from web_app.routes.auth_routes import auth_routes
 from web_app.routes.user_routes import user_routes
+from web_app.routes.metrics_routes import metrics_routes
+from web_app.routes.api_routes import api_routes
 
 load_dotenv()
 
@@ -35,10 +39,16 @@ GA_TRACKER_ID = os.getenv("GA_TRACKER_ID", default="G-OOPS")
 #GA_DOMAIN = os.getenv("GA_DOMAIN", default="http://localhost:5000") # in production set to "________"
 
 
-def create_app(spreadsheet_service=None):
+def create_app(spreadsheet_service=None, order_queue=None):
 
     if not spreadsheet_service:
-        spreadsheet_service = SpreadsheetService()
+        # google sheets by default, or another backend with the same interface (see STORAGE_BACKEND):
+        spreadsheet_service = get_storage_service()
+
+    if not order_queue and ORDER_QUEUE_ENABLED:
+        # accept orders right away, and write them to the database in batches (in the background):
+        order_queue = OrderQueue(spreadsheet_service)
+        order_queue.start()
 
     #
     # INIT
@@ -87,6 +97,8 @@ def create_app(spreadsheet_service=None):
     #
 
     app.config["SPREADSHEET_SERVICE"] = spreadsheet_service
+    app.config["ORDER_QUEUE"] = order_queue
+    app.config["PAGE_CACHE"] = PageCache()
 
     #
     # ROUTES
@@ -95,6 +107,8 @@ def create_app(spreadsheet_service=None):
     app.register_blueprint(home_routes)
     app.register_blueprint(auth_routes)
     app.register_blueprint(user_routes)
+    app.register_blueprint(metrics_routes)
+    app.register_blueprint(api_routes)
 
     return app
 
@@ -0,0 +1,55 @@
+import os
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+# how many rendered pages to keep (one per version of the page, and per user for logged in users):
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", default="256"))
+# how long (in seconds) browsers and CDNs may re-use the public products page before checking whether it has changed:
+PRODUCTS_PAGE_MAX_AGE = int(os.getenv("PRODUCTS_PAGE_MAX_AGE", default="0"))
+
+
+def records_version(records):
+    """A short hash of the records' contents, which changes whenever any of them change."""
+    digest = hashlib.md5()
+    for record in records:
+        digest.update(repr(tuple(record.values())).encode("utf-8"))
+    return digest.hexdigest()[0:16]
+
+
+def page_etag(*parts):
+    """An entity tag identifying a version of a page, from everything the page's contents depend on."""
+    return hashlib.md5("|".join([str(part) for part in parts]).encode("utf-8")).hexdigest()[0:24]
+
+
+class PageCache:
+    """Rendered pages, by entity tag (see page_etag), dropping the least recently used pages first."""
+
+    def __init__(self, max_size=PAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self.pages = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, etag, render):
+        """Returns the page with the given entity tag, or calls the render function to render it (and caches the result)."""
+        with self.lock:
+            html = self.pages.get(etag)
+            if html is not None:
+                self.pages.move_to_end(etag)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        html = render()
+        with self.lock:
+            self.pages[etag] = html
+            while len(self.pages) > self.max_size:
+                self.pages.popitem(last=False)
+        return html
+
+    def stats(self):
+        with self.lock:
+            return {"pages": len(self.pages), "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
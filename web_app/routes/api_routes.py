@@ -0,0 +1,102 @@
+import json
+import base64
+from datetime import datetime
+
+from flask import Blueprint, current_app, session, request, jsonify, Response, stream_with_context
+
+from web_app.routes.wrappers import authenticated_route
+
+api_routes = Blueprint("api_routes", __name__)
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+
+def serialize(record) -> dict:
+    """Converts a record (see Product and Order) into a JSON-friendly dictionary."""
+    record = record.to_dict() if hasattr(record, "to_dict") else dict(record)
+    return {key: (value.isoformat() if isinstance(value, datetime) else value) for key, value in record.items()}
+
+
+def encode_cursor(last_id) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": last_id}).encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor):
+    """Returns the id of the last record on the previous page (or None if there is no cursor)."""
+    if not cursor:
+        return None
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))["after"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("INVALID CURSOR")
+
+
+def page_params():
+    """Parses the "cursor" and "limit" query parameters."""
+    after_id = decode_cursor(request.args.get("cursor"))
+    limit = int(request.args.get("limit", default=API_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError("INVALID LIMIT")
+    return after_id, min(limit, API_MAX_PAGE_SIZE)
+
+
+def records_after(records, after_id):
+    """The records with ids greater than the given one (in order of id).
+        Skips any rows without a numeric id (like ones added to the sheet by hand), which can't be paged through.
+    """
+    records = sorted([record for record in records if isinstance(record["id"], int)], key=lambda record: record["id"])
+    if after_id is None:
+        return records
+    return [record for record in records if record["id"] > after_id]
+
+
+def paginated_response(name, records, extra=None):
+    """Returns a page of records (or all of them, one per line, if the "stream" query parameter is set)."""
+    try:
+        after_id, limit = page_params()
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
+
+    records = records_after(records, after_id)
+
+    if request.args.get("stream") == "true":
+        def generate():
+            for record in records:
+                yield json.dumps(serialize(record)) + "\n"
+            for record in (extra or []):
+                yield json.dumps(serialize(record)) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    page = records[0:limit]
+    next_cursor = encode_cursor(page[-1]["id"]) if len(records) > limit else None
+    response = {name: [serialize(record) for record in page], "next_cursor": next_cursor}
+    if extra is not None and after_id is None:
+        response["pending"] = [serialize(record) for record in extra]
+    return jsonify(response)
+
+#
+# PRODUCTS
+#
+
+@api_routes.route("/api/products")
+def products():
+    service = current_app.config["SPREADSHEET_SERVICE"]
+    return paginated_response("products", service.get_products())
+
+#
+# USER ORDERS
+#
+
+@api_routes.route("/api/user/orders")
+@authenticated_route
+def user_orders():
+    current_user = session.get("current_user")
+    service = current_app.config["SPREADSHEET_SERVICE"]
+    orders = service.get_user_orders(current_user["email"])
+
+    # orders which have been accepted but not yet written (with no ids yet):
+    order_queue = current_app.config.get("ORDER_QUEUE")
+    pending_orders = order_queue.pending_orders(current_user["email"]) if order_queue else []
+
+    return paginated_response("orders", orders, extra=pending_orders)
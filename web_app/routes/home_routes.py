@@ -1,4 +1,6 @@
-from flask import Blueprint, render_template, current_app #, session
+from flask import Blueprint, render_template, current_app, request, session, make_response
+
+from web_app.page_cache import records_version, page_etag, PRODUCTS_PAGE_MAX_AGE
 
 home_routes = Blueprint("home_routes", __name__)
 
@@ -15,4 +17,30 @@ def about():
 def products():
     service = current_app.config["SPREADSHEET_SERVICE"]
     products = service.get_products()
-    return render_template("products.html", products=products)
+
+    # flash messages are only shown once, so don't cache a page with one of them:
+    if session.get("_flashes"):
+        return render_template("products.html", products=products)
+
+    # the page changes when the products change, and depends on who is logged in (see the nav bar):
+    current_user = session.get("current_user")
+    user_id = (current_user["email"], current_user.get("picture")) if current_user else None
+    etag = page_etag("products", records_version(products), user_id, current_app.config["APP_VERSION"])
+
+    page_cache = current_app.config["PAGE_CACHE"]
+    if request.if_none_match.contains_weak(etag):
+        # the browser (or CDN) already has this version of the page:
+        page_cache.not_modified += 1
+        response = make_response("", 304)
+    else:
+        html = page_cache.get(etag, lambda: render_template("products.html", products=products))
+        response = make_response(html)
+
+    response.set_etag(etag, weak=True)
+    if current_user:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = PRODUCTS_PAGE_MAX_AGE
+    return response
@@ -0,0 +1,57 @@
+import time
+
+from flask import Blueprint, current_app, jsonify, g, template_rendered, before_render_template
+
+from app.instrumentation import metrics, record, start_request, end_request
+from web_app.routes.wrappers import admin_route
+
+metrics_routes = Blueprint("metrics_routes", __name__)
+
+#
+# TIMING EACH REQUEST
+#
+
+@metrics_routes.before_app_request
+def before_request():
+    start_request()
+
+@metrics_routes.after_app_request
+def after_request(response):
+    timings = end_request()
+    if timings:
+        response.headers["Server-Timing"] = timings.server_timing()
+        record("request", (time.perf_counter() - timings.started_at) * 1000)
+    return response
+
+@before_render_template.connect
+def before_render(sender, template, context, **extra):
+    g.render_started_at = time.perf_counter()
+
+@template_rendered.connect
+def after_render(sender, template, context, **extra):
+    started_at = g.pop("render_started_at", None)
+    if started_at:
+        record("render_template", (time.perf_counter() - started_at) * 1000)
+
+#
+# METRICS
+#
+
+@metrics_routes.route("/metrics")
+@admin_route
+def index():
+    service = current_app.config["SPREADSHEET_SERVICE"]
+    order_queue = current_app.config.get("ORDER_QUEUE")
+
+    stats = metrics.summary()
+    for name in ["metadata_stats", "session_stats", "sync_stats", "quota_stats", "lock_stats"]:
+        if hasattr(service, name):
+            stats[name] = getattr(service, name)()
+    for name in ["records_cache", "shared_cache", "snapshots"]:
+        component = getattr(service, name, None)
+        if component:
+            stats[name] = component.stats()
+    if order_queue:
+        stats["order_queue"] = order_queue.stats()
+    stats["page_cache"] = current_app.config["PAGE_CACHE"].stats()
+    return jsonify(stats)
@@ -15,8 +15,16 @@ def orders():
     print("USER ORDERS...")
     current_user = session.get("current_user")
     service = current_app.config["SPREADSHEET_SERVICE"]
+    # the summary first, as building it caches all the orders, which the user's orders then come from:
+    summary = service.get_user_summary(current_user["email"])
     orders = service.get_user_orders(current_user["email"])
-    return render_template("user_orders.html", orders=orders)
+
+    # include any orders that have been accepted but not yet written:
+    order_queue = current_app.config.get("ORDER_QUEUE")
+    if order_queue:
+        orders = orders + order_queue.pending_orders(current_user["email"])
+
+    return render_template("user_orders.html", orders=orders, summary=summary)
 
 
 @user_routes.route("/user/orders/create", methods=["POST"])
@@ -26,22 +34,30 @@ def create_order():
 
     form_data = dict(request.form)
     print("FORM DATA:", form_data)
-    product_id = form_data["product_id"]
-    product_name = form_data["product_name"]
-    product_price = form_data["product_price"]
+    product_id = form_data.get("product_id")
 
     current_user = session.get("current_user")
     user_email = current_user["email"]
 
     service = current_app.config["SPREADSHEET_SERVICE"]
     try:
+        # use the product's current name and price from the catalog (rather than trusting the form):
+        product = service.get_product(product_id)
+        if product is None:
+            flash(f"Oops, that product is no longer available.", "warning")
+            return redirect("/products")
+
         new_order = {
             "user_email": user_email,
-            "product_id": int(product_id),
-            "product_name": product_name,
-            "product_price": float(product_price)
+            "product_id": int(product["id"]),
+            "product_name": product["name"],
+            "product_price": float(product["price"])
         }
-        service.create_order(new_order)
+        order_queue = current_app.config.get("ORDER_QUEUE")
+        if order_queue:
+            order_queue.enqueue(new_order)
+        else:
+            service.create_order(new_order)
         flash(f"Order received!", "success")
         return redirect("/user/orders")
     except Exception as err:
@@ -60,4 +76,6 @@ def profile():
     print("USER PROFILE...")
     current_user = session.get("current_user")
     #user = fetch_user(email=current_user["email"])
-    return render_template("user_profile.html", user=current_user) # user=user
+    service = current_app.config["SPREADSHEET_SERVICE"]
+    summary = service.get_user_summary(current_user["email"])
+    return render_template("user_profile.html", user=current_user, summary=summary) # user=user
@@ -1,6 +1,9 @@
 
+import os
 import functools
-from flask import session, redirect, flash
+from flask import session, redirect, flash, request, jsonify
+
+ADMIN_EMAILS = [email.strip() for email in os.getenv("ADMIN_EMAILS", default="").split(",") if email.strip()]
 
 def authenticated_route(view):
     """
@@ -8,7 +11,8 @@ def authenticated_route(view):
 
     If the user is logged in, the route will have access to the "current_user" info stored in the session.
 
-    If user is not logged in, the route will redirect them to the login page.
+    If user is not logged in, the route will redirect them to the login page
+    (or for API routes, respond with a 401 error).
 
     See: https://flask.palletsprojects.com/en/2.0.x/tutorial/views/#require-authentication-in-other-views
     """
@@ -17,6 +21,32 @@ def authenticated_route(view):
         if session.get("current_user"):
             #print("CURRENT USER:", session["current_user"])
             return view(**kwargs)
+        elif request.path.startswith("/api/"):
+            print("UNAUTHENTICATED...")
+            return jsonify({"error": "UNAUTHENTICATED"}), 401
+        else:
+            print("UNAUTHENTICATED...")
+            flash("Unauthenticated. Please login!", "warning")
+            return redirect("/login")
+    return wrapped_view
+
+
+def admin_route(view):
+    """
+    Wrap a route with this decorator to restrict access to the administrators
+    (users whose emails are listed in the "ADMIN_EMAILS" environment variable, separated by commas).
+
+    If the user is not logged in, the route will redirect them to the login page.
+    """
+    @functools.wraps(view)
+    def wrapped_view(**kwargs):
+        current_user = session.get("current_user")
+        if current_user and current_user.get("email") in ADMIN_EMAILS:
+            return view(**kwargs)
+        elif current_user:
+            print("UNAUTHORIZED...")
+            flash("Unauthorized. Administrators only!", "warning")
+            return redirect("/")
         else:
             print("UNAUTHENTICATED...")
             flash("Unauthenticated. Please login!", "warning")